@@ -19,8 +19,9 @@ const DiagnosticResults = ({ result, onNewSession }) => {
         headers: {
           'Content-Type': 'application/json',
         },
+        // The backend keeps the analysis and earlier turns for this session
         body: JSON.stringify({
-          original_analysis: result.chatgpt_analysis,
+          session_id: result.session_id,
           follow_up_question: followUpQuestion,
           diagnostic_context: {
             equipment_type: result.equipment_type,
@@ -133,6 +134,13 @@ const DiagnosticResults = ({ result, onNewSession }) => {
 
       {/* Main Content */}
       <div className="max-w-4xl mx-auto px-4 py-6 sm:px-6 sm:py-8">
+        {/* Shown when the AI analysis was skipped under heavy load */}
+        {(result.degraded || result.ai_diagnosis?.degraded) && (
+          <div className="bg-amber-50 dark:bg-amber-900/30 border border-amber-200 dark:border-amber-700 text-amber-800 dark:text-amber-200 rounded-lg px-4 py-3 mb-6 text-sm">
+            The AI service is busy, so this is the rule-based diagnosis only. Submit again in a few minutes for the full analysis.
+          </div>
+        )}
+
         {/* ChatGPT Analysis Section */}
         <div className="bg-white dark:bg-slate-800 rounded-xl shadow-sm border border-slate-200 dark:border-slate-700 overflow-hidden mb-6 sm:mb-8">
           {/* ChatGPT Header */}
@@ -20,6 +20,21 @@ import {
 } from 'lucide-react'
   const API_BASE_URL = 'https://5003-ifso0ycmvzfunyjvom75k-e8649773.manusvm.computer'
 
+// One catalog request per page load; the browser revalidates it with its ETag after that
+let catalogRequest = null
+
+const loadCatalog = () => {
+  if (!catalogRequest) {
+    catalogRequest = fetch(`${API_BASE_URL}/api/catalog`)
+      .then(response => response.json())
+      .catch(error => {
+        catalogRequest = null
+        throw error
+      })
+  }
+  return catalogRequest
+}
+
 const GuidedTroubleshooting = ({ onSessionComplete }) => {
   const [step, setStep] = useState(1)
   const [loading, setLoading] = useState(false)
@@ -36,27 +51,14 @@ const GuidedTroubleshooting = ({ onSessionComplete }) => {
 
   // Fetch equipment types and symptoms on component mount
   useEffect(() => {
-    fetchEquipmentTypes()
-    fetchSymptoms()
+    fetchCatalog()
   }, [])
 
-  const fetchEquipmentTypes = async () => {
+  const fetchCatalog = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/equipment/types`)
-      const data = await response.json()
+      const data = await loadCatalog()
       if (data.success) {
         setEquipmentTypes(data.equipment_types)
-      }
-    } catch (error) {
-      console.error('Failed to fetch equipment types:', error)
-    }
-  }
-
-  const fetchSymptoms = async () => {
-    try {
-      const response = await fetch(`${API_BASE_URL}/api/equipment/symptoms`)
-      const data = await response.json()
-      if (data.success) {
         // Group symptoms by category
         const groupedSymptoms = data.symptoms.reduce((acc, symptom) => {
           if (!acc[symptom.category]) {
@@ -68,7 +70,7 @@ const GuidedTroubleshooting = ({ onSessionComplete }) => {
         setSymptoms(groupedSymptoms)
       }
     } catch (error) {
-      console.error('Failed to fetch symptoms:', error)
+      console.error('Failed to fetch catalog:', error)
     }
   }
 
@@ -149,10 +151,11 @@ const GuidedTroubleshooting = ({ onSessionComplete }) => {
     
     const poll = async () => {
       try {
-        const response = await fetch(`${API_BASE_URL}/diagnostic/session/${sessionId}`)
+        const response = await fetch(`${API_BASE_URL}/api/diagnostic/session/${sessionId}`)
         const data = await response.json()
         
-        if (data.success && data.session.status === 'completed') {
+        // A failed job still carries the rule-based diagnosis
+        if (data.success && ['completed', 'failed'].includes(data.session.status)) {
           onSessionComplete(data.session)
           setLoading(false)
           return
@@ -333,6 +336,22 @@ const GuidedTroubleshooting = ({ onSessionComplete }) => {
           {step === 3 && (
             <div className="space-y-4">
               <div className="grid grid-cols-1 sm:grid-cols-2 gap-4">
+                <div>
+                  <Label htmlFor="refrigerant">Refrigerant</Label>
+                  <Select 
+                    value={formData.measurements.refrigerant || ''} 
+                    onValueChange={(value) => handleMeasurementChange('refrigerant', value)}
+                  >
+                    <SelectTrigger id="refrigerant">
+                      <SelectValue placeholder="Select refrigerant" />
+                    </SelectTrigger>
+                    <SelectContent>
+                      {['R-410A', 'R-22', 'R-32', 'R-454B'].map((refrigerant) => (
+                        <SelectItem key={refrigerant} value={refrigerant}>{refrigerant}</SelectItem>
+                      ))}
+                    </SelectContent>
+                  </Select>
+                </div>
                 <div>
                   <Label htmlFor="suction-pressure">Suction Pressure (PSI)</Label>
                   <Input
@@ -373,6 +392,36 @@ const GuidedTroubleshooting = ({ onSessionComplete }) => {
                     onChange={(e) => handleMeasurementChange('supply_air_temperature', e.target.value)}
                   />
                 </div>
+                <div>
+                  <Label htmlFor="return-temp">Return Air Temperature (°F)</Label>
+                  <Input
+                    id="return-temp"
+                    type="number"
+                    placeholder="e.g., 75"
+                    value={formData.measurements.return_air_temperature || ''}
+                    onChange={(e) => handleMeasurementChange('return_air_temperature', e.target.value)}
+                  />
+                </div>
+                <div>
+                  <Label htmlFor="suction-line-temp">Suction Line Temperature (°F)</Label>
+                  <Input
+                    id="suction-line-temp"
+                    type="number"
+                    placeholder="e.g., 50"
+                    value={formData.measurements.suction_line_temperature || ''}
+                    onChange={(e) => handleMeasurementChange('suction_line_temperature', e.target.value)}
+                  />
+                </div>
+                <div>
+                  <Label htmlFor="liquid-line-temp">Liquid Line Temperature (°F)</Label>
+                  <Input
+                    id="liquid-line-temp"
+                    type="number"
+                    placeholder="e.g., 95"
+                    value={formData.measurements.liquid_line_temperature || ''}
+                    onChange={(e) => handleMeasurementChange('liquid_line_temperature', e.target.value)}
+                  />
+                </div>
               </div>
 
               <Alert>
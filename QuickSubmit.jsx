@@ -66,14 +66,38 @@ const QuickSubmit = ({ onSessionComplete }) => {
     setLoading(true)
 
     try {
-      const response = await fetch(`${API_BASE_URL}/diagnostic/quick-submit`, {
+      // Photos go up as raw bodies first; the session only references their ids.
+      // A photo that fails to upload is skipped so the description still gets diagnosed.
+      const imageIds = []
+      for (const image of formData.images) {
+        try {
+          const upload = await fetch(`${API_BASE_URL}/api/images/upload?filename=${encodeURIComponent(image.name)}`, {
+            method: 'POST',
+            headers: {
+              'Content-Type': image.type || 'application/octet-stream',
+            },
+            body: image
+          })
+          const uploaded = await upload.json()
+          if (upload.ok && uploaded.success) {
+            imageIds.push(uploaded.image.id)
+          } else {
+            console.error('Image upload failed:', uploaded.error)
+          }
+        } catch (error) {
+          console.error('Image upload failed:', error)
+        }
+      }
+
+      const response = await fetch(`${API_BASE_URL}/api/diagnostic/quick-submit`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
           location: formData.location,
-          description: formData.description
+          description: formData.description,
+          image_ids: imageIds
         })
       })
       
@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+CRITICAL = 0
+INTERACTIVE = 1
+BACKGROUND = 2
+PRIORITY_NAMES = ('critical', 'interactive', 'background')
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of waiting for an LLM slot; callers answer with the rule-based result"""
+
+    def __init__(self, reason):
+        super().__init__(f'LLM call shed: {reason}')
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _Waiter:
+    __slots__ = ('priority', 'sequence', 'enqueued', 'wake', 'state')
+
+    def __init__(self, priority, sequence, wake):
+        self.priority = priority
+        self.sequence = sequence
+        self.enqueued = time.monotonic()
+        self.wake = wake
+        self.state = 'waiting'
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    """Bounded LLM concurrency with a priority queue and per-client token buckets.
+
+    At most max_concurrent calls run at once. Further callers wait in priority
+    order (critical, interactive, background; FIFO within a priority) for up
+    to max_wait seconds. With client_rate set, each client also spends one
+    token per call from a bucket refilled at client_rate per second, and
+    critical calls are never refused for rate. client_rate=0 (the default)
+    turns per-client limits off. When the queue is full a newcomer displaces the newest waiter of a
+    lower priority, or is refused itself. Sync threads and asyncio tasks share
+    the same slots.
+    """
+
+    def __init__(self, max_concurrent=64, max_queue=256, max_wait=15.0, client_rate=0.0, client_burst=30,
+                 max_clients=10000, on_wait=None, on_shed=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self.on_wait = on_wait
+        self.on_shed = on_shed
+        self._lock = threading.Lock()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._buckets = OrderedDict()
+        self.active = 0
+        self.admitted = [0] * len(PRIORITY_NAMES)
+        self.shed = {}
+        self.wait_seconds = [0.0] * len(PRIORITY_NAMES)
+        self.max_wait_seen = [0.0] * len(PRIORITY_NAMES)
+
+    def _take_token(self, client_id, now):
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.client_rate, self.client_burst, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client_id)
+        return bucket.take(now)
+
+    def _reject(self, priority, reason):
+        # Called under _lock; the callback only records metrics
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        if self.on_shed:
+            self.on_shed(PRIORITY_NAMES[priority], reason)
+        return AdmissionRejected(reason)
+
+    def _granted(self, priority, waited):
+        # Called under _lock
+        self.admitted[priority] += 1
+        self.wait_seconds[priority] += waited
+        self.max_wait_seen[priority] = max(self.max_wait_seen[priority], waited)
+        if self.on_wait:
+            self.on_wait(PRIORITY_NAMES[priority], waited)
+
+    def _enter(self, client_id, priority, wake):
+        """Take a slot right away (returns None) or queue a waiter; raises AdmissionRejected"""
+        with self._lock:
+            # Internal callers without a client id (replay, warm-up) are not rate limited
+            if (self.client_rate > 0 and client_id is not None and priority != CRITICAL
+                    and not self._take_token(client_id, time.monotonic())):
+                raise self._reject(priority, 'rate_limited')
+            if self.active < self.max_concurrent and not self._queue:
+                self.active += 1
+                self._granted(priority, 0.0)
+                return None
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue)
+                if worst.priority <= priority:
+                    raise self._reject(priority, 'queue_full')
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst.state = 'preempted'
+                self._reject(worst.priority, 'preempted')
+                worst.wake()
+            waiter = _Waiter(priority, next(self._sequence), wake)
+            heapq.heappush(self._queue, waiter)
+            return waiter
+
+    def _give_up(self, waiter, reason='timeout'):
+        """After a timeout or cancellation: True if the waiter was granted a slot meanwhile"""
+        with self._lock:
+            if waiter.state == 'granted':
+                return True
+            if waiter.state == 'waiting':
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+                waiter.state = reason
+                raise self._reject(waiter.priority, reason)
+            raise AdmissionRejected(waiter.state)
+
+    def _check(self, waiter):
+        if waiter.state == 'preempted':
+            raise AdmissionRejected('preempted')
+
+    def acquire(self, client_id, priority=INTERACTIVE):
+        event = threading.Event()
+        waiter = self._enter(client_id, priority, event.set)
+        if waiter is None:
+            return
+        if not event.wait(self.max_wait):
+            self._give_up(waiter)
+            return
+        self._check(waiter)
+
+    async def acquire_async(self, client_id, priority=INTERACTIVE):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enter(client_id, priority, lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._give_up(waiter)
+            return
+        except asyncio.CancelledError:
+            # The client went away; hand back a slot granted in the meantime
+            try:
+                if self._give_up(waiter, 'cancelled'):
+                    self.release()
+            except AdmissionRejected:
+                pass
+            raise
+        self._check(waiter)
+
+    def release(self):
+        with self._lock:
+            if self._queue:
+                # The slot passes straight to the best waiter, so active stays the same
+                waiter = heapq.heappop(self._queue)
+                waiter.state = 'granted'
+                self._granted(waiter.priority, time.monotonic() - waiter.enqueued)
+                waiter.wake()
+            else:
+                self.active -= 1
+
+    @contextmanager
+    def slot(self, client_id, priority=INTERACTIVE):
+        self.acquire(client_id, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self, client_id, priority=INTERACTIVE):
+        await self.acquire_async(client_id, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def queue_depths(self):
+        with self._lock:
+            depths = [0] * len(PRIORITY_NAMES)
+            for waiter in self._queue:
+                depths[waiter.priority] += 1
+        return {(name,): depths[priority] for priority, name in enumerate(PRIORITY_NAMES)}
+
+    def stats(self):
+        depths = self.queue_depths()
+        with self._lock:
+            return {
+                'active': self.active,
+                'max_concurrent': self.max_concurrent,
+                'queued': {name: depths[(name,)] for name in PRIORITY_NAMES},
+                'max_queue': self.max_queue,
+                'max_wait_seconds': self.max_wait,
+                'client_rate': self.client_rate,
+                'client_burst': self.client_burst,
+                'tracked_clients': len(self._buckets),
+                'admitted': dict(zip(PRIORITY_NAMES, self.admitted)),
+                'shed': dict(self.shed),
+                'mean_wait_ms': {
+                    name: round(self.wait_seconds[priority] / self.admitted[priority] * 1000, 1)
+                    if self.admitted[priority] else 0.0
+                    for priority, name in enumerate(PRIORITY_NAMES)
+                },
+                'max_wait_ms': {name: round(self.max_wait_seen[priority] * 1000, 1)
+                                for priority, name in enumerate(PRIORITY_NAMES)}
+            }
@@ -0,0 +1,471 @@
+"""ASGI entry point for production serving.
+
+The LLM-bound routes (guided and quick-submit diagnostics, follow-ups and
+their streaming variants) are served natively on the event loop and await
+AsyncLLMGateway, so one worker keeps thousands of completions in flight
+instead of one per thread. Every other route is handed to the Flask app in
+main_hybrid on a small thread pool. The native routes still touch SQLite
+(diagnosis cache, similarity index, session store, error codes), so those
+calls go through asyncio.to_thread rather than stalling the loop. Request
+and response bodies match the Flask handlers.
+
+    gunicorn -c gunicorn.conf.py asgi_app:application
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import main_hybrid as hvac
+from admission import INTERACTIVE, AdmissionRejected
+from llm_gateway import AsyncLLMGateway, CircuitOpenError
+from response_format import render_session_payload
+from single_flight import AsyncSingleFlight
+
+# Builds the shared services too, so hvac.llm_gateway and the stores below are ready
+wsgi_app = hvac.get_app()
+
+# Shares the sync gateway's breaker so job threads and the event loop agree on upstream health
+async_llm_gateway = AsyncLLMGateway(
+    api_key=os.getenv('OPENAI_API_KEY'),
+    base_url=os.getenv('OPENAI_API_BASE'),
+    timeout=hvac.llm_gateway.timeout,
+    max_retries=hvac.llm_gateway.max_retries,
+    max_connections=int(os.getenv('ASYNC_LLM_MAX_CONNECTIONS', '2000')),
+    breaker=hvac.llm_gateway.breaker
+) if hvac.llm_gateway else None
+
+diagnosis_flight = AsyncSingleFlight()
+
+hvac.metrics_registry.gauge(
+    'hvac_llm_async_in_flight', 'LLM calls currently awaited on the event loop',
+    callback=lambda: async_llm_gateway.in_flight if async_llm_gateway else 0)
+
+# Catalog, sessions, batch, metrics and the rest stay on Flask
+flask_app = WSGIMiddleware(wsgi_app, workers=int(os.getenv('WSGI_THREADS', '32')))
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        # Flask's request.args.get returns the first value of a repeated parameter
+        self.args = {name: values[0] for name, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        # Resolved as ProxyFix does for the Flask routes, so both agree on who the client is
+        self.remote_addr = hvac.forwarded_client_addr((scope.get('client') or (None,))[0], self.headers.get('x-forwarded-for'))
+        self.body = body
+
+    def get_json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class BodyResponse:
+    def __init__(self, body, media_type, status=200, headers=()):
+        self.body = body
+        self.media_type = media_type
+        self.status = status
+        self.headers = list(headers)
+
+    async def __call__(self, receive, send, headers):
+        await send({
+            'type': 'http.response.start',
+            'status': self.status,
+            'headers': [
+                (b'content-type', self.media_type.encode('latin-1')),
+                (b'content-length', str(len(self.body)).encode())
+            ] + self.headers + headers
+        })
+        await send({'type': 'http.response.body', 'body': self.body})
+
+
+class JSONResponse(BodyResponse):
+    def __init__(self, payload, status=200):
+        # Same encoder and separators as jsonify, so bodies are identical to the Flask routes
+        body = (wsgi_app.json.dumps(payload, separators=(',', ':')) + '\n').encode('utf-8')
+        super().__init__(body, 'application/json', status)
+
+
+def session_response(request, payload, status=200):
+    with hvac.STAGE_SECONDS.time(stage='serialize'):
+        body, media_type = render_session_payload(payload, request.args, request.headers.get('accept'))
+    return BodyResponse(body, media_type, status, [(b'vary', b'Accept')])
+
+
+class EventStream:
+    """Server-Sent Events from an async generator, closed as soon as the client disconnects"""
+
+    status = 200
+
+    def __init__(self, events):
+        self.events = events
+
+    async def __call__(self, receive, send, headers):
+        await send({
+            'type': 'http.response.start',
+            'status': self.status,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')
+            ] + headers
+        })
+        pump = asyncio.ensure_future(self._pump(send))
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        await asyncio.wait((pump, disconnect), return_when=asyncio.FIRST_COMPLETED)
+        disconnect.cancel()
+        if not pump.done():
+            # Stops the upstream completion instead of generating tokens nobody reads
+            pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+
+    async def _pump(self, send):
+        try:
+            async for event in self.events:
+                await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await self.events.aclose()
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def chat_completion(model, messages, **kwargs):
+    """Async counterpart of main_hybrid.chat_completion, recording the same metrics"""
+    if kwargs.get('stream'):
+        kwargs.setdefault('stream_options', {'include_usage': True})
+    start = time.perf_counter()
+    try:
+        response = await async_llm_gateway.chat(model=model, messages=messages, **kwargs)
+    except Exception as e:
+        hvac.LLM_ERRORS.inc(model=model, reason=hvac.llm_error_reason(e))
+        raise
+    finally:
+        hvac.STAGE_SECONDS.observe(time.perf_counter() - start, stage='llm')
+    if not kwargs.get('stream'):
+        hvac.record_llm_usage(model, response.usage)
+    return response
+
+
+async def iter_completion_deltas(stream, model):
+    async for chunk in stream:
+        if getattr(chunk, 'usage', None):
+            hvac.record_llm_usage(model, chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def rule_based_diagnosis(equipment_type, symptoms, error_codes, measurements):
+    # The error-code stage reads SQLite, so the rule engine runs off the event loop
+    return await asyncio.to_thread(hvac.get_rule_based_diagnosis, equipment_type, symptoms, error_codes, measurements)
+
+
+async def enhance_diagnosis(diagnosis, equipment_type, location, symptoms, measurements, error_codes, description,
+                            client_id=None, priority=INTERACTIVE):
+    cache_key = hvac.get_diagnosis_cache_key(equipment_type, location, symptoms, measurements, error_codes, description)
+    cached = await asyncio.to_thread(hvac.diagnosis_cache.get, cache_key)
+    if cached is not None:
+        return cached
+
+    async def run_enhancement():
+        prompt = hvac.diagnostic_prompt_for(diagnosis, equipment_type, location, symptoms, measurements, error_codes, description)
+        async with hvac.llm_admission.async_slot(client_id, priority):
+            response = await chat_completion(
+                model=hvac.DIAGNOSIS_MODEL,
+                messages=hvac.build_diagnostic_messages(prompt),
+                temperature=0.3,
+                max_tokens=2000
+            )
+        enhanced = hvac.apply_chatgpt_analysis(diagnosis, response.choices[0].message.content.strip())
+        await asyncio.to_thread(hvac.diagnosis_cache.set, cache_key, enhanced)
+        return enhanced
+
+    return await diagnosis_flight.do(cache_key, run_enhancement)
+
+
+async def get_enhanced_diagnosis(equipment_type, location, symptoms, measurements, error_codes, description,
+                                 client_id=None, background=False):
+    diagnosis = await rule_based_diagnosis(equipment_type, symptoms, error_codes, measurements)
+    if hvac.llm_enhancement_enabled() and not hvac.resolved_by_error_codes(diagnosis):
+        try:
+            diagnosis = await enhance_diagnosis(
+                diagnosis, equipment_type, location, symptoms, measurements, error_codes, description,
+                client_id=client_id, priority=hvac.admission_priority(diagnosis, symptoms, description, background)
+            )
+        except AdmissionRejected as e:
+            diagnosis = hvac.mark_degraded(diagnosis, e.reason)
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            print(f"OpenAI enhancement failed: {e}")
+    return diagnosis
+
+
+async def run_diagnostic(request, diagnosis_args, build_session, reuse_similar=False):
+    data = request.get_json()
+    args = diagnosis_args(data)
+    admission = hvac.admission_args(request.headers, request.remote_addr)
+    diagnosis = await asyncio.to_thread(hvac.similar_quick_submit_diagnosis, args) if reuse_similar else None
+
+    # Job mode only runs the rule engine here; enhancement happens on the job threads
+    if diagnosis is None and request.args.get('mode') == 'async':
+        session = build_session(
+            data, await rule_based_diagnosis(
+                args['equipment_type'], args['symptoms'], args['error_codes'], args['measurements'])
+        )
+        queued = hvac.start_diagnostic_job(session, args, enhance=hvac.enhance_quick_submit if reuse_similar else None,
+                                           **admission)
+        return session_response(request, {'success': True, 'session': session}, 202 if queued else 200)
+
+    if diagnosis is None:
+        diagnosis = await get_enhanced_diagnosis(**args, **admission)
+        if reuse_similar and diagnosis.get('chatgpt_analysis'):
+            await asyncio.to_thread(hvac.remember_quick_submit, args, diagnosis)
+    session = build_session(data, diagnosis)
+    hvac.diagnostic_jobs.remember(session)
+    return session_response(request, {'success': True, 'session': session})
+
+
+async def guided_diagnostic(request):
+    try:
+        return await run_diagnostic(request, hvac.guided_diagnosis_args, hvac.build_guided_session)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+async def quick_submit(request):
+    try:
+        return await run_diagnostic(request, hvac.quick_submit_diagnosis_args, hvac.build_quick_submit_session,
+                                    reuse_similar=True)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+
+async def guided_diagnostic_stream(request):
+    try:
+        data = request.get_json()
+    except ValueError:
+        data = None
+    error = hvac.submission_error(data)
+    if error is not None:
+        return JSONResponse({'success': False, 'error': error}, 400)
+    try:
+        args = hvac.guided_diagnosis_args(data)
+        admission = hvac.admission_args(request.headers, request.remote_addr)
+    except Exception as e:
+        return JSONResponse({'success': False, 'error': str(e)}, 500)
+
+    async def events():
+        try:
+            diagnosis = await rule_based_diagnosis(
+                args['equipment_type'], args['symptoms'], args['error_codes'], args['measurements'])
+            session = hvac.build_guided_session(data, diagnosis)
+            hvac.diagnostic_jobs.remember(session)
+            yield hvac.sse_event('diagnosis', diagnosis)
+
+            if hvac.llm_enhancement_enabled() and not hvac.resolved_by_error_codes(diagnosis):
+                cache_key = hvac.get_diagnosis_cache_key(**args)
+                cached = await asyncio.to_thread(hvac.diagnosis_cache.get, cache_key)
+                if cached is not None:
+                    diagnosis = cached
+                    yield hvac.sse_event('delta', {'content': cached['summary']})
+                else:
+                    try:
+                        priority = hvac.admission_priority(
+                            diagnosis, args['symptoms'], args['description'], admission['background'])
+                        async with hvac.llm_admission.async_slot(admission['client_id'], priority):
+                            prompt = hvac.diagnostic_prompt_for(diagnosis, **args)
+                            stream = await chat_completion(
+                                model=hvac.DIAGNOSIS_MODEL,
+                                messages=hvac.build_diagnostic_messages(prompt),
+                                temperature=0.3,
+                                max_tokens=2000,
+                                stream=True
+                            )
+                            parts = []
+                            try:
+                                async for content in iter_completion_deltas(stream, hvac.DIAGNOSIS_MODEL):
+                                    parts.append(content)
+                                    yield hvac.sse_event('delta', {'content': content})
+                            finally:
+                                # Also runs when the client disconnects, releasing the upstream connection
+                                await stream.close()
+                        diagnosis = hvac.apply_chatgpt_analysis(diagnosis, ''.join(parts).strip())
+                        await asyncio.to_thread(hvac.diagnosis_cache.set, cache_key, diagnosis)
+                    except AdmissionRejected as e:
+                        diagnosis = hvac.mark_degraded(diagnosis, e.reason)
+                    except CircuitOpenError:
+                        pass
+                    except Exception as e:
+                        print(f"OpenAI enhancement failed: {e}")
+
+            yield hvac.sse_event('session', hvac.finish_streamed_session(session, diagnosis))
+        except Exception as e:
+            yield hvac.sse_event('error', {'success': False, 'error': str(e)})
+
+    return EventStream(events())
+
+
+async def follow_up_question(request):
+    try:
+        data = request.get_json()
+        question = data.get('follow_up_question', '')
+        if not question:
+            return JSONResponse({'error': 'Follow-up question is required'}, 400)
+
+        with hvac.STAGE_SECONDS.time(stage='prompt_build'):
+            prompt, conversation, tokens_saved = await asyncio.to_thread(hvac.prepare_follow_up, data)
+
+        if not hvac.llm_enhancement_enabled():
+            return JSONResponse({'error': 'AI follow-up is not configured'}, 503)
+
+        response = await chat_completion(
+            model=hvac.FOLLOW_UP_MODEL,
+            messages=hvac.build_follow_up_messages(prompt),
+            max_tokens=1000,
+            temperature=0.3
+        )
+        answer = response.choices[0].message.content
+        if conversation is not None:
+            hvac.follow_up_threads.add_turn(conversation, question, answer)
+
+        return JSONResponse({
+            'follow_up_response': answer,
+            'timestamp': datetime.now().isoformat(),
+            'session_id': data.get('session_id'),
+            'prompt_tokens_saved': tokens_saved
+        })
+    except LookupError as e:
+        return JSONResponse({'error': str(e)}, 404)
+    except CircuitOpenError:
+        return JSONResponse({'error': 'AI follow-up is temporarily unavailable'}, 503)
+    except Exception as e:
+        print(f"Follow-up error: {str(e)}")
+        return JSONResponse({'error': 'Failed to process follow-up question'}, 500)
+
+
+async def follow_up_stream(request):
+    data = request.get_json()
+    question = data.get('follow_up_question', '')
+
+    if not question:
+        return JSONResponse({'error': 'Follow-up question is required'}, 400)
+    if not hvac.llm_enhancement_enabled():
+        return JSONResponse({'error': 'AI follow-up is not configured'}, 503)
+
+    try:
+        with hvac.STAGE_SECONDS.time(stage='prompt_build'):
+            prompt, conversation, tokens_saved = await asyncio.to_thread(hvac.prepare_follow_up, data)
+    except LookupError as e:
+        return JSONResponse({'error': str(e)}, 404)
+
+    async def events():
+        try:
+            stream = await chat_completion(
+                model=hvac.FOLLOW_UP_MODEL,
+                messages=hvac.build_follow_up_messages(prompt),
+                max_tokens=1000,
+                temperature=0.3,
+                stream=True
+            )
+            parts = []
+            try:
+                async for content in iter_completion_deltas(stream, hvac.FOLLOW_UP_MODEL):
+                    parts.append(content)
+                    yield hvac.sse_event('delta', {'content': content})
+            finally:
+                await stream.close()
+            answer = ''.join(parts)
+            if conversation is not None:
+                hvac.follow_up_threads.add_turn(conversation, question, answer)
+            yield hvac.sse_event('done', {
+                'follow_up_response': answer,
+                'timestamp': datetime.now().isoformat(),
+                'session_id': data.get('session_id'),
+                'prompt_tokens_saved': tokens_saved
+            })
+        except CircuitOpenError:
+            yield hvac.sse_event('error', {'error': 'AI follow-up is temporarily unavailable'})
+        except Exception as e:
+            print(f"Follow-up error: {str(e)}")
+            yield hvac.sse_event('error', {'error': 'Failed to process follow-up question'})
+
+    return EventStream(events())
+
+
+# (method, path) -> (metrics endpoint name, handler); names match the Flask endpoints
+ROUTES = {
+    ('POST', '/api/diagnostic/guided'): ('guided_diagnostic', guided_diagnostic),
+    ('POST', '/api/diagnostic/guided/stream'): ('guided_diagnostic_stream', guided_diagnostic_stream),
+    ('POST', '/api/diagnostic/quick-submit'): ('quick_submit', quick_submit),
+    ('POST', '/api/follow-up'): ('follow_up_question', follow_up_question),
+    ('POST', '/api/follow-up/stream'): ('follow_up_stream', follow_up_stream)
+}
+
+
+def cors_headers(request):
+    # Mirrors CORS(app, origins="*") on the Flask side
+    return [(b'access-control-allow-origin', b'*')] if 'origin' in request.headers else []
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if async_llm_gateway:
+                await async_llm_gateway.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    route = ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if route is None:
+        await flask_app(scope, receive, send)
+        return
+
+    endpoint, handler = route
+    started = time.perf_counter()
+    status = 500
+    hvac.REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        request = Request(scope, await read_body(receive))
+        try:
+            response = await handler(request)
+        except Exception as e:
+            response = JSONResponse({'success': False, 'error': str(e)}, 500)
+        status = response.status
+        await response(receive, send, cors_headers(request))
+    finally:
+        hvac.REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+        hvac.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=scope['method'], status=status)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi_app:application', host='0.0.0.0', port=int(os.getenv('PORT', '5000')),
+                workers=int(os.getenv('WEB_CONCURRENCY', '1')))
@@ -0,0 +1,91 @@
+"""Lookup latency and memory of the error-code database at scale.
+
+Builds a synthetic database (brands x model families x codes), then times
+exact lookups, brand-agnostic lookups and prefix searches from a fresh
+process-style cold open:
+
+    python benchmarks/bench_error_codes.py --size 500000
+    python benchmarks/bench_error_codes.py --size 200000 --max-us 200
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from error_codes import ErrorCodeDatabase, import_records  # noqa: E402
+
+SEVERITIES = ('info', 'warning', 'critical')
+CODE_PREFIXES = ('E', 'F', 'H', 'L', 'P', 'U', 'CH', 'DF')
+
+
+def synthetic_records(size, rng):
+    brands = [f'brand{i:03d}' for i in range(max(1, size // 2000))]
+    for i in range(size):
+        yield {
+            'brand': brands[i % len(brands)],
+            'model_family': f'series-{(i // len(brands)) % 20}',
+            'code': f'{CODE_PREFIXES[i % len(CODE_PREFIXES)]}{i // (len(brands) * 20)}',
+            'meaning': f'Synthetic fault {i}',
+            'severity': rng.choice(SEVERITIES),
+            'likely_causes': [f'cause {i % 97}', f'cause {i % 89}']
+        }
+
+
+def timed(fn, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ErrorCodeDatabase lookups')
+    parser.add_argument('--size', type=int, default=500000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--path', help='database file; default is a fresh temporary file')
+    parser.add_argument('--max-us', type=float, help='fail if the median exact lookup exceeds this many microseconds')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix='hvac-bench-'), 'error_codes.db')
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        count = import_records(synthetic_records(args.size, rng), path)
+        print(f'imported {count} codes in {time.perf_counter() - start:.1f}s ({os.path.getsize(path) / 1e6:.0f} MB)')
+
+    wanted = set(rng.sample(range(args.size), min(args.queries, args.size)))
+    picks = [record for i, record in enumerate(synthetic_records(args.size, random.Random(7))) if i in wanted]
+    rng.shuffle(picks)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # cache_size=0 measures the database itself rather than the hot-code LRU
+    db = ErrorCodeDatabase(path, cache_size=0)
+
+    results = {
+        'exact (brand)': timed(lambda r: db.lookup(r['code'], r['brand']), picks),
+        'exact (any brand)': timed(lambda r: db.lookup(r['code']), picks),
+        'prefix (brand)': timed(lambda r: db.search(r['code'][:-1] or r['code'], r['brand']), picks),
+        'decode': timed(lambda r: db.decode([f"{r['brand']}:{r['code']}"]), picks)
+    }
+    for name, (median, p99) in results.items():
+        print(f'{name:<18} {len(picks)} queries  p50 {median:.0f} us  p99 {p99:.0f} us')
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f'peak RSS grew {(rss_after - rss_before) / 1024:.1f} MB while querying (mmap pages are shared, file-backed)')
+
+    median = results['exact (brand)'][0]
+    if args.max_us is not None and median > args.max_us:
+        print(f'FAIL: median {median:.0f} us exceeds budget of {args.max_us:.0f} us')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
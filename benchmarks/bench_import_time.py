@@ -0,0 +1,80 @@
+"""Cold-start budget check: import time and time to the first health check.
+
+Each round runs in a fresh interpreter, so nothing is cached in-process:
+
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --max-import-ms 500 --max-first-request-ms 800
+
+Exits 1 when a median goes over its budget, so it can gate CI or a deploy.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main_hybrid
+imported = time.perf_counter()
+client = main_hybrid.get_app().test_client()
+status = client.get('/').status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (served - started) * 1000,
+    'status': status,
+    'openai_imported': 'openai' in sys.modules
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure main_hybrid cold-start time')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, help='fail if the median import time exceeds this')
+    parser.add_argument('--max-first-request-ms', type=float,
+                        help='fail if the median time from import to the first / response exceeds this')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='hvac-bench-')
+    env = dict(os.environ,
+               SESSION_STORE_PATH=os.path.join(scratch, 'sessions.db'),
+               QUICK_SUBMIT_INDEX_PATH=os.path.join(scratch, 'quick_submit_index.db'),
+               IMAGE_STORE_DIR=os.path.join(scratch, 'uploads'))
+
+    runs = []
+    for _ in range(args.rounds):
+        output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    import_ms = statistics.median(run['import_ms'] for run in runs)
+    first_request_ms = statistics.median(run['first_request_ms'] for run in runs)
+    print(f"import main_hybrid   median {import_ms:.0f} ms  best {min(run['import_ms'] for run in runs):.0f} ms")
+    print(f"first / response     median {first_request_ms:.0f} ms  "
+          f"best {min(run['first_request_ms'] for run in runs):.0f} ms")
+    print(f"openai imported by first request: {any(run['openai_imported'] for run in runs)}")
+
+    failed = False
+    if any(run['status'] != 200 for run in runs):
+        print('FAIL: health check did not return 200')
+        failed = True
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f'FAIL: median import {import_ms:.0f} ms exceeds budget of {args.max_import_ms:.0f} ms')
+        failed = True
+    if args.max_first_request_ms is not None and first_request_ms > args.max_first_request_ms:
+        print(f'FAIL: median first request {first_request_ms:.0f} ms exceeds budget of '
+              f'{args.max_first_request_ms:.0f} ms')
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
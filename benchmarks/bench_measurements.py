@@ -0,0 +1,65 @@
+"""Microbenchmark for the refrigerant measurement-analysis engine.
+
+Times single-ticket analysis (the per-request path) and batch analysis over
+many tickets with mixed refrigerants (the /api/diagnostic/batch path):
+
+    python benchmarks/bench_measurements.py
+    python benchmarks/bench_measurements.py --batch 50000 --max-us 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from refrigerant import PT_TABLES_KPA, analyze, analyze_batch  # noqa: E402
+
+
+def synthetic_measurements(rng):
+    return {
+        'refrigerant': rng.choice(list(PT_TABLES_KPA)),
+        'suction_pressure': str(round(rng.uniform(40, 150), 1)),
+        'discharge_pressure': str(round(rng.uniform(180, 420), 1)),
+        'suction_line_temperature': str(round(rng.uniform(35, 70), 1)),
+        'liquid_line_temperature': str(round(rng.uniform(75, 110), 1)),
+        'return_air_temperature': str(round(rng.uniform(68, 80), 1)),
+        'supply_air_temperature': str(round(rng.uniform(50, 65), 1)),
+        'ambient_temperature': str(round(rng.uniform(70, 105), 1))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark refrigerant measurement analysis')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--singles', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--max-us', type=float, help='fail if the median single-ticket time exceeds this many microseconds')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    tickets = [synthetic_measurements(rng) for _ in range(max(args.singles, args.batch))]
+
+    single, batch = [], []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        for measurements in tickets[:args.singles]:
+            analyze(measurements)
+        single.append((time.perf_counter() - start) / args.singles * 1e6)
+
+        start = time.perf_counter()
+        analyze_batch(tickets[:args.batch])
+        batch.append((time.perf_counter() - start) / args.batch * 1e6)
+
+    median = statistics.median(single)
+    print(f'single ticket   median {median:.1f} us  best {min(single):.1f} us')
+    print(f'batch of {args.batch:<6} median {statistics.median(batch):.1f} us/ticket  best {min(batch):.1f} us/ticket')
+    if args.max_us is not None and median > args.max_us:
+        print(f'FAIL: median {median:.1f} us exceeds budget of {args.max_us:.1f} us')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
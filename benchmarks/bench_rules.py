@@ -0,0 +1,70 @@
+"""Microbenchmark for the rule-based path of get_enhanced_diagnosis.
+
+Runs with LLM enhancement disabled so only rule evaluation is measured. Pass
+--max-us to fail (exit 1) when the median per-call time exceeds a budget, so
+regressions in the rule path show up in review:
+
+    python benchmarks/bench_rules.py
+    python benchmarks/bench_rules.py --max-us 50
+"""
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def load_app():
+    os.environ.pop('OPENAI_API_KEY', None)
+    os.environ.setdefault('SESSION_STORE_PATH', os.path.join(tempfile.mkdtemp(prefix='hvac-bench-'), 'sessions.db'))
+    import main_hybrid
+    main_hybrid.init_services()
+    return main_hybrid
+
+
+def symptom_cases(app_module):
+    ids = [s['id'] for s in app_module.SYMPTOMS]
+    cases = [[]]
+    for size in (1, 2, 3):
+        cases.extend(list(combo) for combo in itertools.combinations(ids, size))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark get_enhanced_diagnosis (rules only)')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--loops', type=int, default=20, help='passes over all symptom cases per round')
+    parser.add_argument('--max-us', type=float, help='fail if the median microseconds per call exceeds this')
+    args = parser.parse_args()
+
+    app_module = load_app()
+    cases = symptom_cases(app_module)
+    diagnose = app_module.get_enhanced_diagnosis
+
+    per_call = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        for _ in range(args.loops):
+            for symptoms in cases:
+                diagnose('split_system', 'Rooftop', symptoms, {}, [], '')
+        per_call.append((time.perf_counter() - start) / (args.loops * len(cases)) * 1e6)
+
+    median = statistics.median(per_call)
+    print(f'get_enhanced_diagnosis (rules only): {len(cases)} symptom sets x {args.loops} loops x {args.rounds} rounds')
+    print(f'  median {median:.2f} us/call   best {min(per_call):.2f}   worst {max(per_call):.2f}')
+    batch_start = time.perf_counter()
+    app_module.rule_engine.batch_results(cases * args.loops)
+    batch_us = (time.perf_counter() - batch_start) / (args.loops * len(cases)) * 1e6
+    print(f'  batch scoring {batch_us:.2f} us/submission')
+
+    if args.max_us is not None and median > args.max_us:
+        print(f'FAIL: median {median:.2f} us/call exceeds budget of {args.max_us:.2f} us')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Query latency of the quick-submit description index at scale.
+
+Fills a fresh index with synthetic technician descriptions, then times
+lookups of paraphrased stored descriptions (one word dropped, words
+reordered) and of new unrelated ones:
+
+    python benchmarks/bench_similarity.py --size 1000000
+    python benchmarks/bench_similarity.py --size 100000 --max-us 1000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity_index import DescriptionIndex  # noqa: E402
+
+COMMON_WORDS = (
+    'warm air ice suction line coil breaker trip fan noise grinding water leak drain burning smell short cycling '
+    'compressor hum display thermostat blank pressure high low condenser dirty capacitor contactor squeal belt '
+    'vibration startup error code outdoor indoor blower motor defrost reversing valve refrigerant charge filter '
+    'clogged duct airflow weak humid musty tstat wiring fuse transformer board flashing light rattling'
+).split()
+# Site, zone and model identifiers make up the long tail of real descriptions
+TAIL_PREFIXES = ('site', 'zone', 'model', 'bldg', 'rtu', 'suite', 'serial')
+
+
+def synthetic_description(rng):
+    words = rng.sample(COMMON_WORDS, rng.randint(2, 4))
+    words += [f'{rng.choice(TAIL_PREFIXES)}{rng.randrange(100000)}' for _ in range(rng.randint(3, 5))]
+    rng.shuffle(words)
+    return ' '.join(words)
+
+
+def paraphrase(rng, description):
+    """Drop one word and reorder the rest, keeping Jaccard similarity at 0.8 or above"""
+    words = description.split()
+    words.pop(rng.randrange(len(words)))
+    rng.shuffle(words)
+    return ', '.join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DescriptionIndex lookups')
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=20000)
+    parser.add_argument('--path', help='index file; default is a fresh temporary file')
+    parser.add_argument('--max-us', type=float, help='fail if the median lookup exceeds this many microseconds')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix='hvac-bench-'), 'descriptions.db')
+    index = DescriptionIndex(path)
+    analysis = {'primary_issue': 'ChatGPT-4 Professional Analysis', 'summary': 'x' * 2000, 'chatgpt_analysis': True}
+
+    stored = []
+    start = time.perf_counter()
+    for offset in range(0, args.size, args.batch):
+        batch = [synthetic_description(rng) for _ in range(offset, min(args.size, offset + args.batch))]
+        index.add_many((description, analysis) for description in batch)
+        stored.extend(rng.sample(batch, min(len(batch), max(1, args.queries // max(1, args.size // args.batch)))))
+    print(f'indexed {args.size} descriptions in {time.perf_counter() - start:.1f}s ({path})')
+
+    probes = {
+        'near-duplicate': [paraphrase(rng, description) for description in stored[:args.queries]],
+        'unrelated': [synthetic_description(rng) for _ in range(args.queries)]
+    }
+    for name, queries in probes.items():
+        timings, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            hits += index.lookup(query) is not None
+            timings.append((time.perf_counter() - started) * 1e6)
+        timings.sort()
+        median = statistics.median(timings)
+        print(f'{name:<15} {len(queries)} lookups  hit rate {hits / len(queries):.2%}  '
+              f'p50 {median:.0f} us  p99 {timings[int(len(timings) * 0.99) - 1]:.0f} us')
+        if args.max_us is not None and median > args.max_us:
+            print(f'FAIL: median {median:.0f} us exceeds budget of {args.max_us:.0f} us')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
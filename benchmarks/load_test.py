@@ -0,0 +1,182 @@
+"""Load profiles against the diagnostic API with a stubbed OpenAI upstream.
+
+By default the stub OpenAI server and the Flask app both run in this process
+(threaded werkzeug server), so results are reproducible on a laptop:
+
+    python benchmarks/load_test.py --profile all --concurrency 32 --requests 400
+    python benchmarks/load_test.py --profile guided --latency 1.5 --unique-ratio 1.0
+
+Use --target to load an already running deployment instead (start it with
+OPENAI_API_BASE pointing at stub_openai_server.py); memory is then only
+reported for this client process.
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_openai_server import start_stub_server  # noqa: E402
+
+SYMPTOM_SETS = [
+    ['not_cooling', 'ice_buildup'],
+    ['insufficient_cooling'],
+    ['frequent_breaker_trips'],
+    ['unusual_noise', 'excessive_vibration'],
+    ['burning_smell', 'unit_not_starting'],
+    ['water_leak']
+]
+EQUIPMENT = ['split_system', 'mini_split', 'package_unit', 'heat_pump']
+
+
+def _location(i, unique_ratio):
+    # Repeated locations hit the diagnosis cache; unique ones force an upstream call
+    return f'Site {i}' if random.random() < unique_ratio else 'Rooftop'
+
+
+def guided_request(i, unique_ratio):
+    return 'POST', '/api/diagnostic/guided', {
+        'equipment_type': EQUIPMENT[i % len(EQUIPMENT)],
+        'location': _location(i, unique_ratio),
+        'symptoms': SYMPTOM_SETS[i % len(SYMPTOM_SETS)],
+        'measurements': {'suction_pressure': 118, 'discharge_pressure': 350},
+        'error_codes': [],
+        'additional_notes': 'Unit short cycling in the afternoon'
+    }
+
+
+def quick_submit_request(i, unique_ratio):
+    return 'POST', '/api/diagnostic/quick-submit', {
+        'location': _location(i, unique_ratio),
+        'description': 'Unit blowing warm air, ice on the suction line'
+    }
+
+
+def follow_up_request(i, unique_ratio):
+    return 'POST', '/api/follow-up', {
+        'original_analysis': '## Primary Diagnosis\nLow refrigerant charge.\n' * 20,
+        'follow_up_question': f'What superheat should I expect at {70 + i % 20}F ambient?',
+        'diagnostic_context': {'equipment_type': 'split_system', 'symptoms': ['not_cooling']}
+    }
+
+
+def catalog_request(i, unique_ratio):
+    return 'GET', '/api/equipment/types' if i % 2 else '/api/equipment/symptoms', None
+
+
+PROFILES = {
+    'guided': guided_request,
+    'quick-submit': quick_submit_request,
+    'follow-up': follow_up_request,
+    'catalog': catalog_request
+}
+
+
+def start_local_app(stub_base_url):
+    """Import the app against the stub upstream and serve it on an ephemeral port"""
+    os.environ['OPENAI_API_KEY'] = 'stub'
+    os.environ['OPENAI_API_BASE'] = stub_base_url
+    os.environ.setdefault('SESSION_STORE_PATH', os.path.join(tempfile.mkdtemp(prefix='hvac-bench-'), 'sessions.db'))
+    from werkzeug.serving import make_server
+    import main_hybrid
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, main_hybrid.get_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def send(target, method, path, payload, timeout):
+    parts = urlsplit(target)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    body = json.dumps(payload) if payload is not None else None
+    headers = {'Content-Type': 'application/json'} if body else {}
+    start = time.perf_counter()
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        ok = response.status < 400
+    except (OSError, http.client.HTTPException):
+        ok = False
+    finally:
+        conn.close()
+    return time.perf_counter() - start, ok
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def run_profile(target, name, requests, concurrency, unique_ratio, timeout):
+    make_request = PROFILES[name]
+    planned = [make_request(i, unique_ratio) for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda r: send(target, *r, timeout), planned))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        'profile': name,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, ok in results if not ok),
+        'requests_per_second': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the HVAC diagnostic API')
+    parser.add_argument('--profile', choices=sorted(PROFILES) + ['all'], default='all')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--unique-ratio', type=float, default=0.5, help='fraction of requests that miss the cache')
+    parser.add_argument('--target', help='base URL of a running server; default starts one in-process')
+    parser.add_argument('--latency', type=float, default=0.5, help='stub first-token latency in seconds')
+    parser.add_argument('--tokens-per-second', type=float, default=200.0)
+    parser.add_argument('--completion-tokens', type=int, default=200)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--json', action='store_true', help='print one JSON object per profile')
+    args = parser.parse_args()
+
+    target = args.target
+    if not target:
+        _, stub_url = start_stub_server(
+            latency=args.latency,
+            tokens_per_second=args.tokens_per_second,
+            completion_tokens=args.completion_tokens
+        )
+        _, target = start_local_app(stub_url)
+
+    names = sorted(PROFILES) if args.profile == 'all' else [args.profile]
+    if not args.json:
+        print(f"{'profile':<14}{'req':>7}{'conc':>6}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}")
+    for name in names:
+        result = run_profile(target, name, args.requests, args.concurrency, args.unique_ratio, args.timeout)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(f"{name:<14}{result['requests']:>7}{result['concurrency']:>6}{result['errors']:>6}"
+                  f"{result['requests_per_second']:>9}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                  f"{result['p99_ms']:>10}{result['peak_rss_mb']:>9}")
+
+
+if __name__ == '__main__':
+    main()
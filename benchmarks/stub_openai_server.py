@@ -0,0 +1,159 @@
+"""Local OpenAI-compatible stand-in for benchmarking.
+
+Serves POST /v1/chat/completions (streaming and non-streaming) with a
+configurable first-token latency and token rate, so load tests measure this
+service rather than the real API.
+
+    python benchmarks/stub_openai_server.py --port 8900 --latency 0.8 --tokens-per-second 80
+    OPENAI_API_KEY=stub OPENAI_API_BASE=http://127.0.0.1:8900/v1 python main_hybrid.py
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ('Check', 'the', 'suction', 'pressure', 'and', 'verify', 'superheat', 'against', 'the',
+         'manufacturer', 'chart', 'before', 'adding', 'refrigerant', '.')
+
+
+class StubConfig:
+    def __init__(self, latency=0.5, tokens_per_second=100.0, completion_tokens=300, error_rate=0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def next_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+
+
+def _completion_tokens(body, config):
+    return max(1, min(config.completion_tokens, int(body.get('max_tokens') or config.completion_tokens)))
+
+
+def _prompt_tokens(body):
+    return sum(len(str(m.get('content', ''))) for m in body.get('messages', [])) // 4
+
+
+def make_handler(config):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {'error': {'message': 'Not found'}})
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            number = config.next_request()
+            if config.error_rate and (number * 7919) % 1000 < config.error_rate * 1000:
+                self._send_json(500, {'error': {'message': 'Stub upstream failure', 'type': 'server_error'}})
+                return
+
+            time.sleep(config.latency)
+            tokens = _completion_tokens(body, config)
+            usage = {
+                'prompt_tokens': _prompt_tokens(body),
+                'completion_tokens': tokens,
+                'total_tokens': _prompt_tokens(body) + tokens
+            }
+            completion_id = f'chatcmpl-{uuid.uuid4().hex[:12]}'
+            model = body.get('model', 'stub')
+
+            if not body.get('stream'):
+                time.sleep(tokens / config.tokens_per_second)
+                text = ' '.join(WORDS[i % len(WORDS)] for i in range(tokens))
+                self._send_json(200, {
+                    'id': completion_id,
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                    'usage': usage
+                })
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for i in range(tokens):
+                time.sleep(1 / config.tokens_per_second)
+                self._send_event({
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': WORDS[i % len(WORDS)] + ' '}, 'finish_reason': None}]
+                })
+            if (body.get('stream_options') or {}).get('include_usage'):
+                self._send_event({
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                    'choices': [], 'usage': usage
+                })
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.close_connection = True
+
+        def _send_event(self, payload):
+            self.wfile.write(f'data: {json.dumps(payload)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+
+    return StubHandler
+
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 refuses connections long before the app under test saturates
+    request_queue_size = 4096
+    daemon_threads = True
+
+
+def start_stub_server(host='127.0.0.1', port=0, **config_kwargs):
+    """Start the stub in a daemon thread and return (server, base_url)"""
+    config = StubConfig(**config_kwargs)
+    server = StubServer((host, port), make_handler(config))
+    server.config = config
+    threading.Thread(target=server.serve_forever, name='stub-openai', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/v1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI-compatible stub server for load testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=100.0)
+    parser.add_argument('--completion-tokens', type=int, default=300)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        args.host, args.port,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate
+    )
+    print(f'Stub OpenAI server listening on {base_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
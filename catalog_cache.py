@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import json
+import threading
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def catalog_version(equipment_types, symptoms):
+    """Content hash of the catalog; changes whenever any entry changes"""
+    canonical = json.dumps({'equipment_types': equipment_types, 'symptoms': symptoms}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+class PrecompressedPayload:
+    """A response body serialized once, with its compressed variants and their strong ETags"""
+
+    def __init__(self, body):
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.encodings = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if BROTLI_AVAILABLE:
+            self.encodings['br'] = brotli.compress(body, quality=11)
+        # Each encoding is a distinct representation, so each gets its own strong ETag
+        self.etags = {
+            encoding: f'"{self.digest}"' if encoding == 'identity' else f'"{self.digest}-{encoding}"'
+            for encoding in self.encodings
+        }
+
+    def negotiate(self, accept_encoding):
+        """Return (content_encoding, body) for an Accept-Encoding header, smallest acceptable first"""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding, self.encodings[encoding]
+        return 'identity', self.body
+
+    def matches(self, if_none_match):
+        """True if If-None-Match names any encoding of this payload (weak comparison, per RFC 9110)"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        if '*' in tags:
+            return True
+        known = set(self.etags.values())
+        return any((tag[2:] if tag.startswith('W/') else tag) in known for tag in tags)
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class CatalogCache:
+    """Precomputed catalog responses, rebuilt only when the catalog content changes"""
+
+    def __init__(self, dumps):
+        self._dumps = dumps
+        self._lock = threading.Lock()
+        self.version = None
+        self.payloads = {}
+        self.builds = 0
+
+    def update(self, equipment_types, symptoms):
+        version = catalog_version(equipment_types, symptoms)
+        if version == self.version:
+            return False
+        payloads = {
+            'equipment_types': self._payload({'success': True, 'equipment_types': equipment_types}),
+            'symptoms': self._payload({'success': True, 'symptoms': symptoms}),
+            'catalog': self._payload({
+                'success': True,
+                'version': version,
+                'equipment_types': equipment_types,
+                'symptoms': symptoms
+            })
+        }
+        # Swapped in one assignment so readers never see a mix of old and new payloads
+        with self._lock:
+            self.payloads = payloads
+            self.version = version
+            self.builds += 1
+        return True
+
+    def _payload(self, data):
+        return PrecompressedPayload((self._dumps(data) + '\n').encode('utf-8'))
+
+    def get(self, name):
+        return self.payloads[name]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'builds': self.builds,
+                'brotli_available': BROTLI_AVAILABLE,
+                'sizes': {
+                    name: {encoding: len(body) for encoding, body in payload.encodings.items()}
+                    for name, payload in self.payloads.items()
+                }
+            }
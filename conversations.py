@@ -0,0 +1,129 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English prose)"""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _first_sentence(text, max_chars):
+    text = ' '.join(text.split())
+    match = re.search(r'(?<=[.!?])\s', text)
+    sentence = text[:match.start()] if match else text
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3].rstrip() + '...'
+
+
+def outline_analysis(analysis, token_budget):
+    """Compact a markdown analysis to its headings and the first line under each"""
+    if estimate_tokens(analysis) <= token_budget:
+        return analysis
+    lines = []
+    take_next = False
+    for line in analysis.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith('#'):
+            lines.append(stripped)
+            take_next = True
+        elif take_next:
+            lines.append(_first_sentence(stripped, 240))
+            take_next = False
+    outline = '\n'.join(lines) or analysis
+    max_chars = token_budget * 4
+    return outline if len(outline) <= max_chars else outline[:max_chars - 3].rstrip() + '...'
+
+
+class Conversation:
+    def __init__(self, session_id, analysis, diagnostic_context):
+        self.session_id = session_id
+        self.analysis = analysis
+        self.diagnostic_context = diagnostic_context
+        self.summaries = []
+        self.turns = []
+        self.all_turns_tokens = 0
+        self.updated_at = time.time()
+
+
+class ConversationStore:
+    """Server-side follow-up threads keyed by session id.
+
+    The most recent turns are kept verbatim; once the context exceeds the
+    token budget, older turns are folded into one-line summaries and the
+    original analysis is reduced to an outline, so follow-up prompts stay
+    bounded no matter how long the conversation runs.
+    """
+
+    def __init__(self, token_budget=1500, analysis_token_budget=700, recent_turns=2, max_conversations=10000):
+        self.token_budget = token_budget
+        self.analysis_token_budget = analysis_token_budget
+        self.recent_turns = recent_turns
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+        self.tokens_saved = 0
+
+    def get(self, session_id):
+        with self._lock:
+            conversation = self._conversations.get(session_id)
+            if conversation is not None:
+                self._conversations.move_to_end(session_id)
+            return conversation
+
+    def start(self, session_id, analysis, diagnostic_context):
+        conversation = Conversation(session_id, analysis or '', diagnostic_context or {})
+        with self._lock:
+            self._conversations[session_id] = conversation
+            self._conversations.move_to_end(session_id)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        return conversation
+
+    def build_context(self, conversation):
+        """Return (analysis, history, tokens_saved) for the next follow-up prompt"""
+        with self._lock:
+            analysis = conversation.analysis
+            history = self._history(conversation)
+            full_tokens = estimate_tokens(analysis) + conversation.all_turns_tokens
+            if estimate_tokens(analysis) + estimate_tokens(history) > self.token_budget:
+                analysis = outline_analysis(analysis, self.analysis_token_budget)
+                self._compact(conversation, self.token_budget - estimate_tokens(analysis))
+                history = self._history(conversation)
+            saved = max(0, full_tokens - estimate_tokens(analysis) - estimate_tokens(history))
+            self.tokens_saved += saved
+            return analysis, history, saved
+
+    def add_turn(self, conversation, question, answer):
+        with self._lock:
+            conversation.turns.append((question, answer))
+            conversation.all_turns_tokens += estimate_tokens(self._format_turn(question, answer))
+            conversation.updated_at = time.time()
+
+    def _format_turn(self, question, answer):
+        return f"Q: {question}\nA: {answer}"
+
+    def _history(self, conversation):
+        parts = []
+        if conversation.summaries:
+            parts.append('Earlier questions (summarized):\n' + '\n'.join(f"- {s}" for s in conversation.summaries))
+        parts.extend(self._format_turn(q, a) for q, a in conversation.turns)
+        return '\n\n'.join(parts)
+
+    def _compact(self, conversation, budget):
+        while len(conversation.turns) > self.recent_turns and estimate_tokens(self._history(conversation)) > budget:
+            question, answer = conversation.turns.pop(0)
+            conversation.summaries.append(f"{_first_sentence(question, 160)} -> {_first_sentence(answer, 200)}")
+        # Past the point where summaries alone overflow, the oldest ones go first
+        while conversation.summaries and estimate_tokens(self._history(conversation)) > budget:
+            conversation.summaries.pop(0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'conversations': len(self._conversations),
+                'token_budget': self.token_budget,
+                'prompt_tokens_saved': self.tokens_saved
+            }
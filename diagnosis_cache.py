@@ -0,0 +1,197 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_diagnostic_input(equipment_type, location, symptoms, measurements, error_codes, description):
+    """Normalize diagnostic inputs so equivalent submissions share one cache key"""
+    def clean(value):
+        return ' '.join(str(value).split()).lower() if value is not None else ''
+
+    normalized_measurements = {}
+    for name, value in (measurements or {}).items():
+        if value is None or value == '':
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = round(float(value), 2)
+        normalized_measurements[clean(name)] = value
+
+    return {
+        "equipment_type": clean(equipment_type),
+        "location": clean(location),
+        "symptoms": sorted({clean(s) for s in symptoms or [] if s}),
+        "measurements": normalized_measurements,
+        "error_codes": sorted({str(c).strip().upper() for c in error_codes or [] if str(c).strip()}),
+        "description": clean(description)
+    }
+
+
+def make_cache_key(normalized_input, model, prompt_version):
+    """Hash normalized inputs plus model and prompt version into a stable key"""
+    canonical = json.dumps(
+        {"input": normalized_input, "model": model, "prompt_version": prompt_version},
+        sort_keys=True,
+        separators=(',', ':'),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class DiagnosisCache:
+    """In-memory LRU with TTL, backed by an optional SQLite tier shared across processes.
+
+    With a path, invalidate() bumps a generation counter in the shared file and
+    every worker drops its in-memory tier when it next sees the new value.
+    """
+
+    def __init__(self, max_entries=1024, ttl=86400, path=None, prompt_version='', purge_every=256):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.prompt_version = prompt_version
+        self.purge_every = purge_every
+        self._writes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._generation = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk(self):
+        # Connections are not fork-safe, so each worker process opens its own
+        if not self.path:
+            return None
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS diagnosis_cache ('
+                'key TEXT PRIMARY KEY, prompt_version TEXT NOT NULL, '
+                'value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS diagnosis_cache_meta ('
+                'id INTEGER PRIMARY KEY CHECK (id = 1), generation INTEGER NOT NULL)'
+            )
+            conn.execute('INSERT OR IGNORE INTO diagnosis_cache_meta (id, generation) VALUES (1, 0)')
+            # Only expired rows go; rows of another prompt version are never read and may
+            # belong to workers of an older or newer release sharing this file
+            conn.execute('DELETE FROM diagnosis_cache WHERE expires_at < ?', (time.time(),))
+            conn.commit()
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _sync_generation(self, conn):
+        # Called under _lock; another worker's invalidate() shows up as a new generation
+        try:
+            generation = conn.execute('SELECT generation FROM diagnosis_cache_meta WHERE id = 1').fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Diagnosis cache generation read failed: {e}")
+            return
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            conn = self._disk()
+            if conn is not None:
+                self._sync_generation(conn)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+            if conn is not None:
+                try:
+                    row = conn.execute(
+                        'SELECT value, expires_at FROM diagnosis_cache WHERE key = ? AND prompt_version = ?',
+                        (key, self.prompt_version)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"Diagnosis cache read failed: {e}")
+                    row = None
+                if row and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return copy.deepcopy(value)
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, copy.deepcopy(value), expires_at)
+            conn = self._disk()
+            if conn is not None:
+                try:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO diagnosis_cache (key, prompt_version, value, expires_at) '
+                        'VALUES (?, ?, ?, ?)',
+                        (key, self.prompt_version, json.dumps(value), expires_at)
+                    )
+                    # A long-running worker would otherwise only shed expired rows when it reconnects
+                    self._writes += 1
+                    if self._writes % self.purge_every == 0:
+                        conn.execute('DELETE FROM diagnosis_cache WHERE expires_at < ?', (time.time(),))
+                    conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Diagnosis cache write failed: {e}")
+
+    def _remember(self, key, value, expires_at):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drop every entry, in every worker sharing the SQLite tier; returns False if the shared tier failed"""
+        with self._lock:
+            self._entries.clear()
+            conn = self._disk()
+            if conn is None:
+                return True
+            try:
+                conn.execute('DELETE FROM diagnosis_cache')
+                conn.execute('UPDATE diagnosis_cache_meta SET generation = generation + 1 WHERE id = 1')
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Diagnosis cache invalidation failed: {e}")
+                conn.rollback()
+                return False
+            self._sync_generation(conn)
+            return True
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'persistent': bool(self.path),
+                'generation': self._generation,
+                'prompt_version': self.prompt_version,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
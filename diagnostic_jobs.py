@@ -0,0 +1,98 @@
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class DiagnosticJobs:
+    """Bounded worker pool that enhances diagnostic sessions in the background"""
+
+    def __init__(self, max_workers=8, max_pending=256, max_sessions=10000, on_change=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_sessions = max_sessions
+        self.on_change = on_change
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='diagnostic-job')
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def remember(self, session):
+        with self._lock:
+            self._sessions[session['id']] = copy.deepcopy(session)
+            self._sessions.move_to_end(session['id'])
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if self.on_change:
+            self.on_change(session)
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return copy.deepcopy(session) if session is not None else None
+
+    def _update(self, session_id, **fields):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session.update(fields)
+            session = copy.deepcopy(session)
+        if self.on_change:
+            self.on_change(session)
+        return session
+
+    def submit(self, session, enhance):
+        """Mark the session pending and run enhance(ai_diagnosis) on the pool.
+
+        Returns False without queueing when the backlog is full, in which case
+        the caller should treat the rule-based result as final.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                return False
+            self._pending += 1
+
+        session['status'] = 'pending'
+        self.remember(session)
+        # The worker gets its own copy; the caller keeps serialising session after this returns
+        self._executor.submit(self._run, session['id'], copy.deepcopy(session['ai_diagnosis']), enhance)
+        return True
+
+    def _run(self, session_id, ai_diagnosis, enhance):
+        try:
+            ai_diagnosis = enhance(ai_diagnosis)
+            self._update(
+                session_id,
+                status='completed',
+                completed_at=datetime.now().isoformat(),
+                confidence_score=ai_diagnosis.get('confidence_score'),
+                ai_diagnosis=ai_diagnosis
+            )
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            print(f"Diagnostic job {session_id} failed: {e}")
+            self._update(session_id, status='failed', completed_at=datetime.now().isoformat(), error=str(e))
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'sessions': len(self._sessions),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
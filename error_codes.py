@@ -0,0 +1,277 @@
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS error_codes ('
+    'brand TEXT NOT NULL, code TEXT NOT NULL, model_family TEXT NOT NULL DEFAULT \'\', '
+    'meaning TEXT NOT NULL, severity TEXT, likely_causes TEXT NOT NULL DEFAULT \'[]\', '
+    'PRIMARY KEY (brand, code, model_family)) WITHOUT ROWID',
+    # Brand-agnostic lookups and prefix search scan this index
+    'CREATE INDEX IF NOT EXISTS idx_error_codes_code ON error_codes (code, brand)'
+]
+
+SEVERITY_CONFIDENCE = {'critical': 93, 'warning': 90, 'info': 80}
+# Safety warnings from a code point at the manufacturer's own procedure for it
+ERROR_CODE_COMPLIANCE = 'Manufacturer service instructions'
+
+
+def normalize_code(code):
+    """E-1, e1 and ' E1 ' all refer to the same code"""
+    return re.sub(r'[^0-9A-Z]', '', str(code).upper())
+
+
+def normalize_brand(brand):
+    return ' '.join(str(brand).split()).lower() if brand else ''
+
+
+def split_submitted_code(value):
+    """Split a submitted 'Brand:Code' string; plain codes have no brand"""
+    brand, sep, code = str(value).rpartition(':')
+    return (normalize_brand(brand), normalize_code(code)) if sep else ('', normalize_code(value))
+
+
+def _row_to_entry(row):
+    brand, code, model_family, meaning, severity, likely_causes = row
+    return {
+        'brand': brand,
+        'code': code,
+        'model_family': model_family or None,
+        'meaning': meaning,
+        'severity': severity,
+        'likely_causes': json.loads(likely_causes)
+    }
+
+
+class ErrorCodeDatabase:
+    """Manufacturer error-code knowledge base.
+
+    Entries live in a read-only SQLite file, opened lazily and read through
+    mmap, so worker startup and private memory do not grow with the number of
+    codes. Exact lookups hit the (brand, code) primary key and a small LRU of
+    hot codes; prefix search is a range scan on the code index. Build the file
+    with `python error_codes.py import codes.jsonl --db error_codes.db`.
+    """
+
+    def __init__(self, path, cache_size=4096, mmap_size=256 * 1024 * 1024):
+        self.path = path
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.cache_hits = 0
+
+    def available(self):
+        return bool(self.path) and os.path.exists(self.path)
+
+    def _conn(self):
+        # Opened on first use, one read-only connection per thread and process
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def lookup(self, code, brand=None, model_family=None):
+        """Entries for an exact code, narrowed by brand and model family when given"""
+        key = (normalize_code(code), normalize_brand(brand), model_family or '')
+        with self._lock:
+            self.lookups += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return list(self._cache[key])
+        if not key[0] or not self.available():
+            return []
+
+        sql = 'SELECT brand, code, model_family, meaning, severity, likely_causes FROM error_codes WHERE code = ?'
+        params = [key[0]]
+        if key[1]:
+            sql += ' AND brand = ?'
+            params.append(key[1])
+        if key[2]:
+            sql += ' AND model_family IN (?, \'\')'
+            params.append(key[2])
+        try:
+            entries = [_row_to_entry(row) for row in self._conn().execute(sql + ' LIMIT 50', params)]
+        except sqlite3.Error as e:
+            print(f"Error code lookup failed: {e}")
+            return []
+
+        with self._lock:
+            self._cache[key] = entries
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return list(entries)
+
+    def search(self, prefix, brand=None, limit=20):
+        """Codes starting with prefix, optionally within one brand, in code order"""
+        prefix = normalize_code(prefix)
+        brand = normalize_brand(brand)
+        if not self.available() or not (prefix or brand):
+            return []
+        sql = 'SELECT brand, code, model_family, meaning, severity, likely_causes FROM error_codes'
+        where, params = [], []
+        if prefix:
+            # A range on the code index instead of LIKE, which SQLite cannot use an index for here
+            where.append('code >= ? AND code < ?')
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+        if brand:
+            where.append('brand = ?')
+            params.append(brand)
+        sql += ' WHERE ' + ' AND '.join(where) + ' ORDER BY code, brand, model_family LIMIT ?'
+        params.append(limit)
+        try:
+            return [_row_to_entry(row) for row in self._conn().execute(sql, params)]
+        except sqlite3.Error as e:
+            print(f"Error code search failed: {e}")
+            return []
+
+    def decode(self, error_codes):
+        """Resolve submitted codes ('E1' or 'Carrier:E1') to knowledge-base entries.
+
+        A code is decoded only when it maps to exactly one meaning; codes that
+        mean different things for different brands are reported as ambiguous.
+        """
+        decoded = []
+        for value in error_codes or []:
+            brand, code = split_submitted_code(value)
+            entries = self.lookup(code, brand)
+            if not entries:
+                continue
+            meanings = {entry['meaning'] for entry in entries}
+            decoded.append({
+                'submitted': value,
+                'brand_matched': bool(brand),
+                'ambiguous': len(meanings) > 1,
+                'entry': entries[0] if len(meanings) == 1 else None,
+                'candidates': len(entries)
+            })
+        return decoded
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'available': self.available(),
+                'lookups': self.lookups,
+                'cache_hits': self.cache_hits,
+                'cached_keys': len(self._cache)
+            }
+
+
+def apply_error_codes(diagnosis, decoded):
+    """Fold decoded error codes into a rule-based diagnosis.
+
+    An unambiguous code is stronger evidence than a symptom pattern, so its
+    meaning becomes the primary issue, its causes lead the likely causes and
+    confidence rises with severity (a brand-qualified match counts most).
+    """
+    if not decoded:
+        return diagnosis
+    diagnosis = dict(diagnosis)
+    diagnosis['decoded_error_codes'] = decoded
+    resolved = [item for item in decoded if item['entry'] is not None]
+    if not resolved:
+        return diagnosis
+
+    best = max(resolved, key=lambda item: (
+        SEVERITY_CONFIDENCE.get(item['entry']['severity'], 80) + (3 if item['brand_matched'] else 0)
+    ))
+    entry = best['entry']
+    confidence = min(97, SEVERITY_CONFIDENCE.get(entry['severity'], 80) + (3 if best['brand_matched'] else 0))
+
+    causes = []
+    for item in resolved:
+        for rank, cause in enumerate(item['entry']['likely_causes']):
+            causes.append({'cause': cause, 'probability': max(50, 90 - rank * 10), 'source': f"error code {item['submitted']}"})
+    seen = {cause['cause'] for cause in causes}
+    causes.extend(cause for cause in diagnosis['likely_causes'] if cause['cause'] not in seen)
+
+    diagnosis['likely_causes'] = causes
+    if confidence > diagnosis['confidence_score']:
+        diagnosis['primary_issue'] = f"{entry['brand'].title()} {entry['code']}: {entry['meaning']}"
+        diagnosis['confidence_score'] = confidence
+    if any(item['entry']['severity'] == 'critical' for item in resolved):
+        # Same shape as the rule engine's warnings, so clients render both alike
+        diagnosis['safety_warnings'] = [
+            {
+                'level': 'critical',
+                'category': 'error_code',
+                'message': f"Error code {item['submitted']} is critical: {item['entry']['meaning']}",
+                'compliance': ERROR_CODE_COMPLIANCE
+            }
+            for item in resolved if item['entry']['severity'] == 'critical'
+        ] + list(diagnosis.get('safety_warnings', []))
+    return diagnosis
+
+
+def _read_records(source):
+    if source.endswith('.csv'):
+        with open(source, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                row['likely_causes'] = [c.strip() for c in (row.get('likely_causes') or '').split(';') if c.strip()]
+                yield row
+    else:
+        with open(source, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def import_records(records, db_path, batch_size=10000):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in SCHEMA:
+        conn.execute(statement)
+    count = 0
+    batch = []
+
+    def flush():
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO error_codes (brand, code, model_family, meaning, severity, likely_causes) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                batch
+            )
+        batch.clear()
+
+    for record in records:
+        code = normalize_code(record['code'])
+        brand = normalize_brand(record['brand'])
+        if not code or not brand or not record.get('meaning'):
+            continue
+        severity = (record.get('severity') or '').lower() or None
+        batch.append((brand, code, record.get('model_family') or '', record['meaning'], severity,
+                      json.dumps(list(record.get('likely_causes') or []))))
+        count += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    conn.execute('ANALYZE')
+    conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the manufacturer error-code database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    importer = sub.add_parser('import', help='load a CSV or JSON Lines export')
+    importer.add_argument('source')
+    importer.add_argument('--db', default=os.getenv('ERROR_CODE_DB_PATH', 'error_codes.db'))
+    args = parser.parse_args()
+    count = import_records(_read_records(args.source), args.db)
+    print(f'Imported {count} error codes into {args.db}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# Production launch configuration, replacing the Flask debug server:
+#
+#     gunicorn -c gunicorn.conf.py asgi_app:application
+#
+# Each worker is a uvicorn event loop; LLM-bound routes are coroutines, so
+# concurrency per worker is bounded by ASYNC_LLM_MAX_CONNECTIONS rather than
+# by threads. Scale workers with cores (CPU-bound rule evaluation and JSON
+# encoding), not with expected in-flight requests. Requires gunicorn, uvicorn
+# and a2wsgi alongside the Flask dependencies.
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Streamed completions can legitimately run for a while; keep this above LLM_TIMEOUT
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers occasionally to bound memory growth from long-lived caches
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = 1000
+
+# PRELOAD_APP=1 imports the app and compiles rules and catalogs once in the master, so
+# workers fork with them already built and share those pages copy-on-write. SQLite
+# connections, writer threads and HTTP pools are still opened per worker on first use.
+preload_app = os.getenv('PRELOAD_APP', '').lower() in ('1', 'true')
+
+# Workers publish their metrics here so /metrics on any of them covers the whole server
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'hvac-metrics-{os.getpid()}'))
+
+
+def on_starting(server):
+    # Readings left by an earlier run would otherwise be added to this one's
+    shutil.rmtree(os.environ['METRICS_MULTIPROC_DIR'], ignore_errors=True)
+    if preload_app:
+        import main_hybrid
+        main_hybrid.preload()
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ['METRICS_MULTIPROC_DIR'], ignore_errors=True)
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
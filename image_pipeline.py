@@ -0,0 +1,301 @@
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Pillow and pytesseract are only imported inside the worker processes that use them
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
+OCR_AVAILABLE = importlib.util.find_spec('pytesseract') is not None
+
+CHUNK_SIZE = 64 * 1024
+IMAGE_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Nameplate fields worth pulling out of OCR text for the technician
+NAMEPLATE_FIELDS = {
+    'model_number': re.compile(r'\bMOD(?:EL)?\.?\s*(?:NO\.?|#)?\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-/]{3,})', re.I),
+    'serial_number': re.compile(r'\bSER(?:IAL)?\.?\s*(?:NO\.?|#)?\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-]{3,})', re.I),
+    'refrigerant': re.compile(r'\b(R-?(?:410A|22|32|454B|407C|134A))\b', re.I)
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def spool_upload(stream, max_bytes, memory_limit):
+    """Copy an upload stream into a spooled temp file, hashing it on the way.
+
+    At most memory_limit bytes are held in memory before the file rolls over
+    to disk. Returns (spooled_file, sha256_hex, size).
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=memory_limit)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f'Image exceeds the {max_bytes // (1024 * 1024)} MB limit')
+            digest.update(chunk)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled, digest.hexdigest(), size
+
+
+def parse_nameplate(text):
+    fields = {}
+    for name, pattern in NAMEPLATE_FIELDS.items():
+        match = pattern.search(text)
+        if match:
+            fields[name] = match.group(1).upper()
+    return fields
+
+
+def _save_jpeg(image, path, **options):
+    # Written aside and swapped in, so a reader never sees a half-written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    image.save(tmp_path, 'JPEG', **options)
+    os.replace(tmp_path, path)
+
+
+def process_image(original_path, out_dir, max_dimension, thumbnail_size, ocr):
+    """Strip metadata, downscale, thumbnail and OCR one image. Runs in a worker process."""
+    from PIL import Image, ImageOps
+    with Image.open(original_path) as image:
+        width, height = image.size
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+        # Re-encoding a fresh image without exif= leaves EXIF, GPS and maker notes behind
+        processed = image.copy()
+        processed.thumbnail((max_dimension, max_dimension))
+        _save_jpeg(processed, os.path.join(out_dir, 'processed.jpg'), quality=85, optimize=True)
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail((thumbnail_size, thumbnail_size))
+        _save_jpeg(thumbnail, os.path.join(out_dir, 'thumbnail.jpg'), quality=80)
+
+        result = {
+            'original_size': [width, height],
+            'processed_size': list(processed.size),
+            'ocr_available': ocr
+        }
+        if ocr:
+            import pytesseract
+            text = pytesseract.image_to_string(ImageOps.grayscale(processed)).strip()
+            result['text_detected'] = text
+            result['nameplate'] = parse_nameplate(text)
+        return result
+
+
+class ImagePipeline:
+    """Content-addressed image store with processing on a process pool.
+
+    Uploads are deduplicated by SHA-256, so the same photo attached twice is
+    stored and processed once. EXIF stripping, downscaling, thumbnails and
+    OCR run in worker processes; the request only spools and hashes the body.
+    Across server workers, an image is processed by whichever one holds the
+    lock on its processing.lock file; the lock dies with its holder.
+    """
+
+    def __init__(self, store_dir, max_workers=2, max_pending=32, max_dimension=2048, thumbnail_size=256):
+        # send_file resolves relative paths against the app root, not the working directory
+        self.store_dir = os.path.abspath(store_dir)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_dimension = max_dimension
+        self.thumbnail_size = thumbnail_size
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = {}
+        self._claims = {}
+        self.uploaded = 0
+        self.deduplicated = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _check_pid(self):
+        # Pools and pending jobs do not survive fork, so a forked worker starts fresh; call under _lock
+        if self._pid != os.getpid():
+            self._executor = None
+            self._pending = {}
+            self._claims = {}
+            self._pid = os.getpid()
+
+    def _pool(self):
+        # Created on first use; spawned rather than forked from a threaded server process
+        if self._executor is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def image_dir(self, image_id):
+        return os.path.join(self.store_dir, image_id[:2], image_id)
+
+    def _write_record(self, record):
+        path = os.path.join(self.image_dir(record['id']), 'image.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+    def _read_record(self, image_id):
+        try:
+            with open(os.path.join(self.image_dir(image_id), 'image.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _claim(self, image_id):
+        """Take the cross-process processing lock for an image; False if another worker holds it"""
+        if not FCNTL_AVAILABLE:
+            # Without flock there is no other worker to coordinate with (the dev server is one process)
+            return True
+        fd = os.open(os.path.join(self.image_dir(image_id), 'processing.lock'), os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        with self._lock:
+            self._claims[image_id] = fd
+        return True
+
+    def _release(self, image_id):
+        with self._lock:
+            self._pending.pop(image_id, None)
+            fd = self._claims.pop(image_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def get(self, image_id):
+        if not IMAGE_ID_PATTERN.match(image_id or ''):
+            return None
+        with self._lock:
+            self._check_pid()
+            if image_id in self._pending:
+                return dict(self._pending[image_id])
+        return self._read_record(image_id)
+
+    def admit(self):
+        """Check for room in the processing backlog before an upload body is read"""
+        with self._lock:
+            self._check_pid()
+            if len(self._pending) < self.max_pending:
+                return True
+            self.rejected += 1
+            return False
+
+    def store(self, spooled, image_id, size, content_type=None, filename=None):
+        """Save a spooled upload and queue its processing; returns (record, deduplicated)"""
+        record = {
+            'id': image_id,
+            'size': size,
+            'content_type': content_type,
+            'filename': filename,
+            'uploaded_at': datetime.now().isoformat(),
+            'status': 'processing' if PIL_AVAILABLE else 'stored'
+        }
+        existing = self.get(image_id)
+        with self._lock:
+            # Identical concurrent uploads in this process claim the id once; the rest share that record
+            if image_id in self._pending or (existing is not None and existing['status'] not in ('failed', 'processing')):
+                self.deduplicated += 1
+                return dict(self._pending.get(image_id) or existing), True
+            self._pending[image_id] = record
+
+        image_dir = self.image_dir(image_id)
+        original_path = os.path.join(image_dir, 'original')
+        try:
+            os.makedirs(image_dir, exist_ok=True)
+            # A 'processing' record whose lock nobody holds was left by a crash, so it is redone;
+            # one another worker is still processing, or has just finished, is shared instead
+            claimed = self._claim(image_id)
+            current = self._read_record(image_id) if claimed else None
+            if not claimed or (current is not None and current['status'] not in ('failed', 'processing')):
+                self._release(image_id)
+                with self._lock:
+                    self.deduplicated += 1
+                return current or self._read_record(image_id) or dict(record), True
+            with self._lock:
+                self.uploaded += 1
+            tmp_path = f'{original_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                shutil.copyfileobj(spooled, f, CHUNK_SIZE)
+            os.replace(tmp_path, original_path)
+            self._write_record(record)
+        except OSError:
+            self._release(image_id)
+            raise
+
+        if not PIL_AVAILABLE:
+            # Without Pillow the original is kept as uploaded and nothing is queued
+            self._release(image_id)
+            return dict(record), False
+
+        with self._lock:
+            pool = self._pool()
+        try:
+            future = pool.submit(process_image, original_path, image_dir, self.max_dimension, self.thumbnail_size,
+                                 OCR_AVAILABLE)
+        except Exception:
+            self._release(image_id)
+            raise
+        future.add_done_callback(lambda done: self._finish(record, done))
+        return dict(record), False
+
+    def _finish(self, record, future):
+        record = dict(record, completed_at=datetime.now().isoformat())
+        try:
+            record.update(future.result(), status='completed')
+            counter = 'processed'
+        except Exception as e:
+            print(f"Image processing failed for {record['id']}: {e}")
+            record.update(status='failed', error=str(e))
+            counter = 'failed'
+        try:
+            self._write_record(record)
+        except OSError as e:
+            print(f"Image record write failed for {record['id']}: {e}")
+        self._release(record['id'])
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'store_dir': self.store_dir,
+                'pillow_available': PIL_AVAILABLE,
+                'ocr_available': OCR_AVAILABLE,
+                'workers': self.max_workers,
+                'pending': len(self._pending) if self._pid == os.getpid() else 0,
+                'max_pending': self.max_pending,
+                'uploaded': self.uploaded,
+                'deduplicated': self.deduplicated,
+                'processed': self.processed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,412 @@
+import asyncio
+import functools
+import importlib.util
+import random
+import sys
+import threading
+import time
+
+# openai and httpx are a large share of startup time, so they are imported
+# when the first client is built rather than with this module
+OPENAI_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('openai', 'httpx'))
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors():
+    """Failures worth retrying; anything else (bad request, auth) is the caller's problem"""
+    import openai
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError
+    )
+
+
+def is_timeout_error(error):
+    # Anything raised by openai means it is loaded already, so this never triggers the import
+    openai = sys.modules.get('openai')
+    return openai is not None and isinstance(error, openai.APITimeoutError)
+
+
+def is_rate_limit_error(error):
+    # A 429 is upstream pacing this client, not upstream being unhealthy
+    openai = sys.modules.get('openai')
+    return openai is not None and isinstance(error, openai.RateLimitError)
+
+
+def is_upstream_failure(error):
+    """Errors that say upstream is unhealthy; a stream can also break off with a raw httpx error"""
+    httpx = sys.modules.get('httpx')
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, retryable_errors()) and not is_rate_limit_error(error)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single trial call through after a cool-down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == 'open' and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.times_opened += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout_seconds': self.reset_timeout,
+                'times_opened': self.times_opened
+            }
+
+
+class _MonitoredStream:
+    """Streaming completion that reports to the breaker once it has been read to the end.
+
+    create() returns as soon as the response headers arrive, so success is
+    only known after the last chunk. A stream the caller abandons early
+    says nothing about upstream and just frees a half-open trial.
+    """
+
+    def __init__(self, stream, gateway):
+        self._stream = stream
+        self._gateway = gateway
+        self._settled = False
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _settle(self, error=None, abandoned=False):
+        if not self._settled:
+            self._settled = True
+            self._gateway._stream_outcome(error, abandoned)
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                yield chunk
+        except GeneratorExit:
+            self._settle(abandoned=True)
+            raise
+        except Exception as e:
+            self._settle(e)
+            raise
+        self._settle()
+
+    def close(self):
+        self._settle(abandoned=True)
+        self._stream.close()
+
+
+class _AsyncMonitoredStream(_MonitoredStream):
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            self._settle(abandoned=True)
+            raise
+        except Exception as e:
+            self._settle(e)
+            raise
+        self._settle()
+
+    async def close(self):
+        self._settle(abandoned=True)
+        await self._stream.close()
+
+
+class _GatewayBase:
+    """Counters, breaker and retry policy shared by the sync and async gateways"""
+
+    def __init__(self, api_key, base_url, timeout, max_retries, backoff, max_connections, max_keepalive,
+                 failure_threshold, reset_timeout, breaker):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.breaker = breaker or CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self._http = None
+        self._client = None
+
+    @property
+    def client(self):
+        # Built on the first call, so a worker that never reaches the LLM never imports openai
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+
+    def _http_timeout(self):
+        import httpx
+        return httpx.Timeout(self.timeout, connect=min(5.0, self.timeout))
+
+    def _admit(self):
+        if not self.breaker.allow():
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError('LLM circuit breaker is open')
+
+    def _start_attempt(self, deadline):
+        remaining = deadline - time.monotonic()
+        with self._lock:
+            self.calls += 1
+        if remaining <= 0:
+            import httpx
+            import openai
+            raise openai.APITimeoutError(request=httpx.Request('POST', str(self.client.base_url)))
+        return remaining
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Record a retryable failure and return the back-off delay, or None to give up"""
+        with self._lock:
+            self.errors += 1
+            if is_timeout_error(error):
+                self.timeouts += 1
+            if is_rate_limit_error(error):
+                self.rate_limited += 1
+        if is_rate_limit_error(error):
+            self.breaker.release_trial()
+        else:
+            self.breaker.record_failure()
+        # Full jitter keeps retrying workers from stampeding upstream together
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if attempt >= self.max_retries or self.breaker.is_open() or time.monotonic() + delay >= deadline:
+            return None
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def _other_error(self):
+        with self._lock:
+            self.errors += 1
+        # Not an upstream health problem, but a half-open trial still has to be released
+        self.breaker.release_trial()
+
+    def _stream_outcome(self, error, abandoned):
+        if abandoned:
+            self.breaker.release_trial()
+        elif error is None:
+            self.breaker.record_success()
+        elif is_upstream_failure(error):
+            with self._lock:
+                self.errors += 1
+                if is_timeout_error(error):
+                    self.timeouts += 1
+            self.breaker.record_failure()
+        else:
+            if is_rate_limit_error(error):
+                with self._lock:
+                    self.rate_limited += 1
+            self._other_error()
+
+    def is_available(self):
+        return not self.breaker.is_open()
+
+    def pool_stats(self):
+        stats = {
+            'max_connections': self.max_connections,
+            'max_keepalive_connections': self.max_keepalive
+        }
+        # httpx does not expose pool occupancy publicly, so report it only when reachable
+        pool = getattr(getattr(self._http, '_transport', None), '_pool', None)
+        connections = getattr(pool, 'connections', None)
+        if connections is not None:
+            stats['open_connections'] = len(connections)
+            stats['idle_connections'] = sum(1 for conn in connections if conn.is_idle())
+        return stats
+
+    def stats(self):
+        with self._lock:
+            counters = {
+                'calls': self.calls,
+                'retries': self.retries,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'rate_limited': self.rate_limited,
+                'rejected_while_open': self.rejected,
+                'timeout_seconds': self.timeout,
+                'max_retries': self.max_retries
+            }
+        counters['circuit_breaker'] = self.breaker.stats()
+        counters['pool'] = self.pool_stats()
+        return counters
+
+
+class LLMGateway(_GatewayBase):
+    """Single entry point for chat completions with a shared keep-alive pool,
+    per-call deadlines, jittered retries and a circuit breaker"""
+
+    def __init__(self, api_key=None, base_url=None, timeout=30.0, max_retries=2, backoff=0.5,
+                 max_connections=50, max_keepalive=20, failure_threshold=5, reset_timeout=30, breaker=None):
+        super().__init__(api_key, base_url, timeout, max_retries, backoff, max_connections, max_keepalive,
+                         failure_threshold, reset_timeout, breaker)
+
+    def _build_client(self):
+        import httpx
+        from openai import OpenAI
+        self._http = httpx.Client(limits=self._limits(), timeout=self._http_timeout())
+        # Retries are handled here so they share the per-call deadline
+        return OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=self._http, max_retries=0)
+
+    def chat(self, model, messages, timeout=None, **kwargs):
+        """Create a chat completion, raising CircuitOpenError without calling upstream while the breaker is open"""
+        self._admit()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            try:
+                remaining = self._start_attempt(deadline)
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    timeout=remaining,
+                    **kwargs
+                )
+                if kwargs.get('stream'):
+                    return _MonitoredStream(response, self)
+                self.breaker.record_success()
+                return response
+            except retryable_errors() as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+            except Exception:
+                self._other_error()
+                raise
+
+
+class AsyncLLMGateway(_GatewayBase):
+    """Non-blocking counterpart of LLMGateway for the ASGI entry point.
+
+    Calls are coroutines on one event loop, so a worker keeps thousands of
+    completions in flight without a thread each. Pass the sync gateway's
+    breaker to share upstream health between both serving modes.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=30.0, max_retries=2, backoff=0.5,
+                 max_connections=2000, max_keepalive=200, failure_threshold=5, reset_timeout=30, breaker=None):
+        super().__init__(api_key, base_url, timeout, max_retries, backoff, max_connections, max_keepalive,
+                         failure_threshold, reset_timeout, breaker)
+        self.in_flight = 0
+
+    def _build_client(self):
+        import httpx
+        from openai import AsyncOpenAI
+        self._http = httpx.AsyncClient(limits=self._limits(), timeout=self._http_timeout())
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=self._http, max_retries=0)
+
+    async def chat(self, model, messages, timeout=None, **kwargs):
+        """Create a chat completion, raising CircuitOpenError without calling upstream while the breaker is open"""
+        self._admit()
+        self.in_flight += 1
+        try:
+            return await self._chat(model, messages, timeout, **kwargs)
+        finally:
+            self.in_flight -= 1
+
+    async def _chat(self, model, messages, timeout, **kwargs):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            try:
+                remaining = self._start_attempt(deadline)
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    timeout=remaining,
+                    **kwargs
+                )
+                if kwargs.get('stream'):
+                    return _AsyncMonitoredStream(response, self)
+                self.breaker.record_success()
+                return response
+            except retryable_errors() as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # The client went away; free a half-open trial without blaming upstream
+                self.breaker.release_trial()
+                raise
+            except Exception:
+                self._other_error()
+                raise
+
+    def stats(self):
+        stats = super().stats()
+        stats['in_flight'] = self.in_flight
+        return stats
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
@@ -1,30 +1,64 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+import gc
+import hmac
 import os
 import json
+import re
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+from admission import BACKGROUND, CRITICAL, INTERACTIVE, AdmissionController, AdmissionRejected
+from catalog_cache import CatalogCache
+from conversations import ConversationStore
+from diagnosis_cache import DiagnosisCache, make_cache_key, normalize_diagnostic_input
+from diagnostic_jobs import DiagnosticJobs
+from error_codes import ErrorCodeDatabase, apply_error_codes
+from image_pipeline import IMAGE_ID_PATTERN, ImagePipeline, UploadTooLarge, spool_upload
+from refrigerant import analyze as analyze_measurements, analyze_batch as analyze_measurement_batch
+from refrigerant import apply_measurement_analysis, describe_analysis
+from llm_gateway import OPENAI_AVAILABLE, CircuitOpenError, LLMGateway, is_timeout_error
+from metrics import Registry, SamplingProfiler
+from response_format import render_session_payload
+from rule_engine import RuleEngine
+from session_store import SQLiteSessionStore
+from similarity_index import DescriptionIndex
+from single_flight import SingleFlight
 
-# Load environment variables from .env file
-load_dotenv()
+metrics_registry = Registry()
+REQUEST_SECONDS = metrics_registry.histogram(
+    'hvac_http_request_duration_seconds', 'HTTP request latency by endpoint', ('endpoint', 'method', 'status'))
+REQUESTS_IN_FLIGHT = metrics_registry.gauge(
+    'hvac_http_requests_in_flight', 'Requests currently being handled', ('endpoint',))
+STAGE_SECONDS = metrics_registry.histogram(
+    'hvac_diagnosis_stage_duration_seconds', 'Time spent in each diagnosis stage', ('stage',))
+LLM_TOKENS = metrics_registry.counter(
+    'hvac_llm_tokens_total', 'Tokens consumed by LLM calls', ('model', 'kind'))
+LLM_ERRORS = metrics_registry.counter(
+    'hvac_llm_errors_total', 'Failed LLM calls by reason', ('model', 'reason'))
+ADMISSION_WAIT_SECONDS = metrics_registry.histogram(
+    'hvac_llm_admission_wait_seconds', 'Time diagnosis enhancements waited for an LLM slot', ('priority',))
+ADMISSION_SHED = metrics_registry.counter(
+    'hvac_llm_admission_shed_total', 'Diagnosis enhancements answered rule-based only', ('priority', 'reason'))
+metrics_registry.gauge(
+    'hvac_llm_admission_queue_depth', 'Diagnosis enhancements waiting for an LLM slot', ('priority',),
+    callback=lambda: llm_admission.queue_depths() if llm_admission else {})
 
-import openai
-
-app = Flask(__name__)
-CORS(app, origins="*")
-
-# Try to import OpenAI, but continue without it if not available
-try:
-    from openai import OpenAI
-    client = OpenAI(
-        api_key=os.getenv('OPENAI_API_KEY'),
-        base_url=os.getenv('OPENAI_API_BASE')
-    )
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    client = None
+DIAGNOSIS_MODEL = "gpt-4o-mini"
+# Bump whenever the diagnostic prompt below changes so stale cached analyses are dropped
+PROMPT_VERSION = "3"
+FOLLOW_UP_MODEL = "gpt-4"
+FOLLOW_UP_SYSTEM_PROMPT = "You are an expert HVAC diagnostic assistant providing professional follow-up support to experienced technicians."
+# Free-text quick submits carry no symptom ids, so fire and electrical hazards are spotted by keyword
+SAFETY_KEYWORDS = re.compile(
+    r'\b(burning|burnt|smoke|smoking|sparks?|sparking|melted|scorch\w*|gas smell|smell of gas|breakers? (?:keeps? )?trip\w*)',
+    re.I
+)
+DIAGNOSTIC_SYSTEM_PROMPT = "You are a master HVAC technician with 25+ years of experience providing detailed diagnostic analysis to field technicians. Always format responses with clear sections and step-by-step instructions."
 
 # Sample data
 EQUIPMENT_TYPES = [
@@ -69,197 +103,305 @@ SYMPTOMS = [
     {"id": "burning_smell", "name": "Burning Smell", "category": "visual", "description": "Electrical or mechanical burning odor"}
 ]
 
-def get_enhanced_diagnosis(equipment_type, location, symptoms, measurements, error_codes, description):
-    """Get enhanced diagnosis with rule-based logic and OpenAI if available"""
-    
-    # Rule-based diagnosis logic
-    equipment_name = next((eq['name'] for eq in EQUIPMENT_TYPES if eq['id'] == equipment_type), equipment_type)
-    symptom_names = [next((s['name'] for s in SYMPTOMS if s['id'] == sym_id), sym_id) for sym_id in symptoms]
-    
-    # Analyze symptoms to determine likely issues
-    cooling_issues = [s for s in symptoms if s in ['not_cooling', 'insufficient_cooling', 'intermittent_cooling']]
-    electrical_issues = [s for s in symptoms if s in ['unit_not_starting', 'frequent_breaker_trips', 'display_errors']]
-    mechanical_issues = [s for s in symptoms if s in ['fan_not_spinning', 'unusual_noise', 'excessive_vibration']]
-    visual_issues = [s for s in symptoms if s in ['ice_buildup', 'water_leak', 'burning_smell']]
-    
-    # Determine primary issue based on symptoms
-    if cooling_issues:
-        if 'ice_buildup' in symptoms:
-            primary_issue = "Refrigerant System with Ice Formation"
-            confidence = 85
-            likely_causes = [
-                {"cause": "Low refrigerant charge", "probability": 80},
-                {"cause": "Dirty evaporator coil", "probability": 70},
-                {"cause": "Restricted airflow", "probability": 60}
-            ]
-        elif 'not_cooling' in symptoms:
-            primary_issue = "Cooling System Failure"
-            confidence = 82
-            likely_causes = [
-                {"cause": "Compressor failure", "probability": 75},
-                {"cause": "Refrigerant leak", "probability": 70},
-                {"cause": "Faulty expansion valve", "probability": 55}
-            ]
-        else:
-            primary_issue = "Insufficient Cooling Performance"
-            confidence = 78
-            likely_causes = [
-                {"cause": "Dirty air filter", "probability": 85},
-                {"cause": "Low refrigerant", "probability": 65},
-                {"cause": "Oversized/undersized system", "probability": 45}
-            ]
-    elif electrical_issues:
-        if 'frequent_breaker_trips' in symptoms:
-            primary_issue = "Electrical Overload Issue"
-            confidence = 88
-            likely_causes = [
-                {"cause": "Compressor hard start", "probability": 80},
-                {"cause": "Short circuit in wiring", "probability": 75},
-                {"cause": "Faulty contactor", "probability": 60}
-            ]
-        else:
-            primary_issue = "Electrical System Malfunction"
-            confidence = 80
-            likely_causes = [
-                {"cause": "Thermostat failure", "probability": 70},
-                {"cause": "Control board issue", "probability": 65},
-                {"cause": "Wiring problem", "probability": 55}
-            ]
-    elif mechanical_issues:
-        primary_issue = "Mechanical Component Failure"
-        confidence = 83
-        likely_causes = [
-            {"cause": "Fan motor failure", "probability": 80},
-            {"cause": "Belt wear/breakage", "probability": 65},
-            {"cause": "Bearing wear", "probability": 50}
-        ]
-    else:
-        primary_issue = "System Diagnostic Required"
-        confidence = 70
-        likely_causes = [
-            {"cause": "Multiple potential issues", "probability": 60},
-            {"cause": "Maintenance required", "probability": 70}
-        ]
-    
-    # Generate recommendations based on symptoms
-    recommended_actions = []
-    if cooling_issues:
-        recommended_actions.extend([
-            {"action": "Check refrigerant levels and pressures", "priority": "high"},
-            {"action": "Inspect evaporator and condenser coils", "priority": "high"},
-            {"action": "Verify proper airflow", "priority": "medium"}
-        ])
-    if electrical_issues:
-        recommended_actions.extend([
-            {"action": "Test electrical connections and voltage", "priority": "high"},
-            {"action": "Inspect control components", "priority": "high"},
-            {"action": "Check thermostat operation", "priority": "medium"}
-        ])
-    if mechanical_issues:
-        recommended_actions.extend([
-            {"action": "Inspect fan motors and belts", "priority": "high"},
-            {"action": "Check for loose components", "priority": "medium"},
-            {"action": "Lubricate moving parts if needed", "priority": "low"}
-        ])
-    
-    if not recommended_actions:
-        recommended_actions = [
-            {"action": "Perform comprehensive system inspection", "priority": "high"},
-            {"action": "Check all electrical connections", "priority": "medium"},
-            {"action": "Test system operation", "priority": "medium"}
-        ]
-    
-    # Generate troubleshooting steps
-    troubleshooting_steps = [
-        {
-            "title": "Safety Preparation",
-            "description": "Turn off power at the breaker and gather proper PPE including safety glasses, insulated gloves, and hard hat",
-            "safety_note": "Never work on energized equipment - always follow lockout/tagout procedures",
-            "expected_result": "Safe working environment established"
-        }
-    ]
-    
-    if cooling_issues:
-        troubleshooting_steps.append({
-            "title": "Refrigerant System Check",
-            "description": "Connect manifold gauges and check suction and discharge pressures against manufacturer specifications",
-            "safety_note": "Wear safety glasses and ensure adequate ventilation when working with refrigerant",
-            "expected_result": "Pressures should match specifications for current ambient temperature"
-        })
-    
-    if electrical_issues:
-        troubleshooting_steps.append({
-            "title": "Electrical System Test",
-            "description": "Use multimeter to check voltage at contactor, compressor, and fan motor terminals",
-            "safety_note": "Use insulated tools and proper PPE when testing electrical components",
-            "expected_result": "Voltage readings should match nameplate specifications"
-        })
-    
-    troubleshooting_steps.append({
-        "title": "Component Inspection",
-        "description": "Visually inspect all accessible components for signs of damage, wear, or overheating",
-        "safety_note": "Look for burn marks, unusual wear patterns, or damaged wiring",
-        "expected_result": "Identify any obvious physical problems or safety hazards"
-    })
-    
-    # Safety warnings based on symptoms and equipment
-    safety_warnings = [
-        {
-            "level": "critical",
-            "category": "electrical_safety",
-            "message": "Turn off power at the breaker before performing any electrical work",
-            "compliance": "NFPA 70E"
-        }
-    ]
-    
-    if 'burning_smell' in symptoms:
-        safety_warnings.append({
-            "level": "critical",
-            "category": "fire_safety",
-            "message": "Burning smell detected - shut down system immediately and investigate source",
-            "compliance": "NFPA 70"
-        })
-    
-    if 'frequent_breaker_trips' in symptoms:
-        safety_warnings.append({
-            "level": "high",
-            "category": "electrical_safety",
-            "message": "Electrical overload condition present - do not reset breaker without identifying cause",
-            "compliance": "NFPA 70E"
-        })
-    
-    safety_warnings.append({
-        "level": "high",
-        "category": "refrigerant_safety",
-        "message": "Ensure adequate ventilation and wear eye protection when working with refrigerant",
-        "compliance": "EPA 608"
-    })
-    
-    diagnosis = {
-        "primary_issue": primary_issue,
-        "summary": f"Based on the {equipment_name} symptoms and diagnostic information, the system appears to have {primary_issue.lower()}. {len(symptom_names)} symptoms were identified requiring immediate attention.",
-        "confidence_score": confidence,
-        "likely_causes": likely_causes,
-        "recommended_actions": recommended_actions[:3],  # Limit to top 3
-        "troubleshooting_steps": troubleshooting_steps,
-        "safety_warnings": safety_warnings
+# Configuration and shared services, filled in by init_services() so that importing
+# this module reads no environment, opens no files and imports no LLM client
+PROFILING_ENABLED = False
+PROFILE_DIR = 'profiles'
+MEASUREMENT_DEFAULT_REFRIGERANT = None
+ERROR_CODE_RESOLVE_CONFIDENCE = 90
+IMAGE_MAX_BYTES = 25 * 1024 * 1024
+IMAGE_SPOOL_MEMORY = 1024 * 1024
+BATCH_CHUNK_SIZE = 512
+CATALOG_MAX_AGE = 86400
+ADMISSION_CLIENT_HEADER = None
+TRUSTED_PROXY_COUNT = 0
+ADMIN_TOKEN = None
+
+llm_gateway = None
+llm_admission = None
+diagnosis_cache = None
+description_index = None
+error_code_db = None
+image_pipeline = None
+follow_up_threads = None
+session_store = None
+diagnostic_jobs = None
+batch_enhancement_pool = None
+rule_engine = None
+catalog_cache = None
+
+diagnosis_flight = SingleFlight()
+
+api = Blueprint('api', __name__)
+
+_init_lock = threading.RLock()
+_app = None
+
+def init_services():
+    """Load .env and build the stores, caches, LLM gateway and rule engine; later calls are no-ops"""
+    global PROFILING_ENABLED, PROFILE_DIR, MEASUREMENT_DEFAULT_REFRIGERANT, ERROR_CODE_RESOLVE_CONFIDENCE
+    global IMAGE_MAX_BYTES, IMAGE_SPOOL_MEMORY, BATCH_CHUNK_SIZE, CATALOG_MAX_AGE, ADMISSION_CLIENT_HEADER, ADMIN_TOKEN
+    global TRUSTED_PROXY_COUNT
+    global llm_gateway, llm_admission, diagnosis_cache, description_index, error_code_db, image_pipeline, follow_up_threads
+    global session_store, diagnostic_jobs, batch_enhancement_pool, rule_engine
+    with _init_lock:
+        # rule_engine is assigned last, so it doubles as the "already initialised" flag
+        if rule_engine is not None:
+            return
+
+        # Load environment variables from .env file
+        load_dotenv()
+
+        # Bearer token for admin routes such as cache invalidation; unset disables them
+        ADMIN_TOKEN = os.getenv('ADMIN_TOKEN') or None
+
+        # Per-request sampling profiler, toggled with an X-Profile: 1 header when enabled
+        PROFILING_ENABLED = os.getenv('METRICS_PROFILING', '').lower() in ('1', 'true')
+        PROFILE_DIR = os.getenv('METRICS_PROFILE_DIR', 'profiles')
+
+        # Workers each hold their own metrics; with a shared directory (set by gunicorn.conf.py)
+        # every scrape reports the sum over all of them rather than whichever worker answered
+        metrics_dir = os.getenv('METRICS_MULTIPROC_DIR')
+        if metrics_dir:
+            metrics_registry.share(metrics_dir, float(os.getenv('METRICS_PUBLISH_INTERVAL', '5')))
+
+        # Both the diagnostic and follow-up paths go through one pooled, resilient gateway
+        llm_gateway = LLMGateway(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            base_url=os.getenv('OPENAI_API_BASE'),
+            timeout=float(os.getenv('LLM_TIMEOUT', '30')),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', '2')),
+            max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', '50')),
+            failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv('LLM_BREAKER_RESET', '30'))
+        ) if OPENAI_AVAILABLE and os.getenv('OPENAI_API_KEY') else None
+
+        # Every diagnosis enhancement waits here for an LLM slot: safety-critical first, batch work last.
+        # The per-client rate limit is opt-in (ADMISSION_CLIENT_RATE calls/s, ADMISSION_CLIENT_BURST):
+        # technicians behind one NAT or proxy share an address, and the concurrency cap and queue
+        # already keep upstream from being overrun
+        llm_admission = AdmissionController(
+            max_concurrent=int(os.getenv('ADMISSION_MAX_CONCURRENT', '64')),
+            max_queue=int(os.getenv('ADMISSION_MAX_QUEUE', '256')),
+            max_wait=float(os.getenv('ADMISSION_MAX_WAIT', '15')),
+            client_rate=float(os.getenv('ADMISSION_CLIENT_RATE', '0')),
+            client_burst=int(os.getenv('ADMISSION_CLIENT_BURST', '30')),
+            on_wait=lambda priority, seconds: ADMISSION_WAIT_SECONDS.observe(seconds, priority=priority),
+            on_shed=lambda priority, reason: ADMISSION_SHED.inc(priority=priority, reason=reason)
+        )
+        # Clients are told apart by the address the server saw. Behind TRUSTED_PROXY_COUNT reverse
+        # proxies it comes from X-Forwarded-For instead; ADMISSION_CLIENT_HEADER is only for a gateway
+        # that sets the header itself and drops any copy sent by the caller
+        TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+        ADMISSION_CLIENT_HEADER = os.getenv('ADMISSION_CLIENT_HEADER') or None
+
+        diagnosis_cache = DiagnosisCache(
+            max_entries=int(os.getenv('DIAGNOSIS_CACHE_SIZE', '1024')),
+            ttl=int(os.getenv('DIAGNOSIS_CACHE_TTL', '86400')),
+            path=os.getenv('DIAGNOSIS_CACHE_PATH'),
+            prompt_version=os.getenv('DIAGNOSIS_PROMPT_VERSION', PROMPT_VERSION)
+        )
+
+        # Past quick-submit analyses, reused when a new free-text description is a near duplicate
+        description_index = DescriptionIndex(
+            os.getenv('QUICK_SUBMIT_INDEX_PATH', 'quick_submit_index.db'),
+            threshold=float(os.getenv('QUICK_SUBMIT_SIMILARITY', '0.75')),
+            ttl=int(os.getenv('QUICK_SUBMIT_INDEX_TTL', str(30 * 86400))),
+            prompt_version=os.getenv('DIAGNOSIS_PROMPT_VERSION', PROMPT_VERSION)
+        )
+
+        # Manufacturer error codes, opened on first lookup; see error_codes.py for building the file
+        error_code_db = ErrorCodeDatabase(
+            os.getenv('ERROR_CODE_DB_PATH', 'error_codes.db'),
+            cache_size=int(os.getenv('ERROR_CODE_CACHE_SIZE', '4096'))
+        )
+        # Refrigerant assumed for pressure readings that do not name one; unset means no PT analysis
+        MEASUREMENT_DEFAULT_REFRIGERANT = os.getenv('MEASUREMENT_DEFAULT_REFRIGERANT')
+
+        # A decoded code at or above this confidence is answered without a ChatGPT call
+        ERROR_CODE_RESOLVE_CONFIDENCE = int(os.getenv('ERROR_CODE_RESOLVE_CONFIDENCE', '90'))
+
+        # Uploaded photos are spooled and hashed on the request thread; the heavy lifting runs in worker processes
+        IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(25 * 1024 * 1024)))
+        IMAGE_SPOOL_MEMORY = int(os.getenv('IMAGE_SPOOL_MEMORY', str(1024 * 1024)))
+        image_pipeline = ImagePipeline(
+            os.getenv('IMAGE_STORE_DIR', 'uploads'),
+            max_workers=int(os.getenv('IMAGE_PROCESS_WORKERS', '2')),
+            max_pending=int(os.getenv('IMAGE_MAX_PENDING', '32')),
+            max_dimension=int(os.getenv('IMAGE_MAX_DIMENSION', '2048'))
+        )
+
+        follow_up_threads = ConversationStore(
+            token_budget=int(os.getenv('FOLLOW_UP_TOKEN_BUDGET', '1500')),
+            analysis_token_budget=int(os.getenv('FOLLOW_UP_ANALYSIS_TOKEN_BUDGET', '700'))
+        )
+
+        session_store = SQLiteSessionStore(os.getenv('SESSION_STORE_PATH', 'sessions.db'))
+
+        # Recent sessions are served from memory; every change is also queued for the persistent store
+        diagnostic_jobs = DiagnosticJobs(
+            max_workers=int(os.getenv('DIAGNOSTIC_JOB_WORKERS', '8')),
+            max_pending=int(os.getenv('DIAGNOSTIC_JOB_MAX_PENDING', '256')),
+            on_change=session_store.save
+        )
+
+        BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '512'))
+        # Shared across batch requests so total LLM concurrency stays bounded
+        batch_enhancement_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv('BATCH_LLM_CONCURRENCY', '4')),
+            thread_name_prefix='batch-enhance'
+        )
+
+        CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', '86400'))
+
+        # Compiled once at startup; see diagnosis_rules.json for the rule definitions
+        rule_engine = RuleEngine.load(
+            os.getenv('DIAGNOSIS_RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diagnosis_rules.json')),
+            EQUIPMENT_TYPES,
+            SYMPTOMS
+        )
+
+def create_app():
+    """Application factory: initialise the shared services and return a Flask app serving the API"""
+    global catalog_cache
+    init_services()
+    app = Flask(__name__)
+    CORS(app, origins="*")
+    if TRUSTED_PROXY_COUNT:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+    app.register_blueprint(api)
+
+    # Catalog responses are serialized and compressed once; call update() again if the catalog changes
+    catalog_cache = CatalogCache(lambda data: app.json.dumps(data, separators=(',', ':')))
+    catalog_cache.update(EQUIPMENT_TYPES, SYMPTOMS)
+    return app
+
+def get_app():
+    """The process-wide app, created on first use"""
+    global _app
+    with _init_lock:
+        if _app is None:
+            _app = create_app()
+        return _app
+
+def preload():
+    """Build everything workers can share before a server forks them.
+
+    Run in the parent process (PRELOAD_APP in gunicorn.conf.py) so the compiled
+    rules, batch matrices, catalog payloads and imported modules are inherited
+    copy-on-write. Connections, thread pools and the HTTP client are still
+    created per process on first use.
+    """
+    app = get_app()
+    rule_engine.score_batch([[]])
+    if llm_gateway is not None:
+        import openai  # noqa: F401
+    # Keep the collector from touching, and so copying, every inherited object page
+    gc.collect()
+    gc.freeze()
+    return app
+
+def __getattr__(name):
+    # main_hybrid.app still works for WSGI servers and scripts, building the app on first access
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_display_names(equipment_type, symptoms):
+    """Resolve equipment and symptom ids to display names"""
+    return rule_engine.display_names(equipment_type, symptoms)
+
+def get_rule_based_diagnosis(equipment_type, symptoms, error_codes=None, measurements=None):
+    """Get the rule-based diagnosis that ChatGPT uses as its preliminary analysis"""
+    with STAGE_SECONDS.time(stage='rules'):
+        diagnosis = rule_engine.diagnose(equipment_type, symptoms)
+    if measurements:
+        with STAGE_SECONDS.time(stage='measurements'):
+            diagnosis = apply_measurement_analysis(
+                diagnosis, analyze_measurements(measurements, MEASUREMENT_DEFAULT_REFRIGERANT))
+    if error_codes:
+        with STAGE_SECONDS.time(stage='error_codes'):
+            diagnosis = apply_error_codes(diagnosis, error_code_db.decode(error_codes))
+    return diagnosis
+
+def resolved_by_error_codes(diagnosis):
+    """True when a decoded error code already gives a high-confidence answer"""
+    return (
+        any(item['entry'] for item in diagnosis.get('decoded_error_codes', []))
+        and diagnosis['confidence_score'] >= ERROR_CODE_RESOLVE_CONFIDENCE
+    )
+
+def llm_enhancement_enabled():
+    return bool(OPENAI_AVAILABLE and llm_gateway and os.getenv('OPENAI_API_KEY'))
+
+def forwarded_client_addr(remote_addr, forwarded_for):
+    """The client address as ProxyFix(x_for=TRUSTED_PROXY_COUNT) resolves it, for routes outside Flask"""
+    if TRUSTED_PROXY_COUNT and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        if len(hops) >= TRUSTED_PROXY_COUNT:
+            return hops[-TRUSTED_PROXY_COUNT]
+    return remote_addr
+
+def admission_args(headers, remote_addr):
+    """Client id and background flag for a request; clients may only lower their own priority"""
+    return {
+        'client_id': (ADMISSION_CLIENT_HEADER and headers.get(ADMISSION_CLIENT_HEADER.lower())) or remote_addr,
+        'background': (headers.get('x-priority') or '').lower() == 'background'
     }
-    
-    # If OpenAI is available, enhance the diagnosis
-    if OPENAI_AVAILABLE and client and os.getenv('OPENAI_API_KEY'):
-        try:
-            # Create comprehensive diagnostic data for ChatGPT
-            diagnostic_data = {
-                "equipment_type": equipment_name,
-                "location": location,
-                "symptoms": symptom_names,
-                "measurements": measurements,
-                "error_codes": error_codes,
-                "description": description,
-                "preliminary_analysis": diagnosis
-            }
-            
-            prompt = f"""You are an expert HVAC diagnostic assistant integrated into a professional troubleshooting application used by experienced HVAC technicians in the field. 
+
+def admission_priority(diagnosis, symptoms, description, background=False):
+    """Background work always goes last; anything with a fire, electrical or critical-code hazard goes first"""
+    if background:
+        return BACKGROUND
+    if rule_engine.is_safety_critical(symptoms) or SAFETY_KEYWORDS.search(description or '') or any(
+        item['entry'] and item['entry']['severity'] == 'critical' for item in diagnosis.get('decoded_error_codes', [])
+    ):
+        return CRITICAL
+    return INTERACTIVE
+
+def mark_degraded(diagnosis, reason):
+    """Flag a rule-based result that stands in for an enhancement shed under load"""
+    diagnosis['degraded'] = True
+    diagnosis['degraded_reason'] = reason
+    return diagnosis
+
+def record_llm_usage(model, usage):
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind='prompt')
+        LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind='completion')
+
+def llm_error_reason(error):
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    return 'timeout' if is_timeout_error(error) else 'error'
+
+def chat_completion(model, messages, **kwargs):
+    """Call the LLM gateway, recording latency, token usage and failures"""
+    if kwargs.get('stream'):
+        # Usage arrives on the final chunk and is recorded by iter_completion_deltas
+        kwargs.setdefault('stream_options', {'include_usage': True})
+    start = time.perf_counter()
+    try:
+        response = llm_gateway.chat(model=model, messages=messages, **kwargs)
+    except Exception as e:
+        LLM_ERRORS.inc(model=model, reason=llm_error_reason(e))
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage='llm')
+    if not kwargs.get('stream'):
+        record_llm_usage(model, response.usage)
+    return response
+
+def get_diagnosis_cache_key(equipment_type, location, symptoms, measurements, error_codes, description):
+    return make_cache_key(
+        normalize_diagnostic_input(equipment_type, location, symptoms, measurements, error_codes, description),
+        DIAGNOSIS_MODEL,
+        diagnosis_cache.prompt_version
+    )
+
+def build_diagnostic_prompt(equipment_name, location, symptom_names, measurements, error_codes, description, diagnosis):
+    """Build the ChatGPT prompt from the collected data and the preliminary analysis"""
+    return f"""You are an expert HVAC diagnostic assistant integrated into a professional troubleshooting application used by experienced HVAC technicians in the field. 
 
 **CONTEXT:**
 - Application: HVAC AI Troubleshooter - Professional diagnostic tool for field technicians
@@ -272,6 +414,7 @@ Equipment Type: {equipment_name}
 Location: {location}
 Reported Symptoms: {', '.join(symptom_names)}
 Measurements Taken: {json.dumps(measurements, indent=2) if measurements else 'None provided'}
+Derived Refrigerant Metrics: {describe_analysis(diagnosis.get('measurement_analysis'))}
 Error Codes: {', '.join(error_codes) if error_codes else 'None reported'}
 Technician Notes: {description if description else 'None provided'}
 
@@ -326,82 +469,339 @@ Provide a comprehensive diagnostic analysis formatted exactly like ChatGPT respo
 
 **TONE:** Professional, confident, detailed but concise. Write for an experienced technician who needs actionable guidance, not basic explanations."""
 
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a master HVAC technician with 25+ years of experience providing detailed diagnostic analysis to field technicians. Always format responses with clear sections and step-by-step instructions."},
-                    {"role": "user", "content": prompt}
-                ],
+def diagnostic_prompt_for(diagnosis, equipment_type, location, symptoms, measurements, error_codes, description):
+    with STAGE_SECONDS.time(stage='prompt_build'):
+        equipment_name, symptom_names = get_display_names(equipment_type, symptoms)
+        return build_diagnostic_prompt(equipment_name, location, symptom_names, measurements, error_codes, description, diagnosis)
+
+def build_diagnostic_messages(prompt):
+    return [
+        {"role": "system", "content": DIAGNOSTIC_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def apply_chatgpt_analysis(diagnosis, ai_response):
+    """Replace the basic diagnosis with comprehensive ChatGPT analysis"""
+    enhanced = {
+        "primary_issue": f"ChatGPT-4 Professional Analysis",
+        "summary": ai_response,
+        "confidence_score": min(95, diagnosis['confidence_score'] + 10),
+        "likely_causes": diagnosis['likely_causes'],  # Keep original for compatibility
+        "recommended_actions": diagnosis['recommended_actions'],  # Keep original for compatibility
+        "troubleshooting_steps": diagnosis['troubleshooting_steps'],  # Keep original for compatibility
+        "safety_warnings": diagnosis['safety_warnings'],  # Keep original for compatibility
+        "chatgpt_analysis": True,
+        "analysis_type": "comprehensive_professional"
+    }
+    # Structured evidence from the rule-based stages stays available to clients
+    for key in ('decoded_error_codes', 'measurement_analysis'):
+        if key in diagnosis:
+            enhanced[key] = diagnosis[key]
+    return enhanced
+
+def enhance_diagnosis(diagnosis, equipment_type, location, symptoms, measurements, error_codes, description,
+                      client_id=None, priority=INTERACTIVE):
+    """Enhance a rule-based diagnosis with ChatGPT, raising if the call fails or is shed"""
+    cache_key = get_diagnosis_cache_key(equipment_type, location, symptoms, measurements, error_codes, description)
+    cached = diagnosis_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    def run_enhancement():
+        prompt = diagnostic_prompt_for(diagnosis, equipment_type, location, symptoms, measurements, error_codes, description)
+
+        with llm_admission.slot(client_id, priority):
+            response = chat_completion(
+                model=DIAGNOSIS_MODEL,
+                messages=build_diagnostic_messages(prompt),
                 temperature=0.3,
                 max_tokens=2000
             )
-            
-            ai_response = response.choices[0].message.content.strip()
-            
-            # Replace the basic diagnosis with comprehensive ChatGPT analysis
-            diagnosis = {
-                "primary_issue": f"ChatGPT-4 Professional Analysis",
-                "summary": ai_response,
-                "confidence_score": min(95, diagnosis['confidence_score'] + 10),
-                "likely_causes": diagnosis['likely_causes'],  # Keep original for compatibility
-                "recommended_actions": diagnosis['recommended_actions'],  # Keep original for compatibility
-                "troubleshooting_steps": diagnosis['troubleshooting_steps'],  # Keep original for compatibility
-                "safety_warnings": diagnosis['safety_warnings'],  # Keep original for compatibility
-                "chatgpt_analysis": True,
-                "analysis_type": "comprehensive_professional"
-            }
-            
+        
+        ai_response = response.choices[0].message.content.strip()
+        enhanced = apply_chatgpt_analysis(diagnosis, ai_response)
+        diagnosis_cache.set(cache_key, enhanced)
+        return enhanced
+    
+    # Identical requests already waiting on ChatGPT share that call instead of starting their own
+    return diagnosis_flight.do(cache_key, run_enhancement)
+
+def get_enhanced_diagnosis(equipment_type, location, symptoms, measurements, error_codes, description,
+                           client_id=None, background=False):
+    """Get enhanced diagnosis with rule-based logic and OpenAI if available"""
+    
+    diagnosis = get_rule_based_diagnosis(equipment_type, symptoms, error_codes, measurements)
+    
+    # If OpenAI is available, enhance the diagnosis
+    if llm_enhancement_enabled() and not resolved_by_error_codes(diagnosis):
+        try:
+            diagnosis = enhance_diagnosis(
+                diagnosis, equipment_type, location, symptoms, measurements, error_codes, description,
+                client_id=client_id, priority=admission_priority(diagnosis, symptoms, description, background)
+            )
+        except AdmissionRejected as e:
+            # Shed under load: answer with the rule-based result now rather than queueing longer
+            diagnosis = mark_degraded(diagnosis, e.reason)
+        except CircuitOpenError:
+            # Upstream is known to be down, so answer with the rule-based result right away
+            pass
         except Exception as e:
             print(f"OpenAI enhancement failed: {e}")
     
     return diagnosis
 
-@app.route('/api/equipment/types', methods=['GET'])
+def guided_diagnosis_args(data):
+    return {
+        'equipment_type': data.get('equipment_type'),
+        'location': data.get('location'),
+        'symptoms': data.get('symptoms', []),
+        'measurements': data.get('measurements', {}),
+        'error_codes': data.get('error_codes', []),
+        'description': data.get('additional_notes', '')
+    }
+
+def quick_submit_diagnosis_args(data):
+    return {
+        'equipment_type': 'unknown',
+        'location': data.get('location', 'unknown'),
+        'symptoms': [],
+        'measurements': {},
+        'error_codes': [],
+        'description': data.get('description', '')
+    }
+
+def reusable_description(diagnosis_args):
+    """Safety-related reports always get a fresh analysis and are never offered for reuse"""
+    return not (SAFETY_KEYWORDS.search(diagnosis_args['description'] or '')
+                or rule_engine.is_safety_critical(diagnosis_args['symptoms']))
+
+def similar_quick_submit_diagnosis(diagnosis_args):
+    """Return the analysis of a near-identical earlier quick-submit description, if any"""
+    if not llm_enhancement_enabled() or not reusable_description(diagnosis_args):
+        return None
+    match = description_index.lookup(diagnosis_args['description'])
+    if match is None:
+        return None
+    analysis, similarity = match
+    analysis['similar_description_score'] = round(similarity, 3)
+    return analysis
+
+def remember_quick_submit(diagnosis_args, analysis):
+    if reusable_description(diagnosis_args):
+        description_index.add(diagnosis_args['description'], analysis)
+
+def enhance_quick_submit(diagnosis, **diagnosis_args):
+    enhanced = enhance_diagnosis(diagnosis, **diagnosis_args)
+    remember_quick_submit(diagnosis_args, enhanced)
+    return enhanced
+
+def start_diagnostic_job(session, diagnosis_args, enhance=None, client_id=None, background=False):
+    """Queue ChatGPT enhancement of a session whose rule-based diagnosis is already attached"""
+    enhance = enhance or enhance_diagnosis
+    
+    def run(ai_diagnosis):
+        priority = admission_priority(ai_diagnosis, diagnosis_args['symptoms'], diagnosis_args['description'], background)
+        try:
+            return enhance(ai_diagnosis, client_id=client_id, priority=priority, **diagnosis_args)
+        except AdmissionRejected as e:
+            return mark_degraded(ai_diagnosis, e.reason)
+    
+    if llm_enhancement_enabled() and llm_gateway.is_available() and not resolved_by_error_codes(
+        session['ai_diagnosis']
+    ) and diagnostic_jobs.submit(session, run):
+        return True
+    
+    # Without a job the rule-based result is final
+    diagnostic_jobs.remember(session)
+    return False
+
+@api.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    # Labelled without the blueprint prefix so they match the ASGI routes
+    g.metrics_endpoint = request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+    REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+    if PROFILING_ENABLED and request.headers.get('X-Profile') == '1':
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+@api.after_app_request
+def record_request_metrics(response):
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - g.request_started,
+        endpoint=g.metrics_endpoint,
+        method=request.method,
+        status=response.status_code
+    )
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        # Stopped once the body is sent, so streamed responses are profiled to the end
+        endpoint = g.metrics_endpoint
+        response.call_on_close(lambda: print(f"Profile written to {profiler.stop().write(PROFILE_DIR, endpoint)}"))
+    return response
+
+@api.teardown_app_request
+def finish_request_metrics(error=None):
+    # Streamed responses tear the request context down twice, so only count the first
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+
+def referenced_image_ids(data):
+    """Image ids from an earlier /api/images/upload that the session should point to"""
+    return [image_id for image_id in data.get('image_ids') or [] if IMAGE_ID_PATTERN.match(str(image_id))]
+
+def build_quick_submit_session(data, ai_diagnosis):
+    return {
+        'id': str(uuid.uuid4()),
+        'session_type': 'quick_submit',
+        'location': data.get('location'),
+        'description': data.get('description'),
+        'image_ids': referenced_image_ids(data),
+        'created_at': datetime.now().isoformat(),
+        'status': 'completed',
+        'confidence_score': ai_diagnosis.get('confidence_score', 70),
+        'ai_diagnosis': ai_diagnosis
+    }
+
+def build_guided_session(data, ai_diagnosis):
+    return {
+        'id': str(uuid.uuid4()),
+        'session_type': 'guided',
+        'equipment_type': data.get('equipment_type'),
+        'location': data.get('location'),
+        'symptoms': data.get('symptoms', []),
+        'measurements': data.get('measurements', {}),
+        'error_codes': data.get('error_codes', []),
+        'description': data.get('additional_notes', ''),
+        'image_ids': referenced_image_ids(data),
+        'created_at': datetime.now().isoformat(),
+        'status': 'completed',
+        'confidence_score': ai_diagnosis.get('confidence_score', 75),
+        'ai_diagnosis': ai_diagnosis
+    }
+
+def finish_streamed_session(session, diagnosis):
+    """Attach the final diagnosis to a streamed session and store it as the non-streaming route does"""
+    session.update(ai_diagnosis=diagnosis, confidence_score=diagnosis.get('confidence_score', 75))
+    diagnostic_jobs.remember(session)
+    return session
+
+def build_follow_up_prompt(original_analysis, follow_up_question, diagnostic_context, conversation_history=''):
+    history_section = f"\nPREVIOUS FOLLOW-UP DISCUSSION:\n{conversation_history}\n" if conversation_history else ''
+    return f"""
+You are an expert HVAC technician assistant providing follow-up support for a previous diagnostic analysis.
+
+ORIGINAL ANALYSIS CONTEXT:
+{original_analysis}
+
+DIAGNOSTIC CONTEXT:
+- Equipment Type: {diagnostic_context.get('equipment_type', 'Not specified')}
+- Symptoms: {', '.join(diagnostic_context.get('symptoms', []))}
+- Measurements: {diagnostic_context.get('measurements', 'Not provided')}
+{history_section}
+TECHNICIAN'S FOLLOW-UP QUESTION:
+{follow_up_question}
+
+Please provide a detailed, professional response that:
+1. Directly addresses the technician's specific question
+2. References the original analysis when relevant
+3. Provides additional technical details or clarification
+4. Includes safety considerations if applicable
+5. Suggests next steps or additional diagnostics if needed
+
+Format your response with clear headers and bullet points for easy reading.
+"""
+
+def build_follow_up_messages(follow_up_prompt):
+    return [
+        {"role": "system", "content": FOLLOW_UP_SYSTEM_PROMPT},
+        {"role": "user", "content": follow_up_prompt}
+    ]
+
+def session_response(payload, status=200):
+    """Encode a response carrying sessions, honouring fields=, compact=1 and Accept: application/msgpack"""
+    with STAGE_SECONDS.time(stage='serialize'):
+        body, mimetype = render_session_payload(payload, request.args, request.headers.get('Accept'))
+    return Response(body, status=status, mimetype=mimetype, headers={'Vary': 'Accept'})
+
+def sse_event(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def iter_completion_deltas(stream, model):
+    """Yield the text deltas of a streaming chat completion"""
+    for chunk in stream:
+        if getattr(chunk, 'usage', None):
+            record_llm_usage(model, chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def catalog_response(name):
+    """Serve a precomputed catalog payload, answering revalidation with 304 Not Modified"""
+    payload = catalog_cache.get(name)
+    encoding, body = payload.negotiate(request.headers.get('Accept-Encoding'))
+    # A URL pinned to the current version can never change, so it is cached for good
+    if request.args.get('v') == catalog_cache.version:
+        cache_control = 'public, max-age=31536000, immutable'
+    else:
+        cache_control = f'public, max-age={CATALOG_MAX_AGE}'
+    headers = {
+        'ETag': payload.etags[encoding],
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding'
+    }
+    if payload.matches(request.headers.get('If-None-Match')):
+        return Response(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='application/json', headers=headers)
+
+@api.route('/api/equipment/types', methods=['GET'])
 def get_equipment_types():
-    return jsonify({
-        'success': True,
-        'equipment_types': EQUIPMENT_TYPES
-    })
+    return catalog_response('equipment_types')
 
-@app.route('/api/equipment/symptoms', methods=['GET'])
+@api.route('/api/equipment/symptoms', methods=['GET'])
 def get_symptoms():
-    return jsonify({
-        'success': True,
-        'symptoms': SYMPTOMS
-    })
+    return catalog_response('symptoms')
+
+@api.route('/api/catalog', methods=['GET'])
+def get_catalog():
+    return catalog_response('catalog')
 
-@app.route('/api/diagnostic/guided', methods=['POST'])
+@api.route('/api/diagnostic/guided', methods=['POST'])
 def guided_diagnostic():
     try:
         data = request.get_json()
         
+        diagnosis_args = guided_diagnosis_args(data)
+        
+        # In job mode only the rule engine runs on the request thread
+        if request.args.get('mode') == 'async':
+            session = build_guided_session(data, get_rule_based_diagnosis(
+                diagnosis_args['equipment_type'], diagnosis_args['symptoms'],
+                diagnosis_args['error_codes'], diagnosis_args['measurements']
+            ))
+            queued = start_diagnostic_job(session, diagnosis_args, **admission_args(request.headers, request.remote_addr))
+            return session_response({
+                'success': True,
+                'session': session
+            }, 202 if queued else 200)
+        
         # Get enhanced diagnosis
-        ai_diagnosis = get_enhanced_diagnosis(
-            equipment_type=data.get('equipment_type'),
-            location=data.get('location'),
-            symptoms=data.get('symptoms', []),
-            measurements=data.get('measurements', {}),
-            error_codes=data.get('error_codes', []),
-            description=data.get('additional_notes', '')
-        )
+        ai_diagnosis = get_enhanced_diagnosis(**diagnosis_args, **admission_args(request.headers, request.remote_addr))
         
         # Create diagnostic session
-        session = {
-            'id': str(uuid.uuid4())[:8],
-            'session_type': 'guided',
-            'equipment_type': data.get('equipment_type'),
-            'location': data.get('location'),
-            'symptoms': data.get('symptoms', []),
-            'measurements': data.get('measurements', {}),
-            'error_codes': data.get('error_codes', []),
-            'description': data.get('additional_notes', ''),
-            'created_at': datetime.now().isoformat(),
-            'status': 'completed',
-            'confidence_score': ai_diagnosis.get('confidence_score', 75),
-            'ai_diagnosis': ai_diagnosis
-        }
+        session = build_guided_session(data, ai_diagnosis)
+        diagnostic_jobs.remember(session)
         
-        return jsonify({
+        return session_response({
             'success': True,
             'session': session
         })
@@ -412,34 +812,186 @@ def guided_diagnostic():
             'error': str(e)
         }), 500
 
-@app.route('/api/diagnostic/quick-submit', methods=['POST'])
+@api.route('/api/diagnostic/guided/stream', methods=['POST'])
+def guided_diagnostic_stream():
+    # Checked before the stream starts, while an error can still get its own status code
+    data = request.get_json(silent=True)
+    error = submission_error(data)
+    if error is not None:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    try:
+        equipment_type = data.get('equipment_type')
+        location = data.get('location')
+        symptoms = data.get('symptoms', [])
+        measurements = data.get('measurements', {})
+        error_codes = data.get('error_codes', [])
+        description = data.get('additional_notes', '')
+        admission = admission_args(request.headers, request.remote_addr)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    def events():
+        try:
+            # The rule-based result goes out before any LLM work starts
+            diagnosis = get_rule_based_diagnosis(equipment_type, symptoms, error_codes, measurements)
+            # Stored straight away, so the session exists even if the client leaves mid-stream
+            session = build_guided_session(data, diagnosis)
+            diagnostic_jobs.remember(session)
+            yield sse_event('diagnosis', diagnosis)
+            
+            if llm_enhancement_enabled() and not resolved_by_error_codes(diagnosis):
+                cache_key = get_diagnosis_cache_key(equipment_type, location, symptoms, measurements, error_codes, description)
+                cached = diagnosis_cache.get(cache_key)
+                if cached is not None:
+                    diagnosis = cached
+                    yield sse_event('delta', {'content': cached['summary']})
+                else:
+                    try:
+                        priority = admission_priority(diagnosis, symptoms, description, admission['background'])
+                        # The slot is held until the stream ends or the client goes away
+                        with llm_admission.slot(admission['client_id'], priority):
+                            prompt = diagnostic_prompt_for(diagnosis, equipment_type, location, symptoms, measurements, error_codes, description)
+                            stream = chat_completion(
+                                model=DIAGNOSIS_MODEL,
+                                messages=build_diagnostic_messages(prompt),
+                                temperature=0.3,
+                                max_tokens=2000,
+                                stream=True
+                            )
+                            parts = []
+                            for content in iter_completion_deltas(stream, DIAGNOSIS_MODEL):
+                                parts.append(content)
+                                yield sse_event('delta', {'content': content})
+                        diagnosis = apply_chatgpt_analysis(diagnosis, ''.join(parts).strip())
+                        diagnosis_cache.set(cache_key, diagnosis)
+                    except AdmissionRejected as e:
+                        diagnosis = mark_degraded(diagnosis, e.reason)
+                    except CircuitOpenError:
+                        pass
+                    except Exception as e:
+                        print(f"OpenAI enhancement failed: {e}")
+            
+            yield sse_event('session', finish_streamed_session(session, diagnosis))
+        except Exception as e:
+            yield sse_event('error', {'success': False, 'error': str(e)})
+    
+    return sse_response(events())
+
+def submission_error(submission):
+    """Describe why a batch submission cannot be diagnosed, or None if it can"""
+    if not isinstance(submission, dict):
+        return 'Submission must be a JSON object'
+    for field, kind, name in (('symptoms', list, 'a list'), ('measurements', dict, 'an object'),
+                              ('error_codes', list, 'a list')):
+        value = submission.get(field, kind())
+        if not isinstance(value, kind):
+            return f"'{field}' must be {name}"
+        if kind is list and not all(isinstance(item, str) for item in value):
+            return f"'{field}' must contain only strings"
+    return None
+
+def read_batch_submissions():
+    """Yield (submission, error) pairs from an NDJSON or JSON batch request body"""
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                submission = json.loads(line)
+            except ValueError as e:
+                yield None, f"Invalid JSON line: {e}"
+                continue
+            error = submission_error(submission)
+            yield (None, error) if error else (submission, None)
+    else:
+        for submission in (request.get_json() or {}).get('submissions', []):
+            error = submission_error(submission)
+            yield (None, error) if error else (submission, None)
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+@api.route('/api/diagnostic/batch', methods=['POST'])
+def batch_diagnostic():
+    enhance = request.args.get('enhance', '').lower() in ('1', 'true') and llm_enhancement_enabled()
+    # Batch enhancement always queues behind interactive work
+    client_id = admission_args(request.headers, request.remote_addr)['client_id']
+    
+    def results():
+        index = 0
+        for chunk in chunked(read_batch_submissions(), BATCH_CHUNK_SIZE):
+            valid = [(submission, guided_diagnosis_args(submission)) for submission, error in chunk if error is None]
+            scored = iter(rule_engine.batch_results([args['symptoms'] for _, args in valid]))
+            # Derived metrics for the whole chunk come from one interpolation per refrigerant
+            measured = iter(analyze_measurement_batch(
+                [args['measurements'] for _, args in valid], MEASUREMENT_DEFAULT_REFRIGERANT))
+            enhanced = iter(batch_enhancement_pool.map(
+                lambda args: get_enhanced_diagnosis(**args, client_id=client_id, background=True),
+                [args for _, args in valid]
+            )) if enhance else None
+            
+            valid_args = iter(args for _, args in valid)
+            for submission, error in chunk:
+                if error is not None:
+                    line = {'index': index, 'success': False, 'error': error}
+                else:
+                    line = {'index': index, 'success': True, 'id': submission.get('id')}
+                    result = apply_measurement_analysis(next(scored), next(measured))
+                    error_codes = next(valid_args)['error_codes']
+                    if error_codes:
+                        with STAGE_SECONDS.time(stage='error_codes'):
+                            result = apply_error_codes(result, error_code_db.decode(error_codes))
+                    line.update(result)
+                    if enhanced is not None:
+                        line['ai_diagnosis'] = next(enhanced)
+                index += 1
+                yield json.dumps(line) + '\n'
+    
+    return Response(stream_with_context(results()), mimetype='application/x-ndjson')
+
+@api.route('/api/diagnostic/quick-submit', methods=['POST'])
 def quick_submit():
     try:
         data = request.get_json()
         
+        diagnosis_args = quick_submit_diagnosis_args(data)
+        
+        # A near-identical earlier description is answered right away, in either mode
+        ai_diagnosis = similar_quick_submit_diagnosis(diagnosis_args)
+        
+        if ai_diagnosis is None and request.args.get('mode') == 'async':
+            session = build_quick_submit_session(data, get_rule_based_diagnosis('unknown', []))
+            queued = start_diagnostic_job(session, diagnosis_args, enhance=enhance_quick_submit,
+                                          **admission_args(request.headers, request.remote_addr))
+            return session_response({
+                'success': True,
+                'session': session
+            }, 202 if queued else 200)
+        
         # Get enhanced diagnosis for quick submit
-        ai_diagnosis = get_enhanced_diagnosis(
-            equipment_type='unknown',
-            location=data.get('location', 'unknown'),
-            symptoms=[],
-            measurements={},
-            error_codes=[],
-            description=data.get('description', '')
-        )
+        if ai_diagnosis is None:
+            ai_diagnosis = get_enhanced_diagnosis(**diagnosis_args, **admission_args(request.headers, request.remote_addr))
+            if ai_diagnosis.get('chatgpt_analysis'):
+                remember_quick_submit(diagnosis_args, ai_diagnosis)
         
         # Create quick submit session
-        session = {
-            'id': str(uuid.uuid4())[:8],
-            'session_type': 'quick_submit',
-            'location': data.get('location'),
-            'description': data.get('description'),
-            'created_at': datetime.now().isoformat(),
-            'status': 'completed',
-            'confidence_score': ai_diagnosis.get('confidence_score', 70),
-            'ai_diagnosis': ai_diagnosis
-        }
+        session = build_quick_submit_session(data, ai_diagnosis)
+        diagnostic_jobs.remember(session)
         
-        return jsonify({
+        return session_response({
             'success': True,
             'session': session
         })
@@ -450,86 +1002,303 @@ def quick_submit():
             'error': str(e)
         }), 500
 
-@app.route('/api/images/upload', methods=['POST'])
+@api.route('/api/diagnostic/session/<session_id>', methods=['GET'])
+def get_diagnostic_session(session_id):
+    session = diagnostic_jobs.get(session_id) or session_store.get(session_id)
+    if session is None:
+        return jsonify({
+            'success': False,
+            'error': 'Session not found'
+        }), 404
+    
+    return session_response({
+        'success': True,
+        'session': session
+    })
+
+@api.route('/api/diagnostic/sessions', methods=['GET'])
+def list_diagnostic_sessions():
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        sessions, next_cursor = session_store.query(
+            equipment_type=request.args.get('equipment_type'),
+            location=request.args.get('location'),
+            symptom=request.args.get('symptom'),
+            session_type=request.args.get('session_type'),
+            created_after=request.args.get('created_after'),
+            created_before=request.args.get('created_before'),
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    return session_response({
+        'success': True,
+        'sessions': sessions,
+        'next_cursor': next_cursor
+    })
+
+@api.route('/api/error-codes/<code>', methods=['GET'])
+def lookup_error_code(code):
+    if not error_code_db.available():
+        return jsonify({'success': False, 'error': 'Error code database is not configured'}), 503
+    entries = error_code_db.lookup(code, request.args.get('brand'), request.args.get('model_family'))
+    if not entries:
+        return jsonify({'success': False, 'error': 'Error code not found'}), 404
+    return jsonify({'success': True, 'code': entries[0]['code'], 'entries': entries})
+
+@api.route('/api/error-codes', methods=['GET'])
+def search_error_codes():
+    if not error_code_db.available():
+        return jsonify({'success': False, 'error': 'Error code database is not configured'}), 503
+    prefix = request.args.get('prefix', '')
+    brand = request.args.get('brand')
+    if not prefix and not brand:
+        return jsonify({'success': False, 'error': 'prefix or brand is required'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    return jsonify({'success': True, 'entries': error_code_db.search(prefix, brand, limit)})
+
+@api.route('/api/images/upload', methods=['POST'])
 def upload_image():
+    """Accept a photo as a raw image/* body or a multipart 'image' field.
+
+    The body is streamed into a spooled temp file, so at most IMAGE_SPOOL_MEMORY
+    bytes per request sit in memory. Processing runs as a background job;
+    poll /api/images/<id> for the result and pass the id as image_ids on a
+    diagnostic submission.
+    """
+    if request.content_length is not None and request.content_length > IMAGE_MAX_BYTES:
+        return jsonify({'success': False, 'error': f'Image exceeds the {IMAGE_MAX_BYTES // (1024 * 1024)} MB limit'}), 413
+    if not image_pipeline.admit():
+        response = jsonify({'success': False, 'error': 'Image processing is busy, retry shortly'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image') or next(iter(request.files.values()), None)
+        if upload is None:
+            return jsonify({'success': False, 'error': 'No image file in the request'}), 400
+        stream, content_type, filename = upload.stream, upload.mimetype, upload.filename
+    else:
+        stream, content_type, filename = request.stream, request.mimetype, request.args.get('filename')
+    if not (content_type.startswith('image/') or content_type == 'application/octet-stream'):
+        return jsonify({'success': False, 'error': 'Upload must be an image'}), 415
+
+    try:
+        spooled, image_id, size = spool_upload(stream, IMAGE_MAX_BYTES, IMAGE_SPOOL_MEMORY)
+    except UploadTooLarge as e:
+        return jsonify({'success': False, 'error': str(e)}), 413
+    with spooled:
+        if not size:
+            return jsonify({'success': False, 'error': 'Empty upload'}), 400
+        record, deduplicated = image_pipeline.store(spooled, image_id, size, content_type, filename)
+
     return jsonify({
         'success': True,
-        'message': 'Image upload functionality will be available in the full version',
-        'analysis': {
-            'text_detected': 'Model: ABC123, Error: E1',
-            'components_identified': ['Compressor', 'Control Board'],
-            'safety_concerns': ['High voltage warning visible']
-        }
-    })
+        'deduplicated': deduplicated,
+        'image': record
+    }), 202 if record['status'] == 'processing' else 200
+
+@api.route('/api/images/<image_id>', methods=['GET'])
+def get_image(image_id):
+    record = image_pipeline.get(image_id)
+    if record is None:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    return jsonify({'success': True, 'image': record})
 
-@app.route('/', methods=['GET'])
+@api.route('/api/images/<image_id>/<variant>', methods=['GET'])
+def get_image_file(image_id, variant):
+    record = image_pipeline.get(image_id)
+    if record is None or variant not in ('thumbnail', 'processed') or record['status'] != 'completed':
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    # Content-addressed, so a given URL never changes
+    return send_file(
+        os.path.join(image_pipeline.image_dir(image_id), f'{variant}.jpg'),
+        mimetype='image/jpeg',
+        max_age=31536000
+    )
+
+@api.route('/', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'HVAC AI Troubleshooter API',
         'version': '1.0.0 Enhanced with Rule-Based Logic',
         'openai_available': OPENAI_AVAILABLE,
-        'openai_configured': bool(os.getenv('OPENAI_API_KEY')) if OPENAI_AVAILABLE else False
+        'openai_configured': bool(os.getenv('OPENAI_API_KEY')) if OPENAI_AVAILABLE else False,
+        'catalog': catalog_cache.stats(),
+        'diagnosis_cache': diagnosis_cache.stats(),
+        'description_index': description_index.stats(),
+        'error_codes': error_code_db.stats(),
+        'images': image_pipeline.stats(),
+        'request_coalescing': diagnosis_flight.stats(),
+        'diagnostic_jobs': diagnostic_jobs.stats(),
+        'session_store': session_store.stats(),
+        'follow_up_threads': follow_up_threads.stats(),
+        'llm_gateway': llm_gateway.stats() if llm_gateway else None,
+        'llm_admission': llm_admission.stats()
     })
 
-@app.route('/api/follow-up', methods=['POST'])
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def admin_error():
+    """Error response for an admin route, or None when the request carries ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Admin endpoints are disabled; set ADMIN_TOKEN'}), 403
+    supplied = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {ADMIN_TOKEN}'.encode('utf-8')):
+        return jsonify({'success': False, 'error': 'Admin credential required'}), 401
+    return None
+
+@api.route('/api/diagnostic/cache', methods=['DELETE'])
+def invalidate_diagnosis_cache():
+    # The prompt version comes from DIAGNOSIS_PROMPT_VERSION only, so every worker agrees on it
+    error = admin_error()
+    if error is not None:
+        return error
+    if not diagnosis_cache.invalidate():
+        return jsonify({
+            'success': False,
+            'error': 'Shared cache could not be cleared',
+            'diagnosis_cache': diagnosis_cache.stats()
+        }), 500
+    return jsonify({
+        'success': True,
+        'diagnosis_cache': diagnosis_cache.stats()
+    })
+
+def prepare_follow_up(data):
+    """Build the follow-up prompt, using the server-side thread when a session id is given.
+
+    Returns (follow_up_prompt, conversation, prompt_tokens_saved); conversation is
+    None for stateless requests that send the whole original analysis.
+    """
+    follow_up_question = data.get('follow_up_question', '')
+    session_id = data.get('session_id')
+    if not session_id:
+        prompt = build_follow_up_prompt(data.get('original_analysis', ''), follow_up_question, data.get('diagnostic_context', {}))
+        return prompt, None, 0
+    
+    conversation = follow_up_threads.get(session_id)
+    if conversation is None:
+        session = diagnostic_jobs.get(session_id) or session_store.get(session_id)
+        if session is None and not data.get('original_analysis'):
+            raise LookupError('Session not found')
+        session = session or {}
+        conversation = follow_up_threads.start(
+            session_id,
+            data.get('original_analysis') or session.get('ai_diagnosis', {}).get('summary', ''),
+            data.get('diagnostic_context') or {
+                'equipment_type': session.get('equipment_type'),
+                'symptoms': session.get('symptoms', []),
+                'measurements': session.get('measurements')
+            }
+        )
+    
+    analysis, history, saved = follow_up_threads.build_context(conversation)
+    prompt = build_follow_up_prompt(analysis, follow_up_question, conversation.diagnostic_context, history)
+    return prompt, conversation, saved
+
+@api.route('/api/follow-up', methods=['POST'])
 def follow_up_question():
     try:
         data = request.json
-        original_analysis = data.get('original_analysis', '')
         follow_up_question = data.get('follow_up_question', '')
-        diagnostic_context = data.get('diagnostic_context', {})
         
         if not follow_up_question:
             return jsonify({'error': 'Follow-up question is required'}), 400
         
         # Create enhanced prompt for follow-up
-        follow_up_prompt = f"""
-You are an expert HVAC technician assistant providing follow-up support for a previous diagnostic analysis.
-
-ORIGINAL ANALYSIS CONTEXT:
-{original_analysis}
-
-DIAGNOSTIC CONTEXT:
-- Equipment Type: {diagnostic_context.get('equipment_type', 'Not specified')}
-- Symptoms: {', '.join(diagnostic_context.get('symptoms', []))}
-- Measurements: {diagnostic_context.get('measurements', 'Not provided')}
-
-TECHNICIAN'S FOLLOW-UP QUESTION:
-{follow_up_question}
-
-Please provide a detailed, professional response that:
-1. Directly addresses the technician's specific question
-2. References the original analysis when relevant
-3. Provides additional technical details or clarification
-4. Includes safety considerations if applicable
-5. Suggests next steps or additional diagnostics if needed
-
-Format your response with clear headers and bullet points for easy reading.
-"""
+        with STAGE_SECONDS.time(stage='prompt_build'):
+            follow_up_prompt, conversation, tokens_saved = prepare_follow_up(data)
         
         # Call ChatGPT for follow-up response
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert HVAC diagnostic assistant providing professional follow-up support to experienced technicians."},
-                {"role": "user", "content": follow_up_prompt}
-            ],
+        if not llm_enhancement_enabled():
+            return jsonify({'error': 'AI follow-up is not configured'}), 503
+        
+        response = chat_completion(
+            model=FOLLOW_UP_MODEL,
+            messages=build_follow_up_messages(follow_up_prompt),
             max_tokens=1000,
             temperature=0.3
         )
         
         follow_up_response = response.choices[0].message.content
+        if conversation is not None:
+            follow_up_threads.add_turn(conversation, follow_up_question, follow_up_response)
         
         return jsonify({
             'follow_up_response': follow_up_response,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'session_id': data.get('session_id'),
+            'prompt_tokens_saved': tokens_saved
         })
         
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except CircuitOpenError:
+        return jsonify({'error': 'AI follow-up is temporarily unavailable'}), 503
     except Exception as e:
         print(f"Follow-up error: {str(e)}")
         return jsonify({'error': 'Failed to process follow-up question'}), 500
 
+@api.route('/api/follow-up/stream', methods=['POST'])
+def follow_up_stream():
+    data = request.json
+    follow_up_question = data.get('follow_up_question', '')
+    
+    if not follow_up_question:
+        return jsonify({'error': 'Follow-up question is required'}), 400
+    if not llm_enhancement_enabled():
+        return jsonify({'error': 'AI follow-up is not configured'}), 503
+    
+    try:
+        with STAGE_SECONDS.time(stage='prompt_build'):
+            follow_up_prompt, conversation, tokens_saved = prepare_follow_up(data)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    
+    def events():
+        try:
+            stream = chat_completion(
+                model=FOLLOW_UP_MODEL,
+                messages=build_follow_up_messages(follow_up_prompt),
+                max_tokens=1000,
+                temperature=0.3,
+                stream=True
+            )
+            parts = []
+            for content in iter_completion_deltas(stream, FOLLOW_UP_MODEL):
+                parts.append(content)
+                yield sse_event('delta', {'content': content})
+            follow_up_response = ''.join(parts)
+            if conversation is not None:
+                follow_up_threads.add_turn(conversation, follow_up_question, follow_up_response)
+            yield sse_event('done', {
+                'follow_up_response': follow_up_response,
+                'timestamp': datetime.now().isoformat(),
+                'session_id': data.get('session_id'),
+                'prompt_tokens_saved': tokens_saved
+            })
+        except CircuitOpenError:
+            yield sse_event('error', {'error': 'AI follow-up is temporarily unavailable'})
+        except Exception as e:
+            print(f"Follow-up error: {str(e)}")
+            yield sse_event('error', {'error': 'Failed to process follow-up question'})
+    
+    return sse_response(events())
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; production serves asgi_app:application with gunicorn.conf.py
+    get_app().run(
+        host='0.0.0.0',
+        port=int(os.getenv('PORT', '5000')),
+        debug=os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true')
+    )
 
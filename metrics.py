@@ -0,0 +1,300 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(label_names, labels):
+    return tuple(str(labels.get(name, '')) for name in label_names)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names, key, extra=None):
+    pairs = list(zip(label_names, key)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.format(self.collect() if values is None else values))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def merge(into, key, value):
+        into[key] = into.get(key, 0) + value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+    def format(self, values):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}' for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, label_names=(), callback=None):
+        super().__init__(name, documentation, label_names)
+        self._values = {}
+        self._callback = callback
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self):
+        if self._callback is not None:
+            value = self._callback()
+            if isinstance(value, dict):
+                # A labelled gauge's callback maps label-value tuples to readings
+                for label_values, reading in value.items():
+                    self.set(reading, **dict(zip(self.label_names, label_values)))
+            else:
+                self.set(value)
+        with self._lock:
+            return dict(self._values)
+
+    format = Counter.format
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._series.items()}
+
+    @staticmethod
+    def merge(into, key, value):
+        counts, total, count = into.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+        into[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1], count + value[2]]
+
+    def format(self, series):
+        lines = []
+        for key, (counts, total, count) in series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {count}')
+        return lines
+
+
+class Registry:
+    """Metrics for one process, optionally merged with the other workers' through a shared directory.
+
+    Once share() is called, each process writes its readings to <directory>/<pid>.json
+    every publish_interval seconds, and render() sums every file, so any worker
+    answers a scrape for the whole server. Counters and histograms of exited
+    workers are kept so totals never go backwards; their gauges are dropped.
+    The directory must be emptied when the server starts.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+        self.directory = None
+        self.publish_interval = 5.0
+        self._publisher = None
+
+    def share(self, directory, publish_interval=5.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.publish_interval = publish_interval
+        self._start_publisher()
+        # Forked workers inherit the registry but not its thread
+        os.register_at_fork(after_in_child=self._start_publisher)
+
+    def _start_publisher(self):
+        stop = threading.Event()
+        if self._publisher is not None:
+            self._publisher.set()
+        self._publisher = stop
+
+        def run():
+            while not stop.wait(self.publish_interval):
+                try:
+                    self.publish()
+                except OSError as e:
+                    print(f"Metrics publish failed: {e}")
+
+        threading.Thread(target=run, name='metrics-publisher', daemon=True).start()
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return {metric.name: [[list(key), value] for key, value in metric.collect().items()] for metric in metrics}
+
+    def publish(self, snapshot=None):
+        """Write this process's readings for the other workers to merge"""
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot() if snapshot is None else snapshot, f)
+        os.replace(f'{path}.tmp', path)
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=(), callback=None):
+        return self.register(Gauge(name, documentation, label_names, callback))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        if self.directory is None:
+            return '\n'.join(metric.render() for metric in metrics) + '\n'
+        own = self.snapshot()
+        self.publish(own)
+        merged = {metric.name: {} for metric in metrics}
+        for pid, snapshot in self._worker_snapshots(own):
+            for metric in metrics:
+                if metric.kind == 'gauge' and not _alive(pid):
+                    continue
+                for key, value in snapshot.get(metric.name, []):
+                    metric.merge(merged[metric.name], tuple(key), value)
+        return '\n'.join(metric.render(merged[metric.name]) for metric in metrics) + '\n'
+
+    def _worker_snapshots(self, own):
+        yield os.getpid(), own
+        for name in os.listdir(self.directory):
+            pid, _, extension = name.partition('.')
+            if extension != 'json' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    yield int(pid), json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping metrics from worker {pid}: {e}")
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SamplingProfiler:
+    """Samples one thread's stack on an interval and writes collapsed stacks for flame graphs"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, directory, label):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{int(time.time() * 1000)}-{label}.collapsed')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
@@ -0,0 +1,296 @@
+import bisect
+import functools
+import math
+import re
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+ATMOSPHERE_PSI = 14.696
+KPA_TO_PSI = 0.1450377
+
+# Saturation pressures in kPa absolute at -40..60 °C in 10 K steps, rounded from
+# published pressure-temperature charts. Zeotropic R-454B has a ~1 K glide, so
+# its bubble (liquid) and dew (vapor) curves differ; the others use one curve.
+TABLE_TEMPERATURES_C = (-40, -30, -20, -10, 0, 10, 20, 30, 40, 50, 60)
+PT_TABLES_KPA = {
+    'R-22': {
+        'bubble': (105.0, 163.9, 244.8, 354.3, 497.6, 680.7, 909.9, 1191.9, 1533.6, 1942.3, 2426.1)
+    },
+    'R-410A': {
+        'bubble': (175.0, 269.8, 399.6, 572.8, 798.7, 1087.0, 1447.8, 1891.9, 2430.6, 3076.0, 3836.0)
+    },
+    'R-32': {
+        'bubble': (177.6, 273.0, 405.6, 583.0, 813.1, 1106.9, 1474.2, 1927.5, 2478.5, 3140.6, 3916.0)
+    },
+    'R-454B': {
+        'bubble': (163.0, 252.0, 374.0, 538.0, 751.0, 1024.0, 1366.0, 1788.0, 2300.0, 2913.0, 3640.0),
+        'dew': (153.0, 238.0, 355.0, 513.0, 720.0, 985.0, 1320.0, 1734.0, 2238.0, 2843.0, 3565.0)
+    }
+}
+
+REFRIGERANT_ALIASES = {name.replace('-', '').lower(): name for name in PT_TABLES_KPA}
+
+# Typical ranges (°F) for a cooling-mode split system; readings outside them are flagged
+NORMAL_RANGES = {
+    'superheat': (5.0, 20.0),
+    'subcooling': (6.0, 16.0),
+    'air_delta_t': (14.0, 22.0),
+    'condenser_split': (10.0, 30.0)
+}
+# Below this many readings per call, NumPy's per-call overhead outweighs vectorizing
+VECTORIZE_MIN_BATCH = 16
+# Evaporator saturation below freezing means the coil is icing or about to
+FREEZING_SATURATION_F = 32.0
+
+# Flag combinations that point at one root cause, strongest first
+FINDINGS = [
+    ({'high_superheat', 'low_subcooling'}, 88, 'Low refrigerant charge (measured)',
+     ['Refrigerant leak', 'System undercharged at install or last service']),
+    ({'high_superheat', 'high_subcooling'}, 86, 'Liquid line or metering device restriction (measured)',
+     ['Clogged liquid line filter drier', 'Restricted or failed TXV / piston']),
+    ({'low_superheat', 'high_subcooling'}, 85, 'Refrigerant overcharge (measured)',
+     ['System overcharged', 'Non-condensables in the system']),
+    ({'low_superheat', 'evaporator_below_freezing'}, 84, 'Low evaporator airflow (measured)',
+     ['Dirty air filter', 'Blower motor or capacitor problem', 'Dirty evaporator coil']),
+    ({'low_superheat', 'low_subcooling'}, 80, 'Metering device overfeeding or weak compressor (measured)',
+     ['TXV stuck open or oversized piston', 'Inefficient compressor (worn valves)']),
+    ({'high_condenser_split'}, 82, 'Poor condenser heat rejection (measured)',
+     ['Dirty condenser coil', 'Failed condenser fan motor', 'Condenser air recirculation'])
+]
+
+FLAG_CAUSES = {
+    'high_superheat': 'Evaporator starved of refrigerant',
+    'low_superheat': 'Liquid refrigerant may be reaching the compressor',
+    'high_subcooling': 'Refrigerant backed up in the condenser',
+    'low_subcooling': 'Too little liquid in the condenser',
+    'evaporator_below_freezing': 'Evaporator coil icing',
+    'high_air_delta_t': 'Low airflow across the evaporator',
+    'low_air_delta_t': 'Low cooling capacity',
+    'high_condenser_split': 'Condenser not rejecting heat',
+    'low_condenser_split': 'Low head pressure'
+}
+
+
+def _build_curves():
+    # ln(P) is close to linear in 1/T (Clausius-Clapeyron), so interpolating in
+    # that space stays within a few tenths of a degree between 10 K table points
+    curves = {}
+    for name, table in PT_TABLES_KPA.items():
+        for curve in ('bubble', 'dew'):
+            pressures = table.get(curve, table['bubble'])
+            log_p = [math.log(p * KPA_TO_PSI) for p in pressures]
+            inverse_t = [1.0 / (t + 273.15) for t in TABLE_TEMPERATURES_C]
+            curves[name, curve] = (log_p, inverse_t)
+            if NUMPY_AVAILABLE:
+                curves[name, curve, 'array'] = (np.array(log_p), np.array(inverse_t))
+    return curves
+
+
+CURVES = _build_curves()
+
+
+def normalize_refrigerant(value):
+    """'R-410A', 'r410a' and '410A' all name the same table"""
+    return _refrigerant_name(str(value)) if value else None
+
+
+@functools.lru_cache(maxsize=256)
+def _refrigerant_name(text):
+    key = re.sub(r'[\s\-]', '', text.lower())
+    return REFRIGERANT_ALIASES.get(key if key.startswith('r') else f'r{key}')
+
+
+def _interp(x, xp, fp):
+    if x != x or x < xp[0] or x > xp[-1]:
+        return math.nan
+    i = min(bisect.bisect_right(xp, x), len(xp) - 1)
+    return fp[i - 1] + (fp[i] - fp[i - 1]) * (x - xp[i - 1]) / (xp[i] - xp[i - 1])
+
+
+def saturation_temperature_f(refrigerant, pressures_psig, curve='bubble'):
+    """Saturation temperature (°F) for gauge pressures; NaN when missing or outside the table"""
+    if NUMPY_AVAILABLE and len(pressures_psig) >= VECTORIZE_MIN_BATCH:
+        log_p, inverse_t = CURVES[refrigerant, curve, 'array']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x = np.log(np.asarray(pressures_psig, dtype=np.float64) + ATMOSPHERE_PSI)
+            result = np.interp(x, log_p, inverse_t, left=np.nan, right=np.nan)
+            return (1.0 / result - 273.15) * 9.0 / 5.0 + 32.0
+    log_p, inverse_t = CURVES[refrigerant, curve]
+    result = []
+    for p in pressures_psig:
+        absolute = p + ATMOSPHERE_PSI
+        inverse = _interp(math.log(absolute), log_p, inverse_t) if absolute > 0 else math.nan
+        result.append((1.0 / inverse - 273.15) * 9.0 / 5.0 + 32.0 if inverse == inverse else math.nan)
+    return result
+
+
+def _reading(measurements, *names):
+    for name in names:
+        value = measurements.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(value):
+            return value
+    return math.nan
+
+
+def _round(value):
+    return None if value != value else round(float(value), 1)
+
+
+def analyze_batch(measurement_list, default_refrigerant=None):
+    """Derived refrigerant-circuit metrics and out-of-range flags for many tickets.
+
+    Readings are gauge pressures (psig) and °F, as entered in the guided form.
+    Tickets are grouped by refrigerant and each group is evaluated with one
+    NumPy interpolation per curve; single tickets take a scalar path. Returns one analysis dict per ticket, or None
+    when a ticket has nothing to analyze.
+    """
+    rows = []
+    groups = {}
+    for index, measurements in enumerate(measurement_list):
+        measurements = measurements if isinstance(measurements, dict) else {}
+        refrigerant = normalize_refrigerant(measurements.get('refrigerant')) or normalize_refrigerant(default_refrigerant)
+        readings = (
+            _reading(measurements, 'suction_pressure'),
+            _reading(measurements, 'liquid_pressure', 'discharge_pressure'),
+            _reading(measurements, 'suction_line_temperature'),
+            _reading(measurements, 'liquid_line_temperature'),
+            _reading(measurements, 'return_air_temperature'),
+            _reading(measurements, 'supply_air_temperature'),
+            _reading(measurements, 'ambient_temperature')
+        )
+        rows.append((refrigerant, readings))
+        if refrigerant:
+            groups.setdefault(refrigerant, []).append(index)
+
+    suction_sat = [math.nan] * len(rows)
+    condensing_sat = [math.nan] * len(rows)
+    for refrigerant, indexes in groups.items():
+        suction = saturation_temperature_f(refrigerant, [rows[i][1][0] for i in indexes], 'dew')
+        condensing = saturation_temperature_f(refrigerant, [rows[i][1][1] for i in indexes], 'bubble')
+        for position, i in enumerate(indexes):
+            suction_sat[i] = suction[position]
+            condensing_sat[i] = condensing[position]
+
+    if NUMPY_AVAILABLE and len(rows) >= VECTORIZE_MIN_BATCH:
+        readings = np.array([row[1] for row in rows], dtype=np.float64).reshape(len(rows), 7)
+        suction_sat = np.array(suction_sat, dtype=np.float64)
+        condensing_sat = np.array(condensing_sat, dtype=np.float64)
+        metrics = {
+            'suction_saturation_f': suction_sat,
+            'superheat_f': readings[:, 2] - suction_sat,
+            'condensing_saturation_f': condensing_sat,
+            'subcooling_f': condensing_sat - readings[:, 3],
+            'air_delta_t_f': readings[:, 4] - readings[:, 5],
+            'condenser_split_f': condensing_sat - readings[:, 6]
+        }
+        metrics = {name: np.round(values, 1).tolist() for name, values in metrics.items()}
+    else:
+        metrics = {
+            'suction_saturation_f': suction_sat,
+            'superheat_f': [row[1][2] - sat for row, sat in zip(rows, suction_sat)],
+            'condensing_saturation_f': condensing_sat,
+            'subcooling_f': [sat - row[1][3] for row, sat in zip(rows, condensing_sat)],
+            'air_delta_t_f': [row[1][4] - row[1][5] for row in rows],
+            'condenser_split_f': [sat - row[1][6] for row, sat in zip(rows, condensing_sat)]
+        }
+
+    results = []
+    for index, (refrigerant, readings) in enumerate(rows):
+        values = {name: _round(column[index]) for name, column in metrics.items()}
+        # A pressure was given but fell outside the table, so its PT metrics are missing
+        out_of_range = [
+            {'flag': f'{name}_out_of_range', 'value': pressure}
+            for name, pressure, sat in (('suction_pressure', readings[0], values['suction_saturation_f']),
+                                        ('liquid_pressure', readings[1], values['condensing_saturation_f']))
+            if refrigerant and pressure == pressure and sat is None
+        ]
+        if not out_of_range and all(value is None for value in values.values()):
+            results.append(None)
+            continue
+        results.append({'refrigerant': refrigerant, **values, 'flags': _flags(values) + out_of_range})
+    return results
+
+
+def _flags(values):
+    flags = []
+    for metric, (low, high) in NORMAL_RANGES.items():
+        value = values[f'{metric}_f']
+        if value is None:
+            continue
+        if value < low:
+            flags.append({'flag': f'low_{metric}', 'value': value, 'normal_range': [low, high]})
+        elif value > high:
+            flags.append({'flag': f'high_{metric}', 'value': value, 'normal_range': [low, high]})
+    if values['suction_saturation_f'] is not None and values['suction_saturation_f'] < FREEZING_SATURATION_F:
+        flags.append({'flag': 'evaporator_below_freezing', 'value': values['suction_saturation_f']})
+    return flags
+
+
+def analyze(measurements, default_refrigerant=None):
+    return analyze_batch([measurements], default_refrigerant)[0]
+
+
+def describe_analysis(analysis):
+    """One-line summary of the derived metrics for the diagnostic prompt"""
+    if not analysis:
+        return 'None available'
+    labels = (
+        ('suction_saturation_f', 'suction saturation'), ('superheat_f', 'superheat'),
+        ('condensing_saturation_f', 'condensing saturation'), ('subcooling_f', 'subcooling'),
+        ('air_delta_t_f', 'air ΔT'), ('condenser_split_f', 'condenser split')
+    )
+    parts = [f"{label} {analysis[key]}°F" for key, label in labels if analysis[key] is not None]
+    flags = ', '.join(flag['flag'].replace('_', ' ') for flag in analysis['flags'])
+    return f"{analysis['refrigerant'] or 'refrigerant not specified'}: {', '.join(parts)}" + (f" (flags: {flags})" if flags else '')
+
+
+def apply_measurement_analysis(diagnosis, analysis):
+    """Fold derived metrics into a rule-based diagnosis.
+
+    A flag combination with a known root cause becomes the primary issue when
+    it is more confident than the symptom rules; single flags add likely causes
+    and a small confidence boost, since measured readings corroborate them.
+    """
+    if not analysis:
+        return diagnosis
+    diagnosis = dict(diagnosis)
+    diagnosis['measurement_analysis'] = analysis
+    flags = {flag['flag'] for flag in analysis['flags']}
+    if not flags:
+        return diagnosis
+
+    causes = []
+    finding = next((finding for finding in FINDINGS if finding[0] <= flags), None)
+    if finding is not None:
+        _, confidence, issue, finding_causes = finding
+        causes.extend({'cause': cause, 'probability': 85 - rank * 10, 'source': 'measurements'}
+                      for rank, cause in enumerate(finding_causes))
+        if confidence > diagnosis['confidence_score']:
+            diagnosis['primary_issue'] = issue
+            diagnosis['confidence_score'] = confidence
+    else:
+        # A pressure past the end of the table corroborates nothing, so it earns no boost
+        corroborating = [flag for flag in flags if not flag.endswith('_out_of_range')]
+        diagnosis['confidence_score'] = min(90, diagnosis['confidence_score'] + 3 * len(corroborating))
+    causes.extend({'cause': FLAG_CAUSES[flag], 'probability': 60, 'source': 'measurements'}
+                  for flag in sorted(flags) if flag in FLAG_CAUSES)
+
+    seen = set()
+    merged = []
+    for cause in causes + list(diagnosis['likely_causes']):
+        if cause['cause'] not in seen:
+            seen.add(cause['cause'])
+            merged.append(cause)
+    diagnosis['likely_causes'] = merged
+    return diagnosis
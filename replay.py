@@ -0,0 +1,254 @@
+"""Replay archived tickets through the current diagnosis pipeline.
+
+Streams a JSONL file of guided or quick-submit payloads (or exported
+sessions) through get_enhanced_diagnosis on a process pool and writes one
+JSONL result per input line, in input order:
+
+    python replay.py tickets.jsonl -o results.jsonl
+    python replay.py tickets.jsonl -o results.jsonl --enhance --llm-rate 2
+    python replay.py tickets.jsonl -o results.jsonl --resume
+
+LLM enhancement is off unless --enhance is given. Only a bounded window of
+chunks is in flight, so memory stays flat however large the input is.
+Progress is checkpointed next to the output, so --resume carries on after
+the last chunk that was fully written. The session store and quick-submit
+index the service would open are kept in --workdir (a temporary directory
+by default), so a replay never touches the live ones.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+hvac = None
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart within one process"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def init_worker(enhance, rate_per_worker, workdir):
+    global hvac
+    # Replayed tickets are not sessions; keep the stores init_services opens out of the live ones
+    os.environ['SESSION_STORE_PATH'] = os.path.join(workdir, 'sessions.db')
+    os.environ['QUICK_SUBMIT_INDEX_PATH'] = os.path.join(workdir, 'quick_submit_index.db')
+    os.environ['IMAGE_STORE_DIR'] = os.path.join(workdir, 'uploads')
+    import main_hybrid
+    hvac = main_hybrid
+    hvac.init_services()
+    if not enhance:
+        hvac.llm_gateway = None
+    elif rate_per_worker and hvac.llm_gateway is not None:
+        limiter = RateLimiter(rate_per_worker)
+        chat = hvac.llm_gateway.chat
+
+        def limited_chat(**kwargs):
+            limiter.wait()
+            return chat(**kwargs)
+
+        hvac.llm_gateway.chat = limited_chat
+
+
+def diagnosis_args_for(record):
+    """Pick the payload and session type out of a ticket or exported session"""
+    payload = record.get('payload', record)
+    session_type = record.get('session_type') or record.get('type')
+    if session_type is None:
+        session_type = 'guided' if payload.get('equipment_type') or payload.get('symptoms') else 'quick_submit'
+    if session_type == 'guided':
+        if 'additional_notes' not in payload and 'description' in payload:
+            # Stored guided sessions keep the notes under 'description'
+            payload = dict(payload, additional_notes=payload['description'])
+        return session_type, hvac.guided_diagnosis_args(payload)
+    return 'quick_submit', hvac.quick_submit_diagnosis_args(payload)
+
+
+def replay_line(line_number, raw):
+    try:
+        record = json.loads(raw)
+        if not isinstance(record, dict):
+            raise ValueError('Ticket must be a JSON object')
+        session_type, args = diagnosis_args_for(record)
+        diagnosis = hvac.get_enhanced_diagnosis(**args)
+    except Exception as e:
+        return {'line': line_number, 'success': False, 'error': str(e)}, False
+
+    result = {
+        'line': line_number,
+        'success': True,
+        'id': record.get('id'),
+        'session_type': session_type,
+        'ai_diagnosis': diagnosis
+    }
+    # Exported sessions carry their original diagnosis, which is what drift is measured against
+    previous = record.get('ai_diagnosis')
+    changed = False
+    if isinstance(previous, dict):
+        changed = (previous.get('primary_issue'), previous.get('confidence_score')) != (
+            diagnosis['primary_issue'], diagnosis['confidence_score'])
+        result['previous'] = {
+            'primary_issue': previous.get('primary_issue'),
+            'confidence_score': previous.get('confidence_score')
+        }
+        result['changed'] = changed
+    return result, changed
+
+
+def replay_chunk(chunk):
+    """Diagnose one chunk of (line_number, raw_line) pairs; returns (encoded_output, counts)"""
+    lines = []
+    counts = {'ok': 0, 'errors': 0, 'changed': 0}
+    for line_number, raw in chunk:
+        result, changed = replay_line(line_number, raw)
+        counts['ok' if result['success'] else 'errors'] += 1
+        counts['changed'] += changed
+        lines.append(json.dumps(result, default=str))
+    return ('\n'.join(lines) + '\n').encode('utf-8'), counts
+
+
+def read_chunks(f, start_line, chunk_size, chunk_bytes):
+    """Yield (chunk, end_offset, end_line) from the current file position, skipping blank lines"""
+    chunk, size, line_number = [], 0, start_line
+    for raw in f:
+        line_number += 1
+        if raw.strip():
+            chunk.append((line_number, raw))
+            size += len(raw)
+        if len(chunk) >= chunk_size or size >= chunk_bytes:
+            yield chunk, f.tell(), line_number
+            chunk, size = [], 0
+    if chunk:
+        yield chunk, f.tell(), line_number
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def report(state, run, total_bytes, final=False):
+    """Print throughput for this run (not counting work done before a resume)"""
+    elapsed = max(time.monotonic() - run['started'], 1e-9)
+    done_bytes = state['input_offset'] - run['input_offset']
+    rate = (state['processed'] - run['processed']) / elapsed
+    line = (f"{state['processed']} tickets  {rate:.0f}/s  {done_bytes / elapsed / 1e6:.1f} MB/s  "
+            f"errors {state['errors']}  changed {state['changed']}")
+    if total_bytes and not final:
+        remaining = total_bytes - state['input_offset']
+        if done_bytes:
+            line += f"  {state['input_offset'] / total_bytes:.1%}  eta {remaining * elapsed / done_bytes:.0f}s"
+    print(('done: ' if final else '') + line + f'  elapsed {elapsed:.0f}s', file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay archived tickets through get_enhanced_diagnosis')
+    parser.add_argument('input', help='JSONL file of tickets or exported sessions')
+    parser.add_argument('-o', '--output', required=True, help='JSONL file for results')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=256, help='tickets per chunk sent to a worker')
+    parser.add_argument('--chunk-bytes', type=int, default=4 * 1024 * 1024, help='input bytes per chunk at most')
+    parser.add_argument('--window', type=int, help='chunks in flight at once (default 2 per worker)')
+    parser.add_argument('--enhance', action='store_true', help='call the LLM as the live service would')
+    parser.add_argument('--llm-rate', type=float, help='cap on LLM calls per second across all workers')
+    parser.add_argument('--checkpoint', help='checkpoint file (default OUTPUT.checkpoint)')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint')
+    parser.add_argument('--workdir', help='directory for the service stores workers open (default: a temporary one)')
+    parser.add_argument('--progress-interval', type=float, default=5.0, help='seconds between progress lines')
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f'{args.output}.checkpoint'
+    window = args.window or args.workers * 2
+    state = load_checkpoint(checkpoint_path) if args.resume else None
+    if args.resume and state is None:
+        print(f'No checkpoint at {checkpoint_path}, starting from the beginning', file=sys.stderr)
+    if state is not None and state['input'] != os.path.abspath(args.input):
+        parser.error(f"checkpoint {checkpoint_path} belongs to {state['input']}, not {os.path.abspath(args.input)}")
+    if state is None:
+        state = {'input': os.path.abspath(args.input), 'input_offset': 0, 'line': 0, 'output_offset': 0,
+                 'processed': 0, 'errors': 0, 'changed': 0}
+    run = {'started': time.monotonic(), 'input_offset': state['input_offset'], 'processed': state['processed']}
+
+    total_bytes = os.path.getsize(args.input)
+    rate_per_worker = args.llm_rate / args.workers if args.llm_rate else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix='hvac-replay-')
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(args.enhance, rate_per_worker, workdir)) as pool:
+            replay_input(args, pool, state, run, checkpoint_path, total_bytes, window)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report(state, run, total_bytes, final=True)
+
+
+def replay_input(args, pool, state, run, checkpoint_path, total_bytes, window):
+    last_report = run['started']
+    with open(args.input, 'rb') as source, open(args.output, 'r+b' if state['output_offset'] else 'wb') as out:
+        source.seek(state['input_offset'])
+        # Anything past the checkpoint belongs to a chunk that was not fully recorded
+        out.seek(state['output_offset'])
+        out.truncate()
+
+        in_flight = deque()
+
+        def drain_oldest():
+            nonlocal last_report
+            future, end_offset, end_line = in_flight.popleft()
+            encoded, counts = future.result()
+            out.write(encoded)
+            state['processed'] += counts['ok'] + counts['errors']
+            state['errors'] += counts['errors']
+            state['changed'] += counts['changed']
+            state['input_offset'], state['line'] = end_offset, end_line
+            if time.monotonic() - last_report >= args.progress_interval:
+                out.flush()
+                os.fsync(out.fileno())
+                state['output_offset'] = out.tell()
+                write_checkpoint(checkpoint_path, state)
+                report(state, run, total_bytes)
+                last_report = time.monotonic()
+
+        for chunk, end_offset, end_line in read_chunks(source, state['line'], args.chunk_size, args.chunk_bytes):
+            while len(in_flight) >= window:
+                drain_oldest()
+            in_flight.append((pool.submit(replay_chunk, chunk), end_offset, end_line))
+        while in_flight:
+            drain_oldest()
+
+        out.flush()
+        os.fsync(out.fileno())
+        state['output_offset'] = out.tell()
+        write_checkpoint(checkpoint_path, state)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import json
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+MSGPACK_MEDIA_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Request fields a session echoes back; the client already has them
+ECHOED_INPUTS = ('equipment_type', 'location', 'symptoms', 'measurements', 'error_codes', 'description', 'image_ids')
+# Rule-based blocks an enhanced diagnosis repeats next to the ChatGPT summary
+COMPATIBILITY_BLOCKS = ('likely_causes', 'recommended_actions', 'troubleshooting_steps', 'safety_warnings')
+
+
+def parse_fields(value):
+    """Parse fields=id,status,ai_diagnosis.summary into key paths"""
+    if not value:
+        return None
+    return [tuple(part.split('.')) for part in (field.strip() for field in value.split(',')) if part]
+
+
+def project(data, paths):
+    """Copy only the given key paths out of a nested dict; unknown paths are skipped"""
+    result = {}
+    # Shorter paths first, so a whole subtree is never narrowed by a longer path afterwards
+    for path in sorted(paths, key=len):
+        source, target = data, result
+        for depth, key in enumerate(path):
+            if not isinstance(source, dict) or key not in source:
+                break
+            if depth == len(path) - 1:
+                target[key] = source[key]
+                break
+            if key in target and target[key] is source[key]:
+                break
+            source = source[key]
+            target = target.setdefault(key, {})
+    return result
+
+
+def compact_session(session):
+    """Drop echoed inputs, plus the compatibility blocks when ChatGPT analysis is present"""
+    compact = {key: value for key, value in session.items() if key not in ECHOED_INPUTS}
+    diagnosis = session.get('ai_diagnosis')
+    if isinstance(diagnosis, dict) and diagnosis.get('chatgpt_analysis'):
+        compact['ai_diagnosis'] = {key: value for key, value in diagnosis.items() if key not in COMPATIBILITY_BLOCKS}
+    return compact
+
+
+def shape_session(session, compact=False, fields=None):
+    if compact:
+        session = compact_session(session)
+    if fields:
+        session = project(session, fields)
+    return session
+
+
+def negotiate(accept):
+    """Pick the response media type from an Accept header; JSON unless MessagePack is preferred"""
+    if not MSGPACK_AVAILABLE or not accept:
+        return 'application/json'
+    best_msgpack = best_json = 0.0
+    for part in accept.split(','):
+        media_type, _, params = part.strip().partition(';')
+        media_type = media_type.strip().lower()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type in MSGPACK_MEDIA_TYPES:
+            best_msgpack = max(best_msgpack, quality)
+        elif media_type in ('application/json', 'application/*', '*/*'):
+            best_json = max(best_json, quality)
+    return 'application/msgpack' if best_msgpack > 0 and best_msgpack >= best_json else 'application/json'
+
+
+def encode(payload, media_type):
+    """Return (body, media_type); values the fast encoders reject (integers past 64 bits) fall back to json"""
+    if media_type == 'application/msgpack':
+        try:
+            return msgpack.packb(payload, use_bin_type=True), media_type
+        except OverflowError:
+            media_type = 'application/json'
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE), media_type
+        except orjson.JSONEncodeError:
+            pass
+    return (json.dumps(payload, separators=(',', ':')) + '\n').encode('utf-8'), media_type
+
+
+def render_session_payload(payload, args, accept):
+    """Shape the session(s) in a response envelope per fields=/compact= and encode per Accept.
+
+    Returns (body, media_type). The envelope keys (success, next_cursor, ...)
+    are always kept; projection applies to each session.
+    """
+    compact = str(args.get('compact', '')).lower() in ('1', 'true')
+    fields = parse_fields(args.get('fields'))
+    if compact or fields:
+        payload = dict(payload)
+        if 'session' in payload:
+            payload['session'] = shape_session(payload['session'], compact, fields)
+        if 'sessions' in payload:
+            payload['sessions'] = [shape_session(session, compact, fields) for session in payload['sessions']]
+    return encode(payload, negotiate(accept))
@@ -0,0 +1,207 @@
+import json
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+class RuleSection:
+    """Ordered conditional rules compiled to symptom bitmasks with an inverted index"""
+
+    def __init__(self, rules, compile_condition):
+        self.rules = []
+        self.always = []
+        self.index = {}
+        for position, rule in enumerate(rules):
+            any_mask, all_mask = compile_condition(rule.get('when', {}))
+            self.rules.append((any_mask, all_mask, rule))
+            if all_mask:
+                # Every required symptom must be present, so one of them is enough to find the rule
+                self.index.setdefault(_lowest_bit(all_mask), []).append(position)
+            elif any_mask:
+                for bit in _bits(any_mask):
+                    self.index.setdefault(bit, []).append(position)
+            else:
+                self.always.append(position)
+
+    def matching(self, mask, bits):
+        """Positions of every rule satisfied by the symptom mask, in rule order"""
+        candidates = set(self.always)
+        for bit in bits:
+            candidates.update(self.index.get(bit, ()))
+        matched = []
+        for position in candidates:
+            any_mask, all_mask, _ = self.rules[position]
+            if (not any_mask or mask & any_mask) and mask & all_mask == all_mask:
+                matched.append(position)
+        matched.sort()
+        return matched
+
+    def first(self, mask, bits):
+        matched = self.matching(mask, bits)
+        return self.rules[matched[0]][2] if matched else None
+
+    def items(self, mask, bits):
+        return [dict(item) for position in self.matching(mask, bits) for item in self.rules[position][2]['items']]
+
+
+def _bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low
+        mask ^= low
+
+
+def _lowest_bit(mask):
+    return mask & -mask
+
+
+class RuleEngine:
+    """Data-driven diagnosis rules loaded from a rules file.
+
+    Symptoms compile to single-bit masks and every rule condition to an
+    (any, all) pair of masks, so matching a request costs roughly the number
+    of submitted symptoms rather than the size of the rulebase.
+    """
+
+    def __init__(self, rules, equipment_types, symptoms):
+        self.version = rules.get('version')
+        self.summary_template = rules['summary_template']
+        self.equipment_names = {eq['id']: eq['name'] for eq in equipment_types}
+        self.symptom_names = {s['id']: s['name'] for s in symptoms}
+
+        self.symptom_bits = {}
+        for s in symptoms:
+            self._bit_for(s['id'])
+        self.group_masks = {}
+        for group, members in rules.get('symptom_groups', {}).items():
+            mask = 0
+            for symptom_id in members:
+                mask |= self._bit_for(symptom_id)
+            self.group_masks[group] = mask
+
+        self.primary_issues = RuleSection(rules['primary_issues'], self._compile_condition)
+        self.default_issue = rules['default_issue']
+        actions = rules['recommended_actions']
+        self.recommended_actions = RuleSection(actions['rules'], self._compile_condition)
+        self.default_actions = actions['default']
+        self.action_limit = actions.get('limit')
+        self.troubleshooting_steps = RuleSection(rules['troubleshooting_steps'], self._compile_condition)
+        self.safety_warnings = RuleSection(rules['safety_warnings'], self._compile_condition)
+        self._primary_matrices = None
+
+    @classmethod
+    def load(cls, path, equipment_types, symptoms):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), equipment_types, symptoms)
+
+    def _bit_for(self, symptom_id):
+        if symptom_id not in self.symptom_bits:
+            self.symptom_bits[symptom_id] = 1 << len(self.symptom_bits)
+        return self.symptom_bits[symptom_id]
+
+    def _compile_condition(self, when):
+        any_mask = 0
+        if when.get('any_group'):
+            if when['any_group'] not in self.group_masks:
+                raise ValueError(f"Unknown symptom group in rules: {when['any_group']}")
+            any_mask |= self.group_masks[when['any_group']]
+        for symptom_id in when.get('any', []):
+            any_mask |= self._bit_for(symptom_id)
+        all_mask = 0
+        for symptom_id in when.get('all', []):
+            all_mask |= self._bit_for(symptom_id)
+        return any_mask, all_mask
+
+    def display_names(self, equipment_type, symptoms):
+        equipment_name = self.equipment_names.get(equipment_type, equipment_type)
+        symptom_names = [self.symptom_names.get(sym_id, sym_id) for sym_id in symptoms]
+        return equipment_name, symptom_names
+
+    def symptom_mask(self, symptoms):
+        """Bitmask of the known submitted symptoms plus their individual bits"""
+        mask = 0
+        for sym_id in symptoms:
+            mask |= self.symptom_bits.get(sym_id, 0)
+        return mask, list(_bits(mask))
+
+    def is_safety_critical(self, symptoms):
+        """True when the symptoms trigger a symptom-specific safety warning, not just the standing ones"""
+        mask, bits = self.symptom_mask(symptoms)
+        return any(position not in self.safety_warnings.always
+                   for position in self.safety_warnings.matching(mask, bits))
+
+    def diagnose(self, equipment_type, symptoms):
+        equipment_name, symptom_names = self.display_names(equipment_type, symptoms)
+        mask, bits = self.symptom_mask(symptoms)
+
+        issue = self.primary_issues.first(mask, bits) or self.default_issue
+        recommended_actions = self.recommended_actions.items(mask, bits) or [dict(a) for a in self.default_actions]
+        if self.action_limit:
+            recommended_actions = recommended_actions[:self.action_limit]
+
+        return {
+            "primary_issue": issue['primary_issue'],
+            "summary": self.summary_template.format(
+                equipment_name=equipment_name,
+                primary_issue_lower=issue['primary_issue'].lower(),
+                symptom_count=len(symptom_names)
+            ),
+            "confidence_score": issue['confidence'],
+            "likely_causes": [dict(c) for c in issue['likely_causes']],
+            "recommended_actions": recommended_actions,
+            "troubleshooting_steps": self.troubleshooting_steps.items(mask, bits),
+            "safety_warnings": self.safety_warnings.items(mask, bits)
+        }
+
+    def _build_primary_matrices(self):
+        # Symptom-by-rule weight matrices: one column per primary issue rule
+        # plus a final always-matching column for the default issue
+        symptom_count = len(self.symptom_bits)
+        rule_count = len(self.primary_issues.rules) + 1
+        any_weights = np.zeros((symptom_count, rule_count), dtype=np.float32)
+        all_weights = np.zeros((symptom_count, rule_count), dtype=np.float32)
+        for position, (any_mask, all_mask, _) in enumerate(self.primary_issues.rules):
+            for bit in _bits(any_mask):
+                any_weights[bit.bit_length() - 1, position] = 1.0
+            for bit in _bits(all_mask):
+                all_weights[bit.bit_length() - 1, position] = 1.0
+        any_required = any_weights.sum(axis=0) > 0
+        all_required = all_weights.sum(axis=0)
+        issues = [rule for _, _, rule in self.primary_issues.rules] + [self.default_issue]
+        return any_weights, all_weights, any_required, all_required, issues
+
+    def score_batch(self, symptom_lists):
+        """Primary issue rule for each symptom list, scored in one matrix pass"""
+        if not NUMPY_AVAILABLE:
+            return [self.primary_issues.first(*self.symptom_mask(symptoms)) or self.default_issue
+                    for symptoms in symptom_lists]
+        if self._primary_matrices is None:
+            self._primary_matrices = self._build_primary_matrices()
+        any_weights, all_weights, any_required, all_required, issues = self._primary_matrices
+
+        indicators = np.zeros((len(symptom_lists), len(self.symptom_bits)), dtype=np.float32)
+        for row, symptoms in enumerate(symptom_lists):
+            for sym_id in symptoms:
+                bit = self.symptom_bits.get(sym_id)
+                if bit:
+                    indicators[row, bit.bit_length() - 1] = 1.0
+
+        any_hits = indicators @ any_weights
+        all_hits = indicators @ all_weights
+        matched = ((any_hits > 0) | ~any_required) & (all_hits == all_required)
+        # argmax returns the first matching rule, which the default column guarantees exists
+        return [issues[position] for position in matched.argmax(axis=1)]
+
+    def batch_results(self, symptom_lists):
+        return [
+            {
+                "primary_issue": issue['primary_issue'],
+                "confidence_score": issue['confidence'],
+                "likely_causes": [dict(c) for c in issue['likely_causes']]
+            }
+            for issue in self.score_batch(symptom_lists)
+        ]
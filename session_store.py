@@ -0,0 +1,253 @@
+import atexit
+import base64
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+class SessionStore(ABC):
+    """Interface for persisting diagnostic sessions and querying their history"""
+
+    @abstractmethod
+    def save(self, session):
+        pass
+
+    @abstractmethod
+    def get(self, session_id):
+        pass
+
+    @abstractmethod
+    def query(self, equipment_type=None, location=None, symptom=None, session_type=None,
+              created_after=None, created_before=None, cursor=None, limit=50):
+        """Return (sessions, next_cursor), newest first"""
+
+    def flush(self, timeout=None):
+        return True
+
+    def stats(self):
+        return {}
+
+
+def encode_cursor(created_at, session_id):
+    return base64.urlsafe_b64encode(f"{created_at}|{session_id}".encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, session_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+    except (ValueError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    return created_at, session_id
+
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS sessions ('
+    'id TEXT PRIMARY KEY, created_at TEXT NOT NULL, session_type TEXT, equipment_type TEXT, '
+    'location TEXT, status TEXT, confidence_score INTEGER, data TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions (created_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_equipment ON sessions (equipment_type, created_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_location ON sessions (location, created_at, id)',
+    # One row per (symptom, session) so symptom filters are an index range scan
+    'CREATE TABLE IF NOT EXISTS session_symptoms ('
+    'symptom TEXT NOT NULL, created_at TEXT NOT NULL, session_id TEXT NOT NULL, '
+    'PRIMARY KEY (symptom, created_at, session_id)) WITHOUT ROWID'
+]
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite store in WAL mode with group-committed writes.
+
+    save() only enqueues; a writer thread commits whatever has queued up in a
+    single transaction, so the request path never waits on disk.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=0.05, max_queue=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self.written = 0
+        self.commits = 0
+        self.dropped = 0
+        self.failed = 0
+
+        conn = self._connect()
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+        atexit.register(self.flush, 5)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _reader(self):
+        # Each thread reads on its own connection; WAL lets them run alongside the writer
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _writer_queue(self):
+        # Threads do not survive fork, so a forked worker starts its own writer
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_queue)
+                self._pid = os.getpid()
+                threading.Thread(target=self._write_loop, args=(self._queue,), name='session-writer', daemon=True).start()
+            return self._queue
+
+    def save(self, session):
+        try:
+            self._writer_queue().put_nowait(json.loads(json.dumps(session, default=str)))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"Session store queue full, dropping session {session.get('id')}")
+
+    def _write_loop(self, pending):
+        conn = self._connect()
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write_sessions(conn, [item for item in batch if item is not None])
+            except Exception as e:
+                # The writer must outlive any one batch, or every later save() is silently lost
+                print(f"Session store writer error: {e}")
+            finally:
+                for _ in batch:
+                    pending.task_done()
+
+    def _write_sessions(self, conn, sessions):
+        try:
+            self._write_batch(conn, sessions)
+            return
+        except Exception as e:
+            if len(sessions) == 1:
+                self._write_failed(sessions, e)
+                return
+            print(f"Session store batch write failed, retrying sessions one at a time: {e}")
+        # One malformed session should not take the rest of its batch down with it
+        for session in sessions:
+            try:
+                self._write_batch(conn, [session])
+            except Exception as e:
+                self._write_failed([session], e)
+
+    def _write_failed(self, sessions, error):
+        with self._lock:
+            self.failed += len(sessions)
+        print(f"Session store write failed for {[s.get('id') for s in sessions]}: {error}")
+
+    def _write_batch(self, conn, sessions):
+        if not sessions:
+            return
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO sessions '
+                '(id, created_at, session_type, equipment_type, location, status, confidence_score, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (s['id'], s['created_at'], s.get('session_type'), s.get('equipment_type'), s.get('location'),
+                     s.get('status'), s.get('confidence_score'), json.dumps(s))
+                    for s in sessions
+                ]
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO session_symptoms (symptom, created_at, session_id) VALUES (?, ?, ?)',
+                [(symptom, s['created_at'], s['id']) for s in sessions for symptom in set(s.get('symptoms') or [])]
+            )
+        with self._lock:
+            self.written += len(sessions)
+            self.commits += 1
+
+    def flush(self, timeout=None):
+        """Wait until everything saved so far has been written.
+
+        Returns False on timeout or when a write failed while waiting.
+        """
+        with self._lock:
+            pending = self._queue if self._pid == os.getpid() else None
+            failed = self.failed
+        if pending is None:
+            return True
+        deadline = time.monotonic() + timeout if timeout else None
+        while pending.unfinished_tasks:
+            if deadline and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        with self._lock:
+            return self.failed == failed
+
+    def get(self, session_id):
+        row = self._reader().execute('SELECT data FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, equipment_type=None, location=None, symptom=None, session_type=None,
+              created_after=None, created_before=None, cursor=None, limit=50):
+        # Keyset pagination on (created_at, id) keeps deep pages as cheap as the first
+        if symptom:
+            sql = 'SELECT s.data, s.created_at, s.id FROM session_symptoms ss JOIN sessions s ON s.id = ss.session_id'
+            where, params = ['ss.symptom = ?'], [symptom]
+            key = ('ss.created_at', 'ss.session_id')
+        else:
+            sql = 'SELECT s.data, s.created_at, s.id FROM sessions s'
+            where, params = [], []
+            key = ('s.created_at', 's.id')
+
+        for column, value in (('s.equipment_type', equipment_type), ('s.location', location),
+                              ('s.session_type', session_type)):
+            if value:
+                where.append(f'{column} = ?')
+                params.append(value)
+        if created_after:
+            where.append(f'{key[0]} >= ?')
+            params.append(created_after)
+        if created_before:
+            where.append(f'{key[0]} < ?')
+            params.append(created_before)
+        if cursor:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+            where.append(f'({key[0]}, {key[1]}) < (?, ?)')
+            params.extend([cursor_created_at, cursor_id])
+
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += f' ORDER BY {key[0]} DESC, {key[1]} DESC LIMIT ?'
+        params.append(limit + 1)
+
+        rows = self._reader().execute(sql, params).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][2]) if len(rows) > limit else None
+        return [json.loads(row[0]) for row in rows[:limit]], next_cursor
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'queued': self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0,
+                'written': self.written,
+                'commits': self.commits,
+                'dropped': self.dropped,
+                'failed': self.failed
+            }
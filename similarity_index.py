@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+from collections import Counter
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Words that carry no diagnostic meaning in a field description
+STOP_WORDS = frozenset("""
+a an and are as at be been but by for from has have i in is it its of on or our so that the their there
+this to was were with unit system units systems customer says said reports reported seems getting
+blow blows blowing
+""".split())
+
+# Common variants techs use for the same observation, mapped to their stemmed form
+SYNONYMS = {
+    'iced': 'ice', 'icing': 'ice', 'icy': 'ice', 'frozen': 'ice', 'freezing': 'ice', 'frost': 'ice',
+    'frosted': 'ice', 'hot': 'warm', 'ac': 'cool', 'a/c': 'cool', 'tripping': 'trip', 'tripped': 'trip',
+    'noisy': 'noise', 'loud': 'noise'
+}
+
+# "no burning smell" and "burning smell" must not look alike, so a negator is
+# folded into the word it governs ("not_burn") instead of being dropped
+NEGATORS = frozenset("""
+no not never without none cannot cant dont doesnt didnt isnt wasnt arent wont
+""".split())
+NEGATION_PREFIX = 'not_'
+
+# Bumped whenever description_tokens changes, so rows tokenized the old way are purged
+TOKENIZER_VERSION = 2
+
+# Carter-Wegman hashing modulo a prime just above 2**32
+_PRIME = 4294967311
+_MASK32 = 0xFFFFFFFF
+
+
+def _stem(word):
+    if word in SYNONYMS:
+        return SYNONYMS[word]
+    for suffix in ('ing', 'ed', 's'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith('ss'):
+            return word[:-len(suffix)]
+    return word
+
+
+def description_tokens(text):
+    """Normalized word set for a free-text description"""
+    words = re.findall(r"[a-z0-9/]+", (text or '').lower().replace("'", ''))
+    tokens = set()
+    negated = False
+    for word in words:
+        if word in NEGATORS:
+            negated = True
+        elif word not in STOP_WORDS and len(word) > 1:
+            tokens.add(NEGATION_PREFIX + _stem(word) if negated else _stem(word))
+            negated = False
+    return frozenset(tokens)
+
+
+def negations(tokens):
+    return frozenset(token for token in tokens if token.startswith(NEGATION_PREFIX))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+class MinHasher:
+    def __init__(self, num_perm, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.a = [rng.randrange(1, _MASK32) for _ in range(num_perm)]
+        self.b = [rng.randrange(0, _MASK32) for _ in range(num_perm)]
+        if NUMPY_AVAILABLE:
+            self._a = np.array(self.a, dtype=np.uint64)[:, None]
+            self._b = np.array(self.b, dtype=np.uint64)[:, None]
+
+    def signature(self, tokens):
+        hashes = [_token_hash(token) for token in tokens]
+        if NUMPY_AVAILABLE:
+            # a * h + b stays below 2**64 for 32-bit inputs, so uint64 never wraps
+            values = (self._a * np.array(hashes, dtype=np.uint64)[None, :] + self._b) % np.uint64(_PRIME)
+            return [int(v) for v in values.min(axis=1)]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in zip(self.a, self.b)]
+
+
+class DescriptionIndex:
+    """Near-duplicate lookup over past quick-submit descriptions and their analyses.
+
+    Descriptions are reduced to normalized word sets, MinHashed, and bucketed
+    by LSH bands in SQLite, so a query is one indexed probe per band plus an
+    exact Jaccard check of the few candidates that share a bucket. Memory use
+    stays flat and the index is shared by every worker process.
+    """
+
+    def __init__(self, path, threshold=0.75, bands=10, rows=3, max_candidates=32, max_bucket_probe=64,
+                 ttl=30 * 86400, prompt_version='', purge_interval=3600):
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.max_candidates = max_candidates
+        self.max_bucket_probe = max_bucket_probe
+        self.ttl = ttl
+        self.prompt_version = prompt_version
+        self.purge_interval = purge_interval
+        # Stored with each row, so a new prompt template or tokenizer retires old analyses
+        self._row_version = f'{prompt_version}#tokens-v{TOKENIZER_VERSION}'
+        self.hasher = MinHasher(bands * rows)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS descriptions ('
+            'id INTEGER PRIMARY KEY, tokens TEXT NOT NULL UNIQUE, prompt_version TEXT NOT NULL, '
+            'analysis TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS description_buckets ('
+            'bucket INTEGER NOT NULL, description_id INTEGER NOT NULL, '
+            'PRIMARY KEY (bucket, description_id)) WITHOUT ROWID'
+        )
+        with conn:
+            self._purge(conn)
+
+    def _purge(self, conn):
+        # Analyses written under an older prompt template must not be reused
+        stale = 'SELECT id FROM descriptions WHERE prompt_version != ? OR expires_at < ?'
+        params = (self._row_version, time.time())
+        conn.execute(f'DELETE FROM description_buckets WHERE description_id IN ({stale})', params)
+        conn.execute(f'DELETE FROM descriptions WHERE id IN ({stale})', params)
+        self._purged_at = time.monotonic()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _conn(self):
+        # One connection per thread and process; WAL lets readers run alongside the writer
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _buckets(self, tokens):
+        signature = self.hasher.signature(tokens)
+        buckets = []
+        for band in range(self.bands):
+            chunk = struct.pack(f'<I{self.rows}Q', band, *signature[band * self.rows:(band + 1) * self.rows])
+            buckets.append(int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'little', signed=True))
+        return buckets
+
+    def lookup(self, description):
+        """Return (analysis, similarity) for the closest past description above the threshold, or None"""
+        tokens = description_tokens(description)
+        if not tokens:
+            return None
+        buckets = self._buckets(tokens)
+        # Each band probe is capped, so crowded buckets (very common phrasings) cannot blow up a query
+        probe = 'SELECT * FROM (SELECT description_id FROM description_buckets WHERE bucket = ? ORDER BY description_id DESC LIMIT ?)'
+        try:
+            conn = self._conn()
+            shared = Counter(row[0] for row in conn.execute(
+                ' UNION ALL '.join([probe] * len(buckets)),
+                [value for bucket in buckets for value in (bucket, self.max_bucket_probe)]
+            ))
+            # Candidates sharing the most bands are the likeliest near duplicates
+            candidates = [description_id for description_id, _ in shared.most_common(self.max_candidates)]
+            rows = conn.execute(
+                f'SELECT id, tokens FROM descriptions WHERE id IN ({",".join("?" * len(candidates))}) AND expires_at > ?',
+                candidates + [time.time()]
+            ).fetchall() if candidates else []
+            best_id, best_score = None, 0.0
+            negated = negations(tokens)
+            for row_id, row_tokens in rows:
+                row_tokens = frozenset(row_tokens.split(' '))
+                # Descriptions that deny different things are never the same problem, however many words they share
+                if negations(row_tokens) != negated:
+                    continue
+                score = jaccard(tokens, row_tokens)
+                if score > best_score:
+                    best_id, best_score = row_id, score
+            if best_id is None or best_score < self.threshold:
+                with self._lock:
+                    self.misses += 1
+                return None
+            analysis = conn.execute('SELECT analysis FROM descriptions WHERE id = ?', (best_id,)).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Description index read failed: {e}")
+            return None
+        with self._lock:
+            self.hits += 1
+        return json.loads(analysis), best_score
+
+    def add(self, description, analysis):
+        self.add_many([(description, analysis)])
+
+    def add_many(self, items):
+        rows = []
+        for description, analysis in items:
+            tokens = description_tokens(description)
+            if tokens:
+                rows.append((' '.join(sorted(tokens)), json.dumps(analysis), self._buckets(tokens)))
+        if not rows:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._write_lock:
+            conn = self._conn()
+            try:
+                with conn:
+                    # Long-running workers purge periodically, not only when they connect
+                    if time.monotonic() - self._purged_at >= self.purge_interval:
+                        self._purge(conn)
+                    for token_text, analysis_json, buckets in rows:
+                        # A live row with the same word set keeps its first analysis; an expired
+                        # or outdated one is replaced, so the description can be indexed again
+                        cursor = conn.execute(
+                            'INSERT INTO descriptions (tokens, prompt_version, analysis, expires_at) VALUES (?, ?, ?, ?) '
+                            'ON CONFLICT(tokens) DO UPDATE SET analysis = excluded.analysis, '
+                            'prompt_version = excluded.prompt_version, expires_at = excluded.expires_at '
+                            'WHERE descriptions.expires_at < ? OR descriptions.prompt_version != excluded.prompt_version',
+                            (token_text, self._row_version, analysis_json, expires_at, now)
+                        )
+                        if not cursor.rowcount:
+                            continue
+                        description_id = conn.execute(
+                            'SELECT id FROM descriptions WHERE tokens = ?', (token_text,)).fetchone()[0]
+                        conn.execute('DELETE FROM description_buckets WHERE description_id = ?', (description_id,))
+                        conn.executemany(
+                            'INSERT OR IGNORE INTO description_buckets (bucket, description_id) VALUES (?, ?)',
+                            [(bucket, description_id) for bucket in buckets]
+                        )
+                        self.added += 1
+            except sqlite3.Error as e:
+                print(f"Description index write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'threshold': self.threshold,
+                'bands': self.bands,
+                'rows_per_band': self.rows,
+                'added': self.added,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,115 @@
+import asyncio
+import copy
+import threading
+from collections import OrderedDict
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and receive a copy of its result (or its exception).
+    Once a result is shared the leader gets a copy as well, so no caller can
+    change it under another.
+    """
+
+    def __init__(self, max_tracked_keys=1000):
+        self.max_tracked_keys = max_tracked_keys
+        self._calls = {}
+        self._coalesced_by_key = OrderedDict()
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                # No one can join once the key is gone, so this count is final
+                waiters = call.waiters
+                if waiters:
+                    self._record(key, waiters)
+            call.done.set()
+        return copy.deepcopy(call.result) if waiters else call.result
+
+    def _record(self, key, waiters):
+        self._coalesced_by_key[key] = self._coalesced_by_key.get(key, 0) + waiters
+        self._coalesced_by_key.move_to_end(key)
+        while len(self._coalesced_by_key) > self.max_tracked_keys:
+            self._coalesced_by_key.popitem(last=False)
+
+    def stats(self, top=10):
+        with self._lock:
+            busiest = sorted(self._coalesced_by_key.items(), key=lambda item: item[1], reverse=True)[:top]
+            return {
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'top_coalesced_keys': [{'key': key[:12], 'coalesced': count} for key, count in busiest]
+            }
+
+
+class _AsyncCall:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines; followers await the leader's task instead of blocking a thread"""
+
+    async def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn()))
+                call.task.add_done_callback(lambda task: self._finish(key, call))
+                self.executions += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        # Shielded so one caller disconnecting does not cancel the call for everyone sharing it
+        result = await asyncio.shield(call.task)
+        # The task result stays untouched; followers may still join until _finish runs, so the leader copies too
+        return copy.deepcopy(result)
+
+    def _finish(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            if call.waiters:
+                self._record(key, call.waiters)
+        if not call.task.cancelled():
+            # Mark the exception retrieved even when every caller has gone away
+            call.task.exception()
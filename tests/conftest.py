@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# main_hybrid reads these once in init_services(), so they are pinned before any test imports it
+SCRATCH = tempfile.mkdtemp(prefix='hvac-tests-')
+os.environ.update({
+    'OPENAI_API_KEY': '',
+    'SESSION_STORE_PATH': os.path.join(SCRATCH, 'sessions.db'),
+    'QUICK_SUBMIT_INDEX_PATH': os.path.join(SCRATCH, 'quick_submit_index.db'),
+    'DIAGNOSIS_CACHE_PATH': os.path.join(SCRATCH, 'diagnosis_cache.db'),
+    'ERROR_CODE_DB_PATH': os.path.join(SCRATCH, 'error_codes.db'),
+    'IMAGE_STORE_DIR': os.path.join(SCRATCH, 'uploads'),
+})
+
+
+@pytest.fixture(scope='session')
+def hvac():
+    import main_hybrid
+    main_hybrid.init_services()
+    return main_hybrid
+
+
+@pytest.fixture
+def client(hvac):
+    return hvac.get_app().test_client()
+
+
+@pytest.fixture
+def asgi(hvac):
+    """Call the ASGI application once; returns (status, headers, body text)"""
+    asgi_app = pytest.importorskip('asgi_app')
+
+    async def call(method, path, body=b'', headers=(), client=('127.0.0.1', 5000)):
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'client': client,
+                 'headers': [(b'content-type', b'application/json')] + list(headers)}
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi_app.application(scope, receive, send)
+        return sent[0]['status'], dict(sent[0]['headers']), b''.join(m.get('body', b'') for m in sent[1:]).decode('utf-8')
+
+    return call
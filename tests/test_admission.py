@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import admission
+from admission import BACKGROUND, CRITICAL, INTERACTIVE, AdmissionController, AdmissionRejected
+
+
+def queue_waiter(controller, client_id, priority, order, errors):
+    def run():
+        try:
+            with controller.slot(client_id, priority):
+                order.append((client_id, priority))
+        except AdmissionRejected as e:
+            errors.append((client_id, e.reason))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_queued(controller, count):
+    deadline = time.monotonic() + 5
+    while len(controller._queue) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(controller._queue) == count
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    controller = AdmissionController(max_concurrent=1, max_wait=5)
+    order, errors = [], []
+    controller.acquire(None, INTERACTIVE)
+    threads = []
+    for client_id, priority in [('bulk-1', BACKGROUND), ('tech-1', INTERACTIVE), ('bulk-2', BACKGROUND),
+                                ('fire', CRITICAL), ('tech-2', INTERACTIVE)]:
+        threads.append(queue_waiter(controller, client_id, priority, order, errors))
+        wait_queued(controller, len(threads))
+    controller.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert [client_id for client_id, _ in order] == ['fire', 'tech-1', 'tech-2', 'bulk-1', 'bulk-2']
+    assert not errors
+    assert controller.stats()['active'] == 0
+
+
+def test_full_queue_preempts_lower_priority_or_refuses():
+    controller = AdmissionController(max_concurrent=1, max_queue=2, max_wait=5)
+    order, errors = [], []
+    controller.acquire(None)
+    threads = [queue_waiter(controller, 'bulk', BACKGROUND, order, errors)]
+    wait_queued(controller, 1)
+    threads.append(queue_waiter(controller, 'tech-1', INTERACTIVE, order, errors))
+    wait_queued(controller, 2)
+
+    # A critical call displaces the newest lowest-priority waiter
+    threads.append(queue_waiter(controller, 'fire', CRITICAL, order, errors))
+    for thread in threads[:1]:
+        thread.join(5)
+    assert errors == [('bulk', 'preempted')]
+
+    # An interactive call cannot displace equal or higher priorities, so it is refused itself
+    with pytest.raises(AdmissionRejected) as refused:
+        controller.acquire('tech-2', INTERACTIVE)
+    assert refused.value.reason == 'queue_full'
+
+    controller.release()
+    for thread in threads:
+        thread.join(5)
+    assert [client_id for client_id, _ in order] == ['fire', 'tech-1']
+    assert controller.stats()['shed'] == {'preempted': 1, 'queue_full': 1}
+
+
+def test_waiter_times_out_and_leaves_the_queue():
+    controller = AdmissionController(max_concurrent=1, max_wait=0.05)
+    controller.acquire(None)
+    with pytest.raises(AdmissionRejected) as timed_out:
+        controller.acquire('tech', INTERACTIVE)
+    assert timed_out.value.reason == 'timeout'
+    assert controller._queue == []
+    controller.release()
+    assert controller.active == 0
+
+
+def test_per_client_rate_limit_is_off_by_default():
+    controller = AdmissionController()
+    for _ in range(500):
+        with controller.slot('10.0.0.7', INTERACTIVE):
+            pass
+    assert controller.stats()['shed'] == {}
+    assert controller.stats()['tracked_clients'] == 0
+
+
+def test_enabled_rate_limit_sheds_past_the_burst(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: clock[0])
+    controller = AdmissionController(client_rate=2, client_burst=30)
+
+    outcomes = []
+    for _ in range(80):
+        try:
+            with controller.slot('10.0.0.7', INTERACTIVE):
+                outcomes.append('ok')
+        except AdmissionRejected as e:
+            outcomes.append(e.reason)
+    # Back to back, one client gets exactly its burst; other clients and critical calls are unaffected
+    assert outcomes.count('ok') == 30 and outcomes.count('rate_limited') == 50
+    with controller.slot('10.0.0.8', INTERACTIVE), controller.slot('10.0.0.7', CRITICAL):
+        pass
+
+    # Tokens refill at client_rate per second
+    clock[0] += 1.0
+    for _ in range(2):
+        with controller.slot('10.0.0.7', INTERACTIVE):
+            pass
+    with pytest.raises(AdmissionRejected):
+        controller.acquire('10.0.0.7', INTERACTIVE)
+
+
+def test_async_waiters_share_slots_and_cancellation_hands_back_the_slot():
+    controller = AdmissionController(max_concurrent=1, max_wait=5)
+
+    async def scenario():
+        order = []
+
+        async def call(name, priority, hold=0.0):
+            async with controller.async_slot(name, priority):
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        holder = asyncio.ensure_future(call('holder', INTERACTIVE, hold=0.05))
+        await asyncio.sleep(0.01)
+        leaver = asyncio.ensure_future(call('leaver', CRITICAL))
+        bulk = asyncio.ensure_future(call('bulk', BACKGROUND))
+        tech = asyncio.ensure_future(call('tech', INTERACTIVE))
+        await asyncio.sleep(0.01)
+        leaver.cancel()
+        await asyncio.gather(holder, bulk, tech)
+        with pytest.raises(asyncio.CancelledError):
+            await leaver
+        return order
+
+    assert asyncio.run(scenario()) == ['holder', 'tech', 'bulk']
+    assert controller.active == 0 and controller._queue == []
+
+
+def test_client_identity_ignores_request_headers_by_default(hvac):
+    args = hvac.admission_args({'x-client-id': 'rotated-1', 'x-priority': 'background'}, '203.0.113.9')
+    assert args == {'client_id': '203.0.113.9', 'background': True}
+    assert hvac.llm_admission.client_rate == 0
+
+
+def test_forwarded_address_is_used_only_behind_configured_proxies(hvac, monkeypatch):
+    assert hvac.forwarded_client_addr('10.0.0.1', '198.51.100.4, 10.0.0.2') == '10.0.0.1'
+    monkeypatch.setattr(hvac, 'TRUSTED_PROXY_COUNT', 1)
+    # Only the hop our proxy appended is trusted; anything the caller wrote before it is ignored
+    assert hvac.forwarded_client_addr('10.0.0.1', 'spoofed, 198.51.100.4') == '198.51.100.4'
+    assert hvac.forwarded_client_addr('10.0.0.1', None) == '10.0.0.1'
+    monkeypatch.setattr(hvac, 'TRUSTED_PROXY_COUNT', 2)
+    assert hvac.forwarded_client_addr('10.0.0.1', 'only-one-hop') == '10.0.0.1'
+
+
+def test_flask_routes_resolve_clients_through_proxy_fix(hvac, monkeypatch):
+    from flask import request
+    monkeypatch.setattr(hvac, 'TRUSTED_PROXY_COUNT', 1)
+    app = hvac.create_app()
+
+    @app.route('/_client')
+    def client_address():
+        return hvac.admission_args(request.headers, request.remote_addr)['client_id']
+
+    client = app.test_client()
+    response = client.get('/_client', headers={'X-Forwarded-For': 'spoofed, 198.51.100.4', 'X-Client-ID': 'x'},
+                          environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    assert response.get_data(as_text=True) == '198.51.100.4'
@@ -0,0 +1,48 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+CACHED = {'summary': 'cached analysis', 'chatgpt_analysis': 'cached analysis', 'confidence_score': 80,
+          'issues': [], 'safety_warnings': []}
+
+
+@pytest.fixture
+def blocking_calls(hvac, monkeypatch):
+    """Record whether each SQLite-backed helper ran on the event loop's thread"""
+    calls = []
+
+    def spy(name, fn):
+        def wrapper(*args, **kwargs):
+            calls.append((name, threading.current_thread() is threading.main_thread()))
+            return fn(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(hvac, 'llm_enhancement_enabled', lambda: True)
+    monkeypatch.setattr(hvac, 'get_rule_based_diagnosis', spy('rule_engine', hvac.get_rule_based_diagnosis))
+    monkeypatch.setattr(hvac, 'similar_quick_submit_diagnosis', spy('similar', lambda args: None))
+    monkeypatch.setattr(hvac, 'prepare_follow_up', spy('follow_up', hvac.prepare_follow_up))
+    monkeypatch.setattr(hvac.diagnosis_cache, 'get', spy('cache_get', lambda key: dict(CACHED)))
+    return calls
+
+
+def test_native_routes_keep_sqlite_off_the_event_loop(asgi, blocking_calls):
+    guided = json.dumps({'equipment_type': 'split_system', 'symptoms': ['not_cooling']}).encode()
+    quick = json.dumps({'description': 'unit short cycles every few minutes'}).encode()
+    follow_up = json.dumps({'follow_up_question': 'What next?', 'original_analysis': 'Low charge'}).encode()
+
+    async def scenario():
+        return await asyncio.gather(
+            asgi('POST', '/api/diagnostic/guided', guided),
+            asgi('POST', '/api/diagnostic/guided/stream', guided),
+            asgi('POST', '/api/diagnostic/quick-submit', quick),
+            asgi('POST', '/api/follow-up', follow_up)
+        )
+
+    statuses = [status for status, _, _ in asyncio.run(scenario())]
+    assert statuses[:3] == [200, 200, 200]
+
+    names = {name for name, _ in blocking_calls}
+    assert names == {'rule_engine', 'similar', 'follow_up', 'cache_get'}
+    assert not [name for name, on_loop in blocking_calls if on_loop]
@@ -0,0 +1,65 @@
+import json
+
+
+def post_ndjson(client, lines):
+    body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+    response = client.post('/api/diagnostic/batch', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_lines_match_single_requests_and_keep_order(hvac, client):
+    symptom_sets = [['ice_buildup', 'not_cooling'], ['not_cooling'], ['intermittent_cooling'],
+                    ['frequent_breaker_trips', 'burning_smell'], ['display_errors'], ['unusual_noise'], []]
+    submissions = [
+        {'id': f't{n}', 'equipment_type': 'split_system', 'symptoms': symptoms}
+        for n, symptoms in enumerate(symptom_sets)
+    ]
+    results = post_ndjson(client, submissions)
+    assert [result['index'] for result in results] == list(range(len(symptom_sets)))
+    for submission, result in zip(submissions, results):
+        single = hvac.get_rule_based_diagnosis(submission['equipment_type'], submission['symptoms'])
+        assert result['id'] == submission['id']
+        assert (result['primary_issue'], result['confidence_score']) == (single['primary_issue'], single['confidence_score'])
+        assert result['likely_causes'] == single['likely_causes']
+    # Every primary rule fires once, plus the default
+    assert [result['primary_issue'] for result in results] == [
+        'Refrigerant System with Ice Formation', 'Cooling System Failure', 'Insufficient Cooling Performance',
+        'Electrical Overload Issue', 'Electrical System Malfunction', 'Mechanical Component Failure',
+        'System Diagnostic Required']
+
+
+def test_bad_lines_are_reported_in_place(client):
+    results = post_ndjson(client, [{'id': 'a', 'symptoms': ['not_cooling']}, '{not json', '[1]', '',
+                                   {'id': 'b', 'symptoms': []}])
+    assert [result['success'] for result in results] == [True, False, False, True]
+    assert results[1]['error'].startswith('Invalid JSON line')
+    assert results[2]['error'] == 'Submission must be a JSON object'
+    assert [result['index'] for result in results] == [0, 1, 2, 3]
+
+
+def test_malformed_fields_are_reported_without_ending_the_stream(client):
+    results = post_ndjson(client, [
+        {'id': 'a', 'symptoms': None},
+        {'id': 'b', 'symptoms': ['not_cooling'], 'measurements': [90, 60]},
+        {'id': 'c', 'error_codes': 'E1'},
+        {'id': 'd', 'symptoms': [{'id': 'not_cooling'}]},
+        {'id': 'e', 'symptoms': ['not_cooling'], 'measurements': {}, 'error_codes': []},
+    ])
+    assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+    assert [result['success'] for result in results] == [False, False, False, False, True]
+    assert results[0]['error'] == "'symptoms' must be a list"
+    assert results[1]['error'] == "'measurements' must be an object"
+    assert results[2]['error'] == "'error_codes' must be a list"
+    assert results[3]['error'] == "'symptoms' must contain only strings"
+    assert results[4]['primary_issue'] == 'Cooling System Failure'
+
+
+def test_json_body_and_measurements(client):
+    response = client.post('/api/diagnostic/batch', json={'submissions': [
+        {'id': 'm', 'equipment_type': 'split_system', 'symptoms': ['not_cooling'],
+         'measurements': {'refrigerant': 'R-410A', 'suction_pressure': 90, 'suction_line_temperature': 60}}
+    ]})
+    result = json.loads(response.get_data(as_text=True))
+    assert result['measurement_analysis']['refrigerant'] == 'R-410A'
+    assert result['measurement_analysis']['superheat_f'] is not None
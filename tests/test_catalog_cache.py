@@ -0,0 +1,48 @@
+import gzip
+import json
+
+from catalog_cache import CatalogCache, PrecompressedPayload, parse_accept_encoding
+
+
+def test_payload_negotiates_encodings_with_distinct_etags():
+    payload = PrecompressedPayload(b'{"success":true}\n' * 20)
+    assert payload.negotiate('gzip;q=0.5, identity') == ('gzip', payload.encodings['gzip'])
+    assert payload.negotiate('gzip;q=0') == ('identity', payload.body)
+    assert payload.negotiate(None) == ('identity', payload.body)
+    assert gzip.decompress(payload.encodings['gzip']) == payload.body
+    assert len(set(payload.etags.values())) == len(payload.encodings)
+    assert parse_accept_encoding('GZIP;q=bad, br') == {'gzip': 0.0, 'br': 1.0}
+
+
+def test_if_none_match_accepts_any_encoding_and_weak_tags():
+    payload = PrecompressedPayload(b'{}')
+    assert payload.matches(payload.etags['gzip'])
+    assert payload.matches('"other", W/' + payload.etags['identity'])
+    assert payload.matches('*')
+    assert not payload.matches('"other"') and not payload.matches(None)
+
+
+def test_cache_rebuilds_only_when_the_catalog_changes():
+    cache = CatalogCache(json.dumps)
+    assert cache.update([{'id': 'split_system'}], [])
+    version = cache.version
+    assert not cache.update([{'id': 'split_system'}], [])
+    assert cache.update([{'id': 'split_system'}, {'id': 'heat_pump'}], [])
+    assert cache.version != version and cache.builds == 2
+    assert json.loads(cache.get('catalog').body)['version'] == cache.version
+
+
+def test_catalog_endpoint_revalidates_with_304(hvac, client):
+    response = client.get('/api/equipment/types', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert json.loads(gzip.decompress(response.get_data()))['equipment_types'] == hvac.EQUIPMENT_TYPES
+
+    etag = response.headers['ETag']
+    revalidated = client.get('/api/equipment/types', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304 and revalidated.get_data() == b''
+
+    pinned = client.get(f'/api/catalog?v={hvac.catalog_cache.version}')
+    assert 'immutable' in pinned.headers['Cache-Control']
+    assert 'immutable' not in client.get('/api/catalog?v=stale').headers['Cache-Control']
@@ -0,0 +1,51 @@
+import json
+
+from conversations import ConversationStore, estimate_tokens, outline_analysis
+
+ANALYSIS = '\n'.join(
+    f"## Section {n}\nFinding {n} explains the symptom in detail. " + 'Supporting detail. ' * 40
+    for n in range(6)
+)
+
+
+def test_outline_keeps_headings_and_first_sentences():
+    outline = outline_analysis(ANALYSIS, 200)
+    assert estimate_tokens(outline) <= 200
+    assert outline.splitlines()[:2] == ['## Section 0', 'Finding 0 explains the symptom in detail.']
+    assert outline_analysis('short', 200) == 'short'
+
+
+def test_long_threads_stay_within_the_token_budget():
+    store = ConversationStore(token_budget=600, analysis_token_budget=200, recent_turns=2)
+    conversation = store.start('s1', ANALYSIS, {'equipment_type': 'split_system'})
+    for n in range(30):
+        analysis, history, saved = store.build_context(conversation)
+        assert estimate_tokens(analysis) + estimate_tokens(history) <= 600
+        store.add_turn(conversation, f'Question {n}? ' + 'why ' * 20, f'Answer {n}. ' + 'because ' * 60)
+
+    analysis, history, saved = store.build_context(conversation)
+    # The latest turns stay verbatim, older ones survive only as summaries
+    assert 'Q: Question 29?' in history and 'Q: Question 28?' in history
+    assert 'Q: Question 0?' not in history
+    assert saved > 0 and store.stats()['prompt_tokens_saved'] >= saved
+
+
+def test_least_recently_used_conversations_are_evicted():
+    store = ConversationStore(max_conversations=2)
+    store.start('a', '', {})
+    store.start('b', '', {})
+    store.get('a')
+    store.start('c', '', {})
+    assert store.get('b') is None and store.get('a') is not None
+
+
+def test_follow_up_by_session_id_uses_the_stored_session(hvac, client):
+    session = client.post('/api/diagnostic/guided', json={'equipment_type': 'split_system', 'symptoms': ['not_cooling']})
+    session_id = session.get_json()['session']['id']
+    prompt, conversation, _ = hvac.prepare_follow_up({'session_id': session_id, 'follow_up_question': 'Next step?'})
+    assert conversation.diagnostic_context['equipment_type'] == 'split_system'
+    assert 'Next step?' in prompt
+
+    missing = client.post('/api/follow-up', data=json.dumps({'session_id': 'nope', 'follow_up_question': 'x'}),
+                          content_type='application/json')
+    assert missing.status_code == 404
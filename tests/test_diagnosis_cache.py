@@ -0,0 +1,87 @@
+import threading
+
+import diagnosis_cache
+from diagnosis_cache import DiagnosisCache, make_cache_key, normalize_diagnostic_input
+
+
+def test_equivalent_inputs_share_a_key():
+    a = normalize_diagnostic_input('Split_System', ' Garage ', ['b', 'a', 'a'], {'Suction': 70.0001}, ['e1'], 'Warm  air')
+    b = normalize_diagnostic_input('split_system', 'garage', ['a', 'b'], {'suction': 70.0}, ['E1', ' '], 'warm air')
+    assert make_cache_key(a, 'm', '1') == make_cache_key(b, 'm', '1')
+    assert make_cache_key(a, 'm', '1') != make_cache_key(a, 'm', '2')
+
+
+def test_invalidate_reaches_other_workers(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    worker_a = DiagnosisCache(path=path, prompt_version='3')
+    worker_b = DiagnosisCache(path=path, prompt_version='3')
+    worker_a.set('k', {'summary': 'cached'})
+    assert worker_b.get('k') == {'summary': 'cached'}
+
+    assert worker_a.invalidate()
+    # worker_b still holds 'k' in memory; the shared generation bump must evict it
+    assert worker_b.get('k') is None
+
+
+def test_other_prompt_versions_are_not_purged_on_connect(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    old_release = DiagnosisCache(path=path, prompt_version='2')
+    old_release.set('k', {'summary': 'v2'})
+    DiagnosisCache(path=path, prompt_version='3').get('other')
+    fresh_old_worker = DiagnosisCache(path=path, prompt_version='2')
+    assert fresh_old_worker.get('k') == {'summary': 'v2'}
+
+
+def test_invalidate_reports_sqlite_failure(tmp_path):
+    cache = DiagnosisCache(path=str(tmp_path / 'cache.db'))
+    cache.get('warm-up')
+    cache._conn.execute('DROP TABLE diagnosis_cache')
+    assert cache.invalidate() is False
+
+
+def test_concurrent_get_and_set(tmp_path):
+    cache = DiagnosisCache(max_entries=50, path=str(tmp_path / 'cache.db'))
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(200):
+                key = f'k{(i + offset) % 80}'
+                cache.set(key, {'n': i})
+                cache.get(key)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert cache.stats()['entries'] <= 50
+
+
+def test_cache_endpoint_requires_admin_token(client, hvac, monkeypatch):
+    monkeypatch.setattr(hvac, 'ADMIN_TOKEN', None)
+    assert client.delete('/api/diagnostic/cache').status_code == 403
+
+    monkeypatch.setattr(hvac, 'ADMIN_TOKEN', 's3cret')
+    assert client.delete('/api/diagnostic/cache').status_code == 401
+    assert client.delete('/api/diagnostic/cache', headers={'Authorization': 'Bearer nope'}).status_code == 401
+
+    response = client.delete('/api/diagnostic/cache', headers={'Authorization': 'Bearer s3cret'},
+                             json={'prompt_version': 'attacker'})
+    assert response.status_code == 200
+    assert response.get_json()['diagnosis_cache']['prompt_version'] == hvac.diagnosis_cache.prompt_version != 'attacker'
+
+
+def test_expired_rows_are_purged_while_writing(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(diagnosis_cache.time, 'time', lambda: clock[0])
+    cache = DiagnosisCache(ttl=60, path=str(tmp_path / 'cache.db'), purge_every=4)
+    for n in range(3):
+        cache.set(f'old{n}', {'summary': 'old'})
+    clock[0] += 120
+    cache.set('new0', {'summary': 'new'})
+    rows = [row[0] for row in cache._disk().execute('SELECT key FROM diagnosis_cache')]
+    assert rows == ['new0']
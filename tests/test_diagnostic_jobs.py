@@ -0,0 +1,51 @@
+import threading
+
+from diagnostic_jobs import DiagnosticJobs
+
+
+def test_enhance_does_not_mutate_the_callers_diagnosis():
+    started = threading.Event()
+    release = threading.Event()
+
+    def enhance(diagnosis):
+        diagnosis['summary'] = 'enhanced'
+        diagnosis['issues'].append('extra')
+        started.set()
+        release.wait(5)
+        return diagnosis
+
+    jobs = DiagnosticJobs(max_workers=1)
+    session = {'id': 's1', 'ai_diagnosis': {'summary': 'rule-based', 'issues': ['low charge']}}
+    assert jobs.submit(session, enhance)
+    assert started.wait(5)
+    # The caller still holds the rule-based result while the worker edits its own copy
+    assert session['ai_diagnosis'] == {'summary': 'rule-based', 'issues': ['low charge']}
+    assert jobs.get('s1')['ai_diagnosis'] == {'summary': 'rule-based', 'issues': ['low charge']}
+    release.set()
+    jobs._executor.shutdown(wait=True)
+
+    finished = jobs.get('s1')
+    assert finished['status'] == 'completed'
+    assert finished['ai_diagnosis'] == {'summary': 'enhanced', 'issues': ['low charge', 'extra']}
+    assert session['ai_diagnosis']['summary'] == 'rule-based'
+
+
+def test_backlog_full_is_rejected_and_failures_are_recorded():
+    gate = threading.Event()
+    saved = []
+    jobs = DiagnosticJobs(max_workers=1, max_pending=1, on_change=saved.append)
+
+    def blocked(diagnosis):
+        gate.wait(5)
+        raise RuntimeError('upstream down')
+
+    assert jobs.submit({'id': 'a', 'ai_diagnosis': {}}, blocked)
+    assert not jobs.submit({'id': 'b', 'ai_diagnosis': {}}, blocked)
+    gate.set()
+    jobs._executor.shutdown(wait=True)
+
+    assert jobs.get('a')['status'] == 'failed'
+    assert jobs.get('a')['error'] == 'upstream down'
+    assert jobs.get('b') is None
+    assert jobs.stats()['rejected'] == 1 and jobs.stats()['failed'] == 1
+    assert [s['status'] for s in saved] == ['pending', 'failed']
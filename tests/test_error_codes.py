@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from error_codes import ErrorCodeDatabase, apply_error_codes, import_records
+
+RECORDS = [
+    {'brand': 'Carrier', 'code': 'E-9', 'meaning': 'Flame rollout switch open', 'severity': 'critical',
+     'likely_causes': ['Blocked heat exchanger', 'Failed inducer']},
+    {'brand': 'Carrier', 'code': 'E4', 'meaning': 'Outdoor coil sensor fault', 'severity': 'warning',
+     'likely_causes': ['Open thermistor']},
+    {'brand': 'Trane', 'code': 'E4', 'meaning': 'Low pressure lockout', 'severity': 'warning', 'likely_causes': []},
+]
+
+
+@pytest.fixture(scope='module')
+def error_code_db(hvac):
+    import_records(RECORDS, hvac.error_code_db.path)
+    return hvac.error_code_db
+
+
+def test_decode_normalizes_and_flags_ambiguous_codes(error_code_db):
+    decoded = error_code_db.decode(['carrier:e9', 'E4', 'Trane:E4', 'ZZ99'])
+    assert [item['submitted'] for item in decoded] == ['carrier:e9', 'E4', 'Trane:E4']
+    assert decoded[0]['entry']['meaning'] == 'Flame rollout switch open' and decoded[0]['brand_matched']
+    # E4 means different things for different brands, so it is not decoded without one
+    assert decoded[1]['ambiguous'] and decoded[1]['entry'] is None
+    assert decoded[2]['entry']['meaning'] == 'Low pressure lockout'
+
+
+def test_critical_code_warning_matches_rule_engine_shape(hvac, error_code_db):
+    diagnosis = hvac.rule_engine.diagnose('gas_furnace', ['no_heat'])
+    shape = set(diagnosis['safety_warnings'][0])
+    result = apply_error_codes(diagnosis, error_code_db.decode(['Carrier:E9']))
+
+    warning = result['safety_warnings'][0]
+    assert warning == {
+        'level': 'critical',
+        'category': 'error_code',
+        'message': 'Error code Carrier:E9 is critical: Flame rollout switch open',
+        'compliance': 'Manufacturer service instructions'
+    }
+    assert set(warning) == shape
+    assert all(isinstance(item, dict) for item in result['safety_warnings'])
+    assert result['safety_warnings'][1:] == diagnosis['safety_warnings']
+    assert result['primary_issue'] == 'Carrier E9: Flame rollout switch open'
+    assert result['likely_causes'][0]['source'] == 'error code Carrier:E9'
+
+
+def test_batch_applies_error_codes(client, error_code_db):
+    body = '\n'.join(json.dumps(submission) for submission in [
+        {'id': 'with-code', 'equipment_type': 'gas_furnace', 'symptoms': ['no_heat'], 'error_codes': ['Carrier:E9']},
+        {'id': 'without', 'equipment_type': 'gas_furnace', 'symptoms': ['no_heat']},
+    ])
+    response = client.post('/api/diagnostic/batch', data=body, content_type='application/x-ndjson')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    with_code, without = lines
+    assert with_code['primary_issue'] == 'Carrier E9: Flame rollout switch open'
+    assert with_code['decoded_error_codes'][0]['entry']['code'] == 'E9'
+    assert with_code['safety_warnings'][0]['category'] == 'error_code'
+    assert 'decoded_error_codes' not in without
+
+
+def test_missing_database_decodes_nothing(tmp_path):
+    db = ErrorCodeDatabase(str(tmp_path / 'absent.db'))
+    assert db.decode(['E1']) == []
+    assert apply_error_codes({'confidence_score': 50}, []) == {'confidence_score': 50}
@@ -0,0 +1,121 @@
+import io
+import json
+import os
+import time
+
+import pytest
+
+from image_pipeline import PIL_AVAILABLE, ImagePipeline, spool_upload
+
+pytestmark = pytest.mark.skipif(not PIL_AVAILABLE, reason='Pillow is not installed')
+
+
+def png_bytes(color='red'):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def wait_for(pipeline, image_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        record = pipeline.get(image_id)
+        if record and record['status'] != 'processing':
+            return record
+        time.sleep(0.05)
+    raise AssertionError(f'{image_id} still processing')
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    # A relative store dir, as with the default IMAGE_STORE_DIR=uploads
+    monkeypatch.chdir(tmp_path)
+    pipeline = ImagePipeline('uploads', max_workers=1)
+    yield pipeline
+    if pipeline._executor is not None:
+        pipeline._executor.shutdown(wait=True)
+
+
+def store(pipeline, body):
+    spooled, image_id, size = spool_upload(io.BytesIO(body), 1024 * 1024, 1024)
+    with spooled:
+        return pipeline.store(spooled, image_id, size, 'image/png', 'unit.png')
+
+
+def test_store_dir_is_absolute(pipeline, tmp_path):
+    assert pipeline.store_dir == os.path.join(str(tmp_path), 'uploads')
+
+
+def test_thumbnail_is_served_from_a_relative_store_dir(hvac, client, pipeline, monkeypatch):
+    monkeypatch.setattr(hvac, 'image_pipeline', pipeline)
+    response = client.post('/api/images/upload?filename=unit.png', data=png_bytes(), content_type='image/png')
+    assert response.status_code == 202
+    image_id = response.get_json()['image']['id']
+    assert wait_for(pipeline, image_id)['status'] == 'completed'
+
+    thumbnail = client.get(f'/api/images/{image_id}/thumbnail')
+    assert thumbnail.status_code == 200
+    assert thumbnail.mimetype == 'image/jpeg'
+    thumbnail.close()
+
+    again = client.post('/api/images/upload?filename=copy.png', data=png_bytes(), content_type='image/png')
+    assert again.get_json()['deduplicated'] is True
+
+
+def test_stale_processing_record_is_reprocessed(pipeline):
+    body = png_bytes('blue')
+    record, _ = store(pipeline, body)
+    image_id = record['id']
+    assert wait_for(pipeline, image_id)['status'] == 'completed'
+
+    # What a worker killed mid-processing leaves behind
+    record_path = os.path.join(pipeline.image_dir(image_id), 'image.json')
+    with open(record_path) as f:
+        stuck = dict(json.load(f), status='processing')
+    with open(record_path, 'w') as f:
+        json.dump(stuck, f)
+
+    record, deduplicated = store(pipeline, body)
+    assert not deduplicated
+    assert record['status'] == 'processing'
+    assert wait_for(pipeline, image_id)['status'] == 'completed'
+    assert not [name for name in os.listdir(pipeline.image_dir(image_id)) if name.endswith('.tmp')]
+
+
+def test_processing_claimed_by_another_worker_is_shared(pipeline):
+    fcntl = pytest.importorskip('fcntl')
+    body = png_bytes('yellow')
+    record, _ = store(pipeline, body)
+    image_id = record['id']
+    wait_for(pipeline, image_id)
+    record_path = os.path.join(pipeline.image_dir(image_id), 'image.json')
+    with open(record_path) as f:
+        in_progress = dict(json.load(f), status='processing')
+    with open(record_path, 'w') as f:
+        json.dump(in_progress, f)
+
+    # Another worker still holds the processing lock, so this one must not redo the work
+    other_worker = os.open(os.path.join(pipeline.image_dir(image_id), 'processing.lock'), os.O_RDWR)
+    fcntl.flock(other_worker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    try:
+        record, deduplicated = store(pipeline, body)
+        assert deduplicated and record['status'] == 'processing'
+        assert pipeline.stats()['uploaded'] == 1 and pipeline.stats()['pending'] == 0
+    finally:
+        os.close(other_worker)
+
+    # Once that worker is gone its lock is free and the record can be redone
+    record, deduplicated = store(pipeline, body)
+    assert not deduplicated
+    assert wait_for(pipeline, image_id)['status'] == 'completed'
+
+
+def test_in_flight_upload_is_shared(pipeline):
+    body = png_bytes('green')
+    first, first_deduplicated = store(pipeline, body)
+    second, second_deduplicated = store(pipeline, body)
+    assert not first_deduplicated and second_deduplicated
+    assert second['id'] == first['id']
+    wait_for(pipeline, first['id'])
+    assert pipeline.stats()['uploaded'] == 1
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Roughly three times a cold import on a laptop; override on slow CI runners
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '1000'))
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main_hybrid
+imported = time.perf_counter()
+status = main_hybrid.get_app().test_client().get('/').status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'status': status,
+    'openai_imported': 'openai' in sys.modules,
+    'httpx_imported': 'httpx' in sys.modules
+}))
+'''
+
+
+def probe(**env):
+    # A fresh interpreter, so nothing imported by other tests counts
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=dict(os.environ, **env),
+                            check=True, capture_output=True, text=True, timeout=60).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_stays_within_budget_without_loading_openai():
+    result = min((probe() for _ in range(3)), key=lambda result: result['import_ms'])
+    assert result['import_ms'] < IMPORT_BUDGET_MS, result
+    assert result['status'] == 200
+    assert not result['openai_imported'] and not result['httpx_imported']
+
+
+def test_configured_key_still_defers_the_client():
+    result = probe(OPENAI_API_KEY='sk-test')
+    assert result['status'] == 200
+    # The gateway exists, but openai is only imported for the first LLM call
+    assert not result['openai_imported']
@@ -0,0 +1,169 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+openai = pytest.importorskip('openai')
+httpx = pytest.importorskip('httpx')
+
+from llm_gateway import AsyncLLMGateway, CircuitBreaker, CircuitOpenError, LLMGateway
+
+REQUEST = httpx.Request('POST', 'https://llm.invalid/v1/chat/completions')
+
+
+def connection_error():
+    return openai.APIConnectionError(request=REQUEST)
+
+
+def rate_limit_error():
+    return openai.RateLimitError('slow down', response=httpx.Response(429, request=REQUEST), body=None)
+
+
+class FakeStream:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        yield from self.chunks
+        if self.error:
+            raise self.error
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+def gateway_with(outcomes, gateway_class=LLMGateway, **kwargs):
+    """A gateway whose create() returns or raises each outcome in turn"""
+    gateway = gateway_class(api_key='test', backoff=0, **kwargs)
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def acreate(**request):
+        return create(**request)
+
+    completions = SimpleNamespace(create=acreate if gateway_class is AsyncLLMGateway else create)
+    gateway.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return gateway, calls
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_one_trial(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr('llm_gateway.time.monotonic', lambda: clock[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    clock[0] += 30
+    assert breaker.allow()
+    # Only one trial at a time while half-open
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+    assert breaker.stats()['times_opened'] == 1
+
+
+def test_failed_trial_reopens_immediately(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr('llm_gateway.time.monotonic', lambda: clock[0])
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+
+def test_gateway_retries_then_raises_circuit_open():
+    gateway, calls = gateway_with([connection_error()] * 3, max_retries=2, failure_threshold=3)
+    with pytest.raises(openai.APIConnectionError):
+        gateway.chat(model='m', messages=[])
+    assert len(calls) == 3
+    assert gateway.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        gateway.chat(model='m', messages=[])
+    assert len(calls) == 3
+    assert gateway.stats()['rejected_while_open'] == 1
+
+
+def test_rate_limits_are_retried_but_never_open_the_breaker():
+    outcomes = [rate_limit_error()] * 3 + ['ok']
+    gateway, calls = gateway_with(outcomes, max_retries=5, failure_threshold=2)
+    assert gateway.chat(model='m', messages=[]) == 'ok'
+    assert len(calls) == 4
+    assert gateway.breaker.state == 'closed'
+    assert gateway.breaker.consecutive_failures == 0
+    assert gateway.stats()['rate_limited'] == 3
+
+
+def test_rate_limited_half_open_trial_is_released():
+    gateway, _ = gateway_with([rate_limit_error()], max_retries=0, failure_threshold=1, reset_timeout=0)
+    gateway.breaker.record_failure()
+    with pytest.raises(openai.RateLimitError):
+        gateway.chat(model='m', messages=[])
+    assert gateway.breaker.state == 'half_open'
+    # Another caller may run the trial instead of the breaker staying stuck
+    assert gateway.breaker.allow()
+
+
+def test_stream_success_is_recorded_only_after_the_last_chunk():
+    gateway, _ = gateway_with([FakeStream(['a', 'b'])], failure_threshold=1, reset_timeout=0)
+    gateway.breaker.record_failure()
+    stream = gateway.chat(model='m', messages=[], stream=True)
+    assert gateway.breaker.state == 'half_open'
+    assert list(stream) == ['a', 'b']
+    assert gateway.breaker.state == 'closed'
+
+
+def test_stream_broken_mid_way_counts_as_a_failure():
+    gateway, _ = gateway_with([FakeStream(['a'], error=connection_error())], failure_threshold=1)
+    stream = gateway.chat(model='m', messages=[], stream=True)
+    assert gateway.breaker.state == 'closed'
+    with pytest.raises(openai.APIConnectionError):
+        list(stream)
+    assert gateway.breaker.state == 'open'
+
+
+def test_abandoned_stream_frees_the_trial_without_a_verdict():
+    fake = FakeStream(['a', 'b', 'c'])
+    gateway, _ = gateway_with([fake], failure_threshold=1, reset_timeout=0)
+    gateway.breaker.record_failure()
+    stream = gateway.chat(model='m', messages=[], stream=True)
+    chunks = iter(stream)
+    next(chunks)
+    stream.close()
+    assert fake.closed
+    assert gateway.breaker.state == 'half_open'
+    assert gateway.breaker.allow()
+
+
+def test_async_stream_outcome_is_recorded_after_consumption():
+    gateway, _ = gateway_with([FakeStream(['a'], error=connection_error()), FakeStream(['x', 'y'])],
+                              gateway_class=AsyncLLMGateway, failure_threshold=2)
+
+    async def consume():
+        stream = await gateway.chat(model='m', messages=[], stream=True)
+        return [chunk async for chunk in stream]
+
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(consume())
+    assert gateway.breaker.consecutive_failures == 1
+    assert asyncio.run(consume()) == ['x', 'y']
+    assert gateway.breaker.consecutive_failures == 0
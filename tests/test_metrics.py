@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+
+from metrics import Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency', ['stage'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, stage='llm')
+    text = registry.render()
+    assert 'latency_seconds_bucket{stage="llm",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{stage="llm",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{stage="llm",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{stage="llm"} 4' in text
+    assert 'latency_seconds_sum{stage="llm"} 3.65' in text
+
+
+def test_counters_are_thread_safe_and_labels_escaped():
+    registry = Registry()
+    errors = registry.counter('errors_total', 'Errors', ['reason'])
+
+    def work():
+        for _ in range(1000):
+            errors.inc(reason='time"out')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert 'errors_total{reason="time\\"out"} 8000' in registry.render()
+
+
+def test_gauge_callbacks_may_return_labelled_readings():
+    registry = Registry()
+    registry.gauge('queue_depth', 'Depth', ['priority'], callback=lambda: {('critical',): 1, ('background',): 4})
+    registry.gauge('in_flight', 'In flight', callback=lambda: 3)
+    text = registry.render()
+    assert 'queue_depth{priority="critical"} 1' in text and 'queue_depth{priority="background"} 4' in text
+    assert '# TYPE in_flight gauge\nin_flight 3' in text
+
+
+def test_metrics_endpoint_reports_requests(client):
+    client.get('/api/catalog')
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'hvac_llm_admission_queue_depth{priority="critical"} 0' in text
+    assert 'hvac_http_request_duration_seconds_count{endpoint="get_catalog",method="GET",status="200"}' in text
+
+
+def worker_registry(directory):
+    registry = Registry()
+    registry.counter('calls_total', 'Calls', ['route'])
+    registry.histogram('latency_seconds', 'Latency', buckets=(1.0,))
+    registry.gauge('in_flight', 'In flight')
+    registry.share(str(directory), publish_interval=3600)
+    return registry
+
+
+def test_shared_registry_sums_every_worker(tmp_path):
+    registry = worker_registry(tmp_path)
+    calls, latency, in_flight = registry._metrics
+    calls.inc(route='a')
+    latency.observe(0.5)
+    in_flight.set(1)
+    # Another live worker, and one that has exited since it last published
+    for pid in (os.getppid(), 999999999):
+        with open(tmp_path / f'{pid}.json', 'w') as f:
+            json.dump({'calls_total': [[['a'], 2]], 'latency_seconds': [[[], [[0, 1], 2.0, 1]]],
+                       'in_flight': [[[], 3]]}, f)
+
+    text = registry.render()
+    assert 'calls_total{route="a"} 5' in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text and 'latency_seconds_count 3' in text
+    # An exited worker's counters still count, its gauges do not
+    assert 'in_flight 4' in text
+    assert json.load(open(tmp_path / f'{os.getpid()}.json'))['calls_total'] == [[['a'], 1]]
+
+
+def test_profiled_requests_log_the_profile_instead_of_exposing_its_path(hvac, client, monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(hvac, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(hvac, 'PROFILE_DIR', str(tmp_path))
+    response = client.get('/api/catalog', headers={'X-Profile': '1'})
+    response.close()
+    assert 'X-Profile-File' not in response.headers
+    assert len(os.listdir(tmp_path)) == 1
+    assert str(tmp_path) in capsys.readouterr().out
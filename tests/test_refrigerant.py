@@ -0,0 +1,100 @@
+import math
+
+import pytest
+
+import refrigerant
+from refrigerant import (ATMOSPHERE_PSI, KPA_TO_PSI, PT_TABLES_KPA, TABLE_TEMPERATURES_C, analyze, analyze_batch,
+                         apply_measurement_analysis, normalize_refrigerant, saturation_temperature_f)
+
+# R-410A with a low charge: high superheat, low subcooling
+LOW_CHARGE = {
+    'refrigerant': 'R410A',
+    'suction_pressure': 90,
+    'liquid_pressure': 280,
+    'suction_line_temperature': 60,
+    'liquid_line_temperature': 88,
+    'return_air_temperature': 75,
+    'supply_air_temperature': 60,
+    'ambient_temperature': 85
+}
+
+
+def psig(kpa_absolute):
+    return kpa_absolute * KPA_TO_PSI - ATMOSPHERE_PSI
+
+
+@pytest.mark.parametrize('name', sorted(PT_TABLES_KPA))
+def test_table_points_round_trip(name):
+    pressures = [psig(kpa) for kpa in PT_TABLES_KPA[name]['bubble']]
+    expected = [t * 9 / 5 + 32 for t in TABLE_TEMPERATURES_C]
+    assert saturation_temperature_f(name, pressures) == pytest.approx(expected, abs=0.01)
+
+
+def test_scalar_and_vectorized_paths_agree(monkeypatch):
+    pressures = [10.0 + 7.5 * i for i in range(40)] + [-20.0, 9000.0]
+    vectorized = list(saturation_temperature_f('R-454B', pressures, 'dew'))
+    monkeypatch.setattr(refrigerant, 'VECTORIZE_MIN_BATCH', 10 ** 6)
+    scalar = saturation_temperature_f('R-454B', pressures, 'dew')
+    assert all(math.isnan(a) and math.isnan(b) or a == pytest.approx(b, abs=1e-9)
+               for a, b in zip(vectorized, scalar))
+    # Outside the table is NaN, never an extrapolated guess
+    assert math.isnan(scalar[-1]) and math.isnan(scalar[-2])
+
+
+def test_refrigerant_names_are_normalized():
+    assert normalize_refrigerant('r410a') == normalize_refrigerant('410A') == 'R-410A'
+    assert normalize_refrigerant('R 454B') == 'R-454B'
+    assert normalize_refrigerant('R-12') is None and normalize_refrigerant('') is None
+
+
+def test_low_charge_readings_become_the_primary_issue():
+    analysis = analyze(LOW_CHARGE)
+    flags = {flag['flag'] for flag in analysis['flags']}
+    assert {'high_superheat', 'low_subcooling'} <= flags
+
+    diagnosis = {'primary_issue': 'Reduced cooling', 'confidence_score': 70, 'likely_causes': []}
+    result = apply_measurement_analysis(diagnosis, analysis)
+    assert result['primary_issue'] == 'Low refrigerant charge (measured)'
+    assert result['confidence_score'] == 88
+    assert result['likely_causes'][0] == {'cause': 'Refrigerant leak', 'probability': 85, 'source': 'measurements'}
+    assert diagnosis['primary_issue'] == 'Reduced cooling'
+
+
+def test_batch_matches_single_ticket_analysis():
+    tickets = [dict(LOW_CHARGE, suction_pressure=80 + i) for i in range(20)] + [{}, {'refrigerant': 'R-22'}]
+    batch = analyze_batch(tickets)
+    assert batch[:20] == [analyze(ticket) for ticket in tickets[:20]]
+    assert batch[20] is None and batch[21] is None
+
+
+def test_out_of_table_pressure_is_flagged():
+    analysis = analyze({'refrigerant': 'R-32', 'suction_pressure': 2000})
+    assert analysis['suction_saturation_f'] is None
+    assert analysis['flags'] == [{'flag': 'suction_pressure_out_of_range', 'value': 2000.0}]
+
+
+def test_uninterpretable_pressures_do_not_raise_confidence(hvac):
+    baseline = hvac.get_rule_based_diagnosis('split_system', ['insufficient_cooling'])
+    diagnosis = hvac.get_rule_based_diagnosis('split_system', ['insufficient_cooling'], measurements={
+        'refrigerant': 'R-410A', 'suction_pressure': 900, 'liquid_pressure': 5000})
+    assert {flag['flag'] for flag in diagnosis['measurement_analysis']['flags']} == {
+        'suction_pressure_out_of_range', 'liquid_pressure_out_of_range'}
+    assert diagnosis['confidence_score'] == baseline['confidence_score']
+
+
+def test_measured_finding_outranks_the_matching_symptom_rule(hvac):
+    rule_only = hvac.get_rule_based_diagnosis('split_system', ['not_cooling', 'ice_buildup'])
+    assert (rule_only['primary_issue'], rule_only['confidence_score']) == ('Refrigerant System with Ice Formation', 85)
+    diagnosis = hvac.get_rule_based_diagnosis('split_system', ['not_cooling', 'ice_buildup'], measurements=LOW_CHARGE)
+    assert (diagnosis['primary_issue'], diagnosis['confidence_score']) == ('Low refrigerant charge (measured)', 88)
+    causes = [cause['cause'] for cause in diagnosis['likely_causes']]
+    # Measured causes lead, and the refrigerant rule's own causes are kept after them
+    assert causes[0] == 'Refrigerant leak'
+    assert all(cause['cause'] in causes for cause in rule_only['likely_causes'])
+
+
+def test_enhanced_diagnosis_keeps_measurement_analysis(hvac):
+    diagnosis = hvac.get_rule_based_diagnosis('split_system', ['not_cooling', 'ice_buildup'], measurements=LOW_CHARGE)
+    enhanced = hvac.apply_chatgpt_analysis(diagnosis, 'Full analysis')
+    assert enhanced['measurement_analysis'] == diagnosis['measurement_analysis']
+    assert enhanced['summary'] == 'Full analysis'
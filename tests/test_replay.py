@@ -0,0 +1,106 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import replay
+from conftest import ROOT
+
+TICKETS = [
+    {'id': f'g{n}', 'equipment_type': 'split_system', 'symptoms': ['not_cooling', 'ice_buildup'][:1 + n % 2]}
+    for n in range(12)
+] + [{'id': 'q1', 'description': 'Furnace short cycles'}]
+
+
+def write_lines(path, lines):
+    with open(path, 'a') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+
+def run_replay(*args, cwd=None, check=True):
+    # Without the test suite's store paths, as a replay is normally launched
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('SESSION_STORE_PATH', 'QUICK_SUBMIT_INDEX_PATH', 'IMAGE_STORE_DIR')}
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'replay.py'), *args, '--workers', '1', '--chunk-size', '3'],
+                          check=check, cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+
+
+def read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_read_chunks_reports_resumable_offsets():
+    data = b'{"a": 1}\n\n{"a": 2}\n{"a": 3}\n'
+    chunks = list(replay.read_chunks(io.BytesIO(data), 0, 2, 1 << 20))
+    assert [[line for line, _ in chunk] for chunk, _, _ in chunks] == [[1, 3], [4]]
+    _, offset, end_line = chunks[0]
+    # Resuming from the first chunk's checkpoint yields exactly the rest
+    rest = io.BytesIO(data)
+    rest.seek(offset)
+    assert [[line for line, _ in chunk] for chunk, _, _ in replay.read_chunks(rest, end_line, 2, 1 << 20)] == [[4]]
+
+
+def test_replay_line_records_drift_and_errors(hvac, monkeypatch):
+    monkeypatch.setattr(replay, 'hvac', hvac)
+    session = {'id': 's1', 'session_type': 'guided', 'equipment_type': 'split_system', 'symptoms': ['not_cooling'],
+               'description': 'notes', 'ai_diagnosis': {'primary_issue': 'Old answer', 'confidence_score': 10}}
+    result, changed = replay.replay_line(7, json.dumps(session))
+    assert changed and result['changed'] and result['previous']['primary_issue'] == 'Old answer'
+    assert result['ai_diagnosis']['primary_issue'] == 'Cooling System Failure'
+    assert result['line'] == 7 and result['session_type'] == 'guided'
+
+    result, changed = replay.replay_line(8, '[1, 2]')
+    assert result == {'line': 8, 'success': False, 'error': 'Ticket must be a JSON object'} and not changed
+
+
+def test_resume_continues_after_the_checkpoint(tmp_path):
+    lines = [json.dumps(ticket) for ticket in TICKETS]
+    full_input, full_output = tmp_path / 'full.jsonl', tmp_path / 'full.out.jsonl'
+    write_lines(full_input, lines)
+    run_replay(str(full_input), '-o', str(full_output), cwd=str(tmp_path))
+    expected = read_results(full_output)
+    assert [result['line'] for result in expected] == list(range(1, len(TICKETS) + 1))
+    assert {result['ai_diagnosis']['primary_issue'] for result in expected[:12]} == {
+        'Cooling System Failure', 'Refrigerant System with Ice Formation'}
+    # The service stores live in a temporary workdir, not wherever the replay was started
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.db') or name == 'uploads']
+
+    # A run that stopped after the first six tickets, with a half-written chunk after its checkpoint
+    partial_input, partial_output = tmp_path / 'partial.jsonl', tmp_path / 'partial.out.jsonl'
+    write_lines(partial_input, lines[:6])
+    run_replay(str(partial_input), '-o', str(partial_output))
+    with open(partial_output, 'a') as f:
+        f.write('{"line": 7, "success": tr')
+    write_lines(partial_input, lines[6:])
+
+    run_replay(str(partial_input), '-o', str(partial_output), '--resume')
+    assert read_results(partial_output) == expected
+
+    with open(f'{partial_output}.checkpoint') as f:
+        state = json.load(f)
+    assert state['processed'] == len(TICKETS) and state['line'] == len(TICKETS)
+    assert state['output_offset'] == os.path.getsize(partial_output)
+
+
+def test_resume_without_checkpoint_starts_over(tmp_path):
+    source, output = tmp_path / 'in.jsonl', tmp_path / 'out.jsonl'
+    write_lines(source, [json.dumps(ticket) for ticket in TICKETS[:4]])
+    run_replay(str(source), '-o', str(output), '--resume')
+    assert len(read_results(output)) == 4
+
+
+def test_resume_refuses_a_checkpoint_for_another_input(tmp_path):
+    first, second, output = tmp_path / 'first.jsonl', tmp_path / 'second.jsonl', tmp_path / 'out.jsonl'
+    write_lines(first, [json.dumps(ticket) for ticket in TICKETS[:4]])
+    write_lines(second, [json.dumps(ticket) for ticket in TICKETS[4:]])
+    run_replay(str(first), '-o', str(output))
+    before = output.read_bytes()
+
+    refused = run_replay(str(second), '-o', str(output), '--resume', check=False)
+    assert refused.returncode != 0 and 'belongs to' in refused.stderr
+    assert output.read_bytes() == before
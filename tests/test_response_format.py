@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+import response_format
+from response_format import compact_session, encode, negotiate, parse_fields, project, render_session_payload
+
+SESSION = {
+    'id': 's1',
+    'status': 'completed',
+    'equipment_type': 'split_system',
+    'symptoms': ['not_cooling'],
+    'ai_diagnosis': {
+        'summary': 'Low charge',
+        'chatgpt_analysis': 'Full analysis',
+        'likely_causes': [{'cause': 'leak'}],
+        'safety_warnings': []
+    }
+}
+
+
+def test_projection_keeps_only_requested_paths():
+    fields = parse_fields('id, ai_diagnosis.summary,missing.path,')
+    assert project(SESSION, fields) == {'id': 's1', 'ai_diagnosis': {'summary': 'Low charge'}}
+    # A whole subtree wins over a narrower path to the same key
+    assert project(SESSION, parse_fields('ai_diagnosis.summary,ai_diagnosis')) == {'ai_diagnosis': SESSION['ai_diagnosis']}
+    assert parse_fields('') is None
+
+
+def test_compact_drops_echoed_inputs_and_redundant_blocks():
+    compact = compact_session(SESSION)
+    assert 'equipment_type' not in compact and 'symptoms' not in compact
+    assert compact['ai_diagnosis'] == {'summary': 'Low charge', 'chatgpt_analysis': 'Full analysis'}
+    # Without a ChatGPT analysis the rule-based blocks are the diagnosis, so they stay
+    rule_based = dict(SESSION, ai_diagnosis={'summary': 'x', 'likely_causes': []})
+    assert compact_session(rule_based)['ai_diagnosis'] == rule_based['ai_diagnosis']
+    assert SESSION['ai_diagnosis']['likely_causes']
+
+
+def test_envelope_keys_survive_projection():
+    body, media_type = render_session_payload(
+        {'success': True, 'sessions': [SESSION], 'next_cursor': 'c'}, {'fields': 'id'}, None)
+    assert media_type == 'application/json'
+    assert json.loads(body) == {'success': True, 'sessions': [{'id': 's1'}], 'next_cursor': 'c'}
+
+
+def test_msgpack_is_negotiated_only_when_preferred(monkeypatch):
+    monkeypatch.setattr(response_format, 'MSGPACK_AVAILABLE', True)
+    assert negotiate('application/msgpack') == 'application/msgpack'
+    assert negotiate('application/json, application/msgpack;q=0.5') == 'application/json'
+    assert negotiate('application/msgpack;q=0') == 'application/json'
+    monkeypatch.setattr(response_format, 'MSGPACK_AVAILABLE', False)
+    assert negotiate('application/msgpack') == 'application/json'
+
+
+def test_integers_past_64_bits_fall_back_to_json():
+    payload = {'success': True, 'session': {'measurements': {'suction_pressure': 10 ** 30}}}
+    body, media_type = encode(payload, 'application/json')
+    assert media_type == 'application/json' and json.loads(body) == payload
+    if response_format.MSGPACK_AVAILABLE:
+        body, media_type = encode(payload, 'application/msgpack')
+        assert media_type == 'application/json' and json.loads(body) == payload
+
+
+def test_guided_request_with_huge_measurement_still_responds(client):
+    response = client.post('/api/diagnostic/guided', json={
+        'equipment_type': 'split_system', 'symptoms': ['not_cooling'], 'measurements': {'suction_pressure': 10 ** 30}})
+    assert response.status_code == 200
+    assert response.get_json()['session']['measurements']['suction_pressure'] == 10 ** 30
+
+
+def test_session_route_honours_fields_and_accept(client):
+    created = client.post('/api/diagnostic/guided', json={'equipment_type': 'split_system', 'symptoms': ['not_cooling']})
+    session_id = created.get_json()['session']['id']
+
+    response = client.get(f'/api/diagnostic/session/{session_id}?fields=id,ai_diagnosis.primary_issue')
+    assert response.headers['Vary'] == 'Accept'
+    session = response.get_json()['session']
+    assert set(session) == {'id', 'ai_diagnosis'} and list(session['ai_diagnosis']) == ['primary_issue']
+
+    if not response_format.MSGPACK_AVAILABLE:
+        pytest.skip('msgpack is not installed')
+    packed = client.get(f'/api/diagnostic/session/{session_id}?compact=1',
+                        headers={'Accept': 'application/msgpack'})
+    assert packed.mimetype == 'application/msgpack'
+    decoded = response_format.msgpack.unpackb(packed.get_data(), raw=False)
+    assert decoded['session']['id'] == session_id and 'equipment_type' not in decoded['session']
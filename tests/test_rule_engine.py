@@ -0,0 +1,54 @@
+import itertools
+import random
+
+import pytest
+
+import rule_engine
+
+
+@pytest.fixture(scope='module')
+def engine(hvac):
+    return hvac.rule_engine
+
+
+def symptom_combinations(engine, count=300):
+    ids = sorted(engine.symptom_bits)
+    rng = random.Random(7)
+    combos = [[]] + [[s] for s in ids] + [list(pair) for pair in itertools.combinations(ids[:8], 2)]
+    combos += [rng.sample(ids, rng.randint(1, min(5, len(ids)))) for _ in range(count)]
+    return combos + [['not_a_symptom'], ['not_cooling', 'not_a_symptom']]
+
+
+def test_batch_scoring_matches_per_request_rules(engine):
+    combos = symptom_combinations(engine)
+    expected = [engine.primary_issues.first(*engine.symptom_mask(symptoms)) or engine.default_issue
+                for symptoms in combos]
+    assert engine.score_batch(combos) == expected
+
+
+def test_scalar_fallback_matches_vectorized(engine, monkeypatch):
+    combos = symptom_combinations(engine, count=50)
+    vectorized = engine.score_batch(combos)
+    monkeypatch.setattr(rule_engine, 'NUMPY_AVAILABLE', False)
+    assert engine.score_batch(combos) == vectorized
+
+
+def test_diagnose_uses_first_matching_rule_and_standing_warnings(engine):
+    diagnosis = engine.diagnose('split_system', [])
+    assert diagnosis['primary_issue'] == engine.default_issue['primary_issue']
+    standing = [engine.safety_warnings.rules[position][2] for position in engine.safety_warnings.always]
+    assert len(diagnosis['safety_warnings']) == sum(len(rule['items']) for rule in standing)
+    assert not engine.is_safety_critical([])
+
+
+def test_symptom_specific_warning_marks_the_request_safety_critical(engine):
+    assert engine.is_safety_critical(['burning_smell'])
+    diagnosis = engine.diagnose('split_system', ['burning_smell'])
+    assert any(warning['category'] == 'fire_safety' for warning in diagnosis['safety_warnings'])
+
+
+def test_rules_with_unknown_groups_are_rejected():
+    rules = {'summary_template': '', 'primary_issues': [{'when': {'any_group': 'missing'}}], 'default_issue': {},
+             'recommended_actions': {'rules': [], 'default': []}, 'troubleshooting_steps': [], 'safety_warnings': []}
+    with pytest.raises(ValueError, match='Unknown symptom group'):
+        rule_engine.RuleEngine(rules, [], [])
@@ -0,0 +1,91 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from session_store import SessionStore, SQLiteSessionStore
+
+
+def make_session(n, **fields):
+    session = {
+        'id': f's{n:04d}',
+        'created_at': f'2026-01-01T00:{n // 60:02d}:{n % 60:02d}',
+        'session_type': 'guided',
+        'equipment_type': 'split_system' if n % 2 else 'heat_pump',
+        'symptoms': ['not_cooling'] if n % 3 == 0 else ['unusual_noise'],
+        'status': 'completed'
+    }
+    session.update(fields)
+    return session
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'), flush_interval=0.02)
+
+
+def test_concurrent_saves_are_group_committed(store):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(store.save, [make_session(n) for n in range(400)]))
+    assert store.flush(timeout=10)
+
+    stats = store.stats()
+    assert stats['written'] == 400
+    # Several saves share each transaction instead of one commit per session
+    assert stats['commits'] < 400
+    assert store.get('s0123')['id'] == 's0123'
+
+
+def test_resave_replaces_and_queries_paginate(store):
+    for n in range(10):
+        store.save(make_session(n))
+    store.save(make_session(3, status='failed'))
+    assert store.flush(timeout=10)
+
+    assert store.get('s0003')['status'] == 'failed'
+    first, cursor = store.query(limit=4)
+    second, _ = store.query(limit=4, cursor=cursor)
+    assert [s['id'] for s in first] == ['s0009', 's0008', 's0007', 's0006']
+    assert [s['id'] for s in second] == ['s0005', 's0004', 's0003', 's0002']
+    by_symptom, _ = store.query(symptom='not_cooling')
+    assert [s['id'] for s in by_symptom] == ['s0009', 's0006', 's0003', 's0000']
+
+
+def test_bad_session_fails_alone_and_writer_keeps_running(store):
+    broken = make_session(1)
+    del broken['created_at']
+    store.save(make_session(0))
+    store.save(broken)
+    store.save(make_session(2))
+    assert store.flush(timeout=10) is False
+
+    # Only the malformed session is lost, not the rest of its batch
+    assert store.get('s0000') is not None and store.get('s0002') is not None
+    assert store.get('s0001') is None
+    assert store.stats()['failed'] == 1
+
+    store.save(make_session(5))
+    assert store.flush(timeout=10)
+    assert store.get('s0005') is not None
+
+
+def test_writer_survives_unexpected_errors(store, monkeypatch):
+    def explode(conn, sessions):
+        raise RuntimeError('disk gremlin')
+
+    monkeypatch.setattr(store, '_write_batch', explode)
+    store.save(make_session(0))
+    assert store.flush(timeout=10) is False
+    monkeypatch.undo()
+
+    store.save(make_session(1))
+    assert store.flush(timeout=10)
+    assert store.get('s0001') is not None
+
+
+def test_incomplete_backend_fails_when_created():
+    class WriteOnlyStore(SessionStore):
+        def save(self, session):
+            pass
+
+    with pytest.raises(TypeError, match='get, query'):
+        WriteOnlyStore()
@@ -0,0 +1,104 @@
+import pytest
+
+import similarity_index
+
+from similarity_index import DescriptionIndex, description_tokens, jaccard
+
+ANALYSIS = {'summary': 'Restricted airflow', 'chatgpt_analysis': 'Replace the filter'}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return DescriptionIndex(str(tmp_path / 'index.db'), prompt_version='v1')
+
+
+@pytest.mark.parametrize('negated, plain', [
+    ('no burning smell, warm air, ice on lines', 'burning smell, warm air, ice on lines'),
+    ('breaker not tripping, fan runs, warm air from vents', 'breaker tripping, fan runs, warm air from vents'),
+    ("compressor doesn't start, thermostat calls for cooling", 'compressor starts, thermostat calls for cooling'),
+    ('warm air without any ice on the coil', 'warm air with ice on the coil'),
+])
+def test_negated_descriptions_are_never_matched(index, negated, plain):
+    assert description_tokens(negated) != description_tokens(plain)
+    index.add(plain, ANALYSIS)
+    assert index.lookup(negated) is None
+    index.add(negated, ANALYSIS)
+    assert index.lookup(negated)[1] == 1.0
+
+
+def test_negation_attaches_to_the_next_meaningful_word():
+    assert description_tokens('no burning smell') == {'not_burn', 'smell'}
+    assert description_tokens('there is not a leak') == {'not_leak'}
+    assert description_tokens('trailing no') == {'trail'}
+
+
+def test_near_duplicate_is_found_and_unrelated_text_is_not(index):
+    index.add('Unit short cycles every few minutes, outdoor fan noisy, warm air', ANALYSIS)
+    match = index.lookup('unit short cycling every few minutes, outdoor fan loud, warm air')
+    assert match is not None
+    analysis, score = match
+    assert analysis == ANALYSIS and score >= index.threshold
+
+    assert index.lookup('Water leaking from the furnace drain pan onto the floor') is None
+    assert index.stats()['hits'] == 1 and index.stats()['misses'] == 1
+
+
+def test_lsh_candidates_still_pass_the_exact_threshold(index):
+    base = 'ice on suction line warm air filter clogged coil dirty fan slow'
+    index.add(base, ANALYSIS)
+    # Shares most words, so it may land in a bucket, but Jaccard is below the threshold
+    other = 'ice on suction line warm air thermostat wiring loose breaker relay'
+    assert jaccard(description_tokens(base), description_tokens(other)) < index.threshold
+    assert index.lookup(other) is None
+
+
+def test_new_prompt_version_retires_old_rows(tmp_path):
+    path = str(tmp_path / 'index.db')
+    DescriptionIndex(path, prompt_version='v1').add('outdoor fan not spinning, humming noise', ANALYSIS)
+    assert DescriptionIndex(path, prompt_version='v1').lookup('outdoor fan not spinning, humming noise')
+    assert DescriptionIndex(path, prompt_version='v2').lookup('outdoor fan not spinning, humming noise') is None
+
+
+def test_expired_description_can_be_indexed_again(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(similarity_index.time, 'time', lambda: clock[0])
+    index = DescriptionIndex(str(tmp_path / 'index.db'), prompt_version='v1', ttl=60)
+    description = 'outdoor fan not spinning, humming noise'
+    index.add(description, ANALYSIS)
+    index.add(description, {'summary': 'ignored while the first analysis is live'})
+    assert index.lookup(description)[0] == ANALYSIS
+
+    clock[0] += 120
+    assert index.lookup(description) is None
+    index.add(description, {'summary': 'Failed capacitor'})
+    assert index.lookup(description)[0] == {'summary': 'Failed capacitor'}
+    assert index.added == 2
+
+
+def test_expired_rows_are_purged_while_running(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(similarity_index.time, 'time', lambda: clock[0])
+    index = DescriptionIndex(str(tmp_path / 'index.db'), prompt_version='v1', ttl=60, purge_interval=0)
+    index.add('outdoor fan not spinning, humming noise', ANALYSIS)
+    clock[0] += 120
+    index.add('water leaking from the drain pan', ANALYSIS)
+    conn = index._conn()
+    assert conn.execute('SELECT COUNT(*) FROM descriptions').fetchone()[0] == 1
+    assert conn.execute('SELECT COUNT(DISTINCT description_id) FROM description_buckets').fetchone()[0] == 1
+
+
+def test_safety_reports_are_never_reused_or_indexed(hvac, monkeypatch):
+    monkeypatch.setattr(hvac, 'llm_enhancement_enabled', lambda: True)
+    safe = hvac.quick_submit_diagnosis_args({'description': 'outdoor fan not spinning, humming noise, warm air'})
+    burning = hvac.quick_submit_diagnosis_args({'description': 'no burning smell, outdoor fan not spinning, warm air'})
+
+    hvac.remember_quick_submit(safe, dict(ANALYSIS))
+    assert hvac.similar_quick_submit_diagnosis(safe)['summary'] == ANALYSIS['summary']
+
+    hvac.remember_quick_submit(burning, dict(ANALYSIS))
+    assert hvac.similar_quick_submit_diagnosis(burning) is None
+    assert hvac.description_index.lookup(burning['description']) is None
+
+    guided = dict(safe, symptoms=['burning_smell'])
+    monkeypatch.setattr(hvac.rule_engine, 'is_safety_critical', lambda symptoms: symptoms == ['burning_smell'])
+    assert hvac.similar_quick_submit_diagnosis(guided) is None
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_callers_share_one_execution_and_get_copies():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return {'issues': ['low charge']}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.do, 'k', work) for _ in range(8)]
+        # Let every follower attach to the leader's call before it finishes
+        deadline = time.monotonic() + 5
+        while flight.coalesced < 7 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(runs) == 1
+    assert all(result == {'issues': ['low charge']} for result in results)
+    # Followers get their own copy, so mutating one result leaves the others alone
+    assert len({id(result) for result in results}) == 8
+    stats = flight.stats()
+    assert stats['executions'] == 1 and stats['coalesced'] == 7 and stats['in_flight'] == 0
+    assert stats['top_coalesced_keys'] == [{'key': 'k', 'coalesced': 7}]
+
+
+def test_leader_gets_a_copy_only_when_the_result_is_shared():
+    flight = SingleFlight()
+    produced = []
+    release = threading.Event()
+
+    def work():
+        produced.append({'issues': ['low charge']})
+        release.wait(5)
+        return produced[-1]
+
+    release.set()
+    assert flight.do('solo', work) is produced[-1]
+
+    release.clear()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'k', work)
+        while not produced[1:]:
+            time.sleep(0.01)
+        follower = pool.submit(flight.do, 'k', work)
+        while flight.coalesced < 1:
+            time.sleep(0.01)
+        release.set()
+        leader_result, follower_result = leader.result(), follower.result()
+    # The published result is never handed out, so the leader's caller cannot change what followers copy
+    assert leader_result is not produced[-1] and follower_result is not produced[-1]
+    leader_result['issues'].append('added by the caller')
+    assert produced[-1] == follower_result == {'issues': ['low charge']}
+
+
+def test_async_leader_mutation_does_not_reach_followers():
+    flight = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        return {'summary': 'ok'}
+
+    async def call(mutate):
+        result = await flight.do('k', work)
+        if mutate:
+            result['extra'] = 'leader only'
+        return result
+
+    async def scenario():
+        return await asyncio.gather(call(True), call(False))
+
+    leader, follower = asyncio.run(scenario())
+    assert leader == {'summary': 'ok', 'extra': 'leader only'} and follower == {'summary': 'ok'}
+
+
+def test_leader_error_reaches_followers_and_key_is_cleared():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'k', failing)
+        started.wait(5)
+        follower = pool.submit(flight.do, 'k', lambda: 'never runs')
+        while flight.coalesced < 1:
+            time.sleep(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match='upstream down'):
+                future.result()
+
+    # The next call starts fresh instead of replaying the failure
+    assert flight.do('k', lambda: 'recovered') == 'recovered'
+
+
+def test_async_followers_survive_a_cancelled_caller():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {'summary': 'ok'}
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        first.cancel()
+        result = await second
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return result
+
+    assert asyncio.run(scenario()) == {'summary': 'ok'}
+    assert len(runs) == 1
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_tracked_keys_are_bounded():
+    flight = SingleFlight(max_tracked_keys=2)
+    for key in ('a', 'b', 'c'):
+        flight._record(key, 1)
+    assert [entry['key'] for entry in flight.stats()['top_coalesced_keys']] == ['b', 'c']
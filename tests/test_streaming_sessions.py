@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+GUIDED = {
+    'equipment_type': 'split_system',
+    'location': 'Unit 4',
+    'symptoms': ['not_cooling', 'ice_buildup'],
+    'measurements': {},
+    'error_codes': [],
+    'additional_notes': 'Ice on the suction line'
+}
+
+
+def parse_events(body):
+    events = {}
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        events[lines['event']] = json.loads(lines['data'])
+    return events
+
+
+def test_flask_stream_session_can_be_fetched(hvac, client):
+    response = client.post('/api/diagnostic/guided/stream', json=GUIDED)
+    events = parse_events(response.get_data(as_text=True))
+    session = events['session']
+    # No LLM in the tests, so the final diagnosis is the rule-based one
+    assert session['ai_diagnosis'] == events['diagnosis']
+    assert session['ai_diagnosis']['primary_issue'] == 'Refrigerant System with Ice Formation'
+
+    fetched = client.get(f"/api/diagnostic/session/{session['id']}")
+    assert fetched.status_code == 200
+    assert fetched.get_json()['session']['ai_diagnosis'] == session['ai_diagnosis']
+
+    # Also survives a restart, i.e. it reached the session store and not only the in-memory jobs
+    hvac.session_store.flush()
+    assert hvac.session_store.get(session['id'])['ai_diagnosis'] == session['ai_diagnosis']
+
+
+def test_asgi_stream_session_can_be_fetched(hvac, asgi):
+    status, _, body = asyncio.run(asgi('POST', '/api/diagnostic/guided/stream', json.dumps(GUIDED).encode()))
+    assert status == 200
+    session = parse_events(body)['session']
+
+    hvac.session_store.flush()
+    stored = hvac.session_store.get(session['id'])
+    assert stored is not None
+    assert stored['ai_diagnosis'] == session['ai_diagnosis']
+
+
+def test_flask_stream_rejects_bad_bodies_before_streaming(client):
+    for body in ('null', '[]', '{"symptoms": null}', 'not json'):
+        response = client.post('/api/diagnostic/guided/stream', data=body, content_type='application/json')
+        assert response.status_code == 400
+        assert response.mimetype == 'application/json' and response.get_json()['success'] is False
+
+
+def test_asgi_stream_rejects_bad_bodies_before_streaming(asgi):
+    for body in (b'null', b'[]', b'{"measurements": [1]}', b'not json'):
+        status, headers, text = asyncio.run(asgi('POST', '/api/diagnostic/guided/stream', body))
+        assert status == 400
+        assert json.loads(text)['success'] is False